@@ -1,7 +1,8 @@
 # amico.py — clean console + split warning capture
 from pathlib import Path
 import warnings
-from contextlib import redirect_stderr
+from contextlib import redirect_stderr, redirect_stdout
+from amico_logsink import LogSink
 
 # ---------- LOG SETUP (run this BEFORE any noisy imports) ----------
 LOG_DIR = (Path(__file__).parent / "logs")
@@ -10,57 +11,87 @@ LOG_DIR.mkdir(parents=True, exist_ok=True)
 IMPORT_WARN_LOG = LOG_DIR / "import_warnings.log"   # warnings + stderr during imports
 WARN_LOG        = LOG_DIR / "warnings.log"          # warnings during runtime
 
-# Truncate both logs on each run
-IMPORT_WARN_LOG.write_text("")
-WARN_LOG.write_text("")
-
-def _make_showwarning(target_path: Path):
-    def _showwarning(message, category, filename, lineno, file=None, line=None):
-        with open(target_path, "a", encoding="utf-8") as f:
-            f.write(warnings.formatwarning(message, category, filename, lineno, line))
-    return _showwarning
+# Background writers (queued, batched, rotated, repeated warnings collapsed);
+# both logs are truncated on each run
+IMPORT_SINK = LogSink(IMPORT_WARN_LOG, truncate=True)
+WARN_SINK   = LogSink(WARN_LOG, truncate=True)
 
 # Ensure warnings are emitted so we can capture them
 warnings.simplefilter("default")
 
 # During imports: capture warnings to IMPORT_WARN_LOG and redirect stderr there too
-warnings.showwarning = _make_showwarning(IMPORT_WARN_LOG)
-with open(IMPORT_WARN_LOG, "a", encoding="utf-8") as _imp_err, redirect_stderr(_imp_err):
-    from amico_stt import stt
-    from amico_listen import record_audio
+warnings.showwarning = IMPORT_SINK.showwarning
+with redirect_stderr(IMPORT_SINK.stream()):
+    from amico_stt import stt, preload as preload_stt
+    from amico_listen import record_utterance
     from amico_vp import vp, _valid_vp
     from amico_emotions import detect_emotion
     from amico_fuse_emotion import fuse_audio_text
+    import amico_metrics as metrics
+    from amico_engine import run_engine
 
 # After imports: route all subsequent warnings to WARN_LOG
-warnings.showwarning = _make_showwarning(WARN_LOG)
+warnings.showwarning = WARN_SINK.showwarning
+IMPORT_SINK.close()   # nothing writes there after this point; flush it once, off the turn loop
 # ---------- END LOG SETUP ----------
 
 
+def _print_turn(res):
+    # one finished turn from amico_engine (stages already ran concurrently)
+    print(f"🗣️ You said: {res.text}")
+    print(f"🌐 Detected language: {res.language}")
+    emo_a = res.emotion_audio
+    if emo_a and res.fused:
+        te = res.emotion_text
+        a_fused, lab_fused = res.fused
+        print(f"🙂 audio:{emo_a['label']}({emo_a['arousal']:.2f})  📝 text:{te['label']}({te['confidence']:.2f})  🧪 fused:{lab_fused}({a_fused:.2f})")
+    elif emo_a:
+        print(f"🙂 audio-only:{emo_a['label']}({emo_a['arousal']:.2f})")
+    print("✅ Voiceprint extracted" if _valid_vp(res.voiceprint) else "⚠️ No voiceprint extracted")
+    print(f"⏱️ {res.latency_s:.2f}s after end of speech  " + "  ".join(f"{k}:{v:.2f}" for k, v in res.timings.items()))
+    if res.errors:
+        WARN_SINK.write(f"turn {res.seq} errors: {res.errors}\n")
+
 def main():
+    """Continuous, non-interactive loop: capture overlaps analysis (see amico_engine)."""
+    print("🤖 AMICO is running. Press Ctrl+C to stop.")
+    preload_stt()   # whisper loads on a thread while the mic spins up (see whisper_preload)
+    metrics.start(log=WARN_SINK.write)  # file / Prometheus sinks from the "metrics" config (no-op when disabled)
+    print("🎙️ AMICO v0.2 — listening...")
+    try:
+        run_engine(_print_turn)
+    finally:
+        print("\n👋 Shutting down AMICO.")
+        metrics.stop()
+
+def main_stepwise():
+    """The original one-turn walkthrough, pausing between stages (debugging aid)."""
     print("🤖 AMICO is running. Press Ctrl+C to stop.")
+    preload_stt()   # whisper loads on a thread while the mic spins up (see whisper_preload)
+    metrics.start(log=WARN_SINK.write)  # file / Prometheus sinks from the "metrics" config (no-op when disabled)
     try:
         while True:
             print("🎙️ AMICO v0.2")
 
-            audio_path = record_audio()
+            audio = record_utterance()   # VAD endpointing; decoded once, shared by every stage below
             input("Press Enter to continue...")
 
             print("📝 Transcribing...")
-            text, language = stt(audio_path)
+            text, language = stt(audio)
             print(f"🗣️ You said: {text}")
             print(f"🌐 Detected language: {language}")
             input("Press Enter to continue...")
             
             print("📝 Emotion")
-            emo_a = detect_emotion(audio_path, mode="light")  # audio arousal (cheap)  :contentReference[oaicite:4]{index=4}
+            emo_a = detect_emotion(audio, mode="light")  # audio arousal (cheap)  :contentReference[oaicite:4]{index=4}
             txt = (text or "").strip()
             if len(txt) >= 8:
                 try:
                     # lazy import here, AFTER your import-redirect block is long gone
                     from amico_txt_emotion import detect_text_emotion
                     # capture progress bars / logs into WARN_LOG
-                    with open(WARN_LOG, "a", encoding="utf-8") as _runlog, redirect_stderr(_runlog), redirect_stdout(_runlog):
+                    _runlog = WARN_SINK.stream()
+                    with redirect_stderr(_runlog), redirect_stdout(_runlog):
                         te = detect_text_emotion(txt, lang=language or "en")
                     a_fused, lab_fused = fuse_audio_text(emo_a["arousal"], te["dist"])
                     print(f"🙂 audio:{emo_a['label']}({emo_a['arousal']:.2f})  📝 text:{te['label']}({te['confidence']:.2f})  🧪 fused:{lab_fused}({a_fused:.2f})")
@@ -75,7 +106,7 @@ def main():
             input("Press Enter to continue...")
 
             print("📝 Extracting Voiceprint...")
-            voiceprint = vp(audio_path)
+            voiceprint = vp(audio)
             if _valid_vp(voiceprint):
                 print("✅ Voiceprint extracted")
             else:
@@ -86,7 +117,10 @@ def main():
 
     except KeyboardInterrupt:
         print("\n👋 Shutting down AMICO.")
+    finally:
+        metrics.stop()
 
 
 if __name__ == "__main__":
-    main()
+    import sys
+    main_stepwise() if "--step" in sys.argv[1:] else main()
@@ -0,0 +1,111 @@
+# amico_audio.py — decode a turn's audio once, share it across STT / emotion / voiceprint
+from __future__ import annotations
+from typing import Optional, Union
+import os, tempfile
+import numpy as np
+import torch
+import torchaudio
+import soundfile as sf
+import amico_metrics as metrics
+
+SR = 16000
+
+def _peak_normalize(wav: torch.Tensor) -> torch.Tensor:
+    m = wav.abs().max()
+    return wav / m if m > 0 else wav
+
+class TurnAudio:
+    """
+    Mono 16 kHz float32 audio for one turn, decoded and resampled exactly once.
+
+    Views are computed lazily and cached; treat them as read-only since every
+    stage of the turn shares them:
+      - wav16:      (1, T) torch tensor, original level (what Whisper expects)
+      - wav16_norm: (1, T) torch tensor, peak-normalised (emotion + voiceprint)
+      - samples:    (T,) numpy view of wav16
+    `path` is the source file, or a temp WAV written on first access for
+    consumers that still need a file; that temp file is deleted by close(), on
+    leaving a `with` block, or when the object is garbage-collected.
+    """
+    def __init__(self, wav16: torch.Tensor, path: Optional[str] = None):
+        self.wav16 = wav16.to(torch.float32).reshape(1, -1)
+        self._path = path
+        self._tmp = False             # _path is our temp WAV (deleted by close())
+        self._norm: Optional[torch.Tensor] = None
+
+    @classmethod
+    def from_path(cls, path: str) -> "TurnAudio":
+        with metrics.timer("amico_stage_seconds", stage="decode"):
+            data, sr = sf.read(path, dtype="float32", always_2d=True)   # (frames, ch)
+        return cls(cls._mono_16k(torch.from_numpy(data.T), sr), path=str(path))
+
+    @classmethod
+    def from_array(cls, samples: np.ndarray, samplerate: int) -> "TurnAudio":
+        """From an in-memory recording: (T,) or (T, ch), int16 or float."""
+        x = np.asarray(samples)
+        if x.dtype == np.int16:
+            x = x.astype(np.float32) / 32768.0
+        x = x.astype(np.float32, copy=False)
+        if x.ndim == 1:
+            x = x[:, None]
+        return cls(cls._mono_16k(torch.from_numpy(np.ascontiguousarray(x.T)), samplerate))
+
+    @staticmethod
+    def _mono_16k(wav: torch.Tensor, sr: int) -> torch.Tensor:
+        if wav.size(0) > 1:
+            wav = wav.mean(dim=0, keepdim=True)
+        if sr != SR:
+            with metrics.timer("amico_stage_seconds", stage="resample"):
+                wav = torchaudio.functional.resample(wav, sr, SR)
+        return wav
+
+    @property
+    def wav16_norm(self) -> torch.Tensor:
+        if self._norm is None:
+            self._norm = _peak_normalize(self.wav16)
+        return self._norm
+
+    @property
+    def samples(self) -> np.ndarray:
+        return self.wav16[0].numpy()
+
+    @property
+    def duration_s(self) -> float:
+        return self.wav16.size(1) / SR
+
+    @property
+    def path(self) -> str:
+        if self._path is None:
+            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+            tmp.close()
+            sf.write(tmp.name, self.samples, SR)
+            self._path, self._tmp = tmp.name, True
+        return self._path
+
+    def close(self) -> None:
+        """Delete the temp WAV behind `path`, if one was written (source files are never touched)."""
+        if self._tmp:
+            self._tmp = False
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def __enter__(self) -> "TurnAudio":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass    # interpreter shutdown
+
+AudioLike = Union[str, TurnAudio]
+
+def as_turn_audio(audio: AudioLike) -> TurnAudio:
+    """Accept either a file path or an already-decoded TurnAudio."""
+    return audio if isinstance(audio, TurnAudio) else TurnAudio.from_path(audio)
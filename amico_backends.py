@@ -0,0 +1,174 @@
+# amico_backends.py — per-model inference backend: eager fp32, dynamic int8, ONNX Runtime
+#
+# Selected in config/amico_config.json, e.g.
+#   "backends": {"hubert_er": "onnx", "txt_en": "int8", "ecapa": "eager", "whisper": "int8"}
+# Names are the amico_models registry names; anything missing is "eager". Each model
+# module's loader asks backend_for() and builds the model itself with the helpers here:
+#   quantize_int8(module)    dynamic int8 of the plain nn.Linear layers (CPU)
+#   export_onnx(...)         one-time export to onnx_path(), cached across runs
+#   OrtModule(path, names)   an onnxruntime session standing in for the exported submodule
+# and registers a probe (register_probe) so parity_check() can compare any backend
+# against eager fp32 on the same input.
+#
+#   python amico_backends.py                     # parity of every configured non-eager backend
+#   python amico_backends.py hubert_er int8      # one model / backend
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Sequence
+import hashlib, os, platform, sys, time, warnings
+import numpy as np
+import torch
+import amico_config
+
+BACKENDS = ("eager", "int8", "onnx")
+ONNX_OPSET = 17
+
+# ---------- selection ----------
+def backend_for(name: str, supported: Sequence[str] = BACKENDS) -> str:
+    """Configured backend for registry model `name`; unsupported values fall back to eager."""
+    b = str((amico_config.get("backends") or {}).get(name, "eager")).lower()
+    if b not in supported:
+        warnings.warn(f"backend {b!r} not supported for {name} (supported: {', '.join(supported)}); using eager")
+        return "eager"
+    return b
+
+# ---------- int8 ----------
+def _plain_linears(module: torch.nn.Module, layers: tuple) -> torch.nn.Module:
+    # quantize_dynamic looks modules up by exact type, so Linear subclasses (e.g.
+    # whisper.model.Linear) are swapped for plain nn.Linear sharing the same parameters
+    keep = torch.nn.modules.linear.NonDynamicallyQuantizableLinear
+    for name, child in module.named_children():
+        if (isinstance(child, layers) and isinstance(child, torch.nn.Linear)
+                and type(child) not in (torch.nn.Linear, keep)):
+            lin = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            lin.weight = child.weight
+            lin.bias = child.bias
+            setattr(module, name, lin)
+        else:
+            _plain_linears(child, layers)
+    return module
+
+def quantize_int8(module: torch.nn.Module, layers: Iterable[type] = (torch.nn.Linear,)) -> torch.nn.Module:
+    """
+    Dynamic int8 quantization (weights int8, activations quantized on the fly) of
+    `layers`, subclasses of nn.Linear included. Raises if nothing was quantized.
+    """
+    engines = torch.backends.quantized.supported_engines
+    if platform.machine().lower() in ("aarch64", "arm64", "armv7l") and "qnnpack" in engines:
+        torch.backends.quantized.engine = "qnnpack"      # fbgemm is x86-only
+    layers = tuple(layers)
+    module = _plain_linears(module.cpu().eval(), layers)
+    qset = set(layers) | ({torch.nn.Linear} if any(issubclass(l, torch.nn.Linear) for l in layers) else set())
+    q = torch.ao.quantization.quantize_dynamic(module, qset, dtype=torch.qint8)
+    n = sum(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in q.modules())
+    if n == 0:
+        raise RuntimeError(f"int8: no Linear layer of {type(module).__name__} was quantized")
+    return q
+
+# ---------- ONNX ----------
+def onnx_cache_dir() -> Path:
+    d = os.getenv("AMICO_ONNX_CACHE") or amico_config.get("onnx_cache_dir")
+    d = Path(d) if d else Path(__file__).resolve().parent / "models" / "onnx"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def onnx_path(name: str, model_id: str) -> Path:
+    # the key changes with the source weights, opset and torch exporter version
+    tag = hashlib.sha1(f"{model_id}|{ONNX_OPSET}|{torch.__version__}".encode()).hexdigest()[:10]
+    return onnx_cache_dir() / f"{name}-{tag}.onnx"
+
+def export_onnx(module: torch.nn.Module, args: tuple, path: Path, input_names: Sequence[str],
+                output_names: Sequence[str], dynamic_axes: dict) -> Path:
+    """Export once; later runs reuse the file on disk."""
+    if path.exists():
+        return path
+    tmp = path.with_suffix(".onnx.tmp")
+    with torch.no_grad():
+        torch.onnx.export(module.cpu().eval(), args, str(tmp), input_names=list(input_names),
+                          output_names=list(output_names), dynamic_axes=dynamic_axes,
+                          opset_version=ONNX_OPSET, do_constant_folding=True)
+    os.replace(tmp, path)
+    return path
+
+class OrtModule(torch.nn.Module):
+    """
+    An ONNX Runtime session behind a torch Module interface, so it can replace the
+    exported submodule in place. Positional args map to input names in order;
+    keyword args are matched by name (extra keywords are ignored).
+    """
+    def __init__(self, path: Path, input_names: Sequence[str], threads: int = 0):
+        super().__init__()
+        import onnxruntime as ort     # optional: only needed for the onnx backend
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_names = list(input_names)
+
+    def forward(self, *args, **kwargs):
+        feeds = dict(zip(self.input_names, args))
+        feeds.update({k: v for k, v in kwargs.items() if k in self.input_names})
+        feeds = {k: (v.detach().cpu().numpy() if torch.is_tensor(v) else np.asarray(v)) for k, v in feeds.items()}
+        outs = [torch.from_numpy(o) for o in self.session.run(None, feeds)]
+        return outs[0] if len(outs) == 1 else tuple(outs)
+
+# ---------- parity ----------
+_probes: Dict[str, tuple[Callable[[str], np.ndarray], tuple]] = {}
+
+def register_probe(name: str, probe: Callable[[str], np.ndarray], supported: Sequence[str] = BACKENDS) -> None:
+    """probe(backend) builds a fresh model for `backend` and returns its output on a fixed input."""
+    _probes[name] = (probe, tuple(supported))
+
+def probe_audio(seconds: float = 2.0, sr: int = 16000) -> np.ndarray:
+    """Deterministic speech-like test signal (harmonics of a gliding f0 plus noise)."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 140.0 + 40.0 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    x = sum(np.sin(k * phase) / k for k in range(1, 8)) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2)
+    x = x + 0.01 * rng.standard_normal(t.size)
+    return (0.5 * x / np.abs(x).max()).astype(np.float32)
+
+def compare(ref: np.ndarray, cand: np.ndarray) -> dict:
+    a = np.asarray(ref, dtype=np.float64).reshape(-1)
+    b = np.asarray(cand, dtype=np.float64).reshape(-1)
+    cos = float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+    return {"max_abs_diff": float(np.abs(a - b).max()), "cosine": cos,
+            "top1_agree": bool(np.argmax(a) == np.argmax(b))}
+
+def parity_check(name: str, backend: Optional[str] = None, min_cosine: float = 0.99) -> dict:
+    """Run `name`'s probe on eager fp32 and on `backend` (default: configured) and compare."""
+    if name not in _probes:
+        raise KeyError(f"no parity probe registered for {name!r}")
+    probe, supported = _probes[name]
+    backend = backend or backend_for(name, supported)
+    t0 = time.perf_counter(); ref = probe("eager")
+    t1 = time.perf_counter(); cand = probe(backend)
+    t2 = time.perf_counter()
+    res = {"model": name, "backend": backend, **compare(ref, cand),
+           "eager_s": round(t1 - t0, 3), "backend_s": round(t2 - t1, 3)}   # includes model build
+    res["ok"] = res["cosine"] >= min_cosine
+    return res
+
+def _import_model_modules() -> None:
+    # each module registers its loader + probe on import
+    for mod in ("amico_emotions", "amico_txt_emotion", "amico_vp", "amico_stt"):
+        try:
+            __import__(mod)
+        except Exception as e:
+            print(f"skipping {mod}: {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+    import json
+    _import_model_modules()
+    if len(sys.argv) > 1:
+        jobs = [(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)]
+    else:
+        jobs = [(n, None) for n, (_, sup) in _probes.items() if backend_for(n, sup) != "eager"]
+    failed = False
+    for name, backend in jobs:
+        r = parity_check(name, backend)
+        failed |= not r["ok"]
+        print(json.dumps(r))
+    sys.exit(1 if failed else 0)
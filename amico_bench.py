@@ -0,0 +1,221 @@
+# amico_bench.py — headless end-to-end turn benchmark over recorded fixtures
+#
+#   python amico_bench.py fixtures/ --repeat 3 --out bench.json
+#
+# fixtures/ holds *.wav turns and, optionally, camera frames (*.jpg / *.png / *.npy);
+# frames are paired with turns round-robin. Every turn runs the same stages as
+# amico.main, without input() pauses: decode, stt, detect_emotion (light, and hf with
+# --hf), detect_text_emotion, fuse_audio_text, vp and IdentityOrchestrator.identify_turn
+# against a synthetic gallery with stub face providers.
+#
+# Output (JSON): per-stage p50/p95/mean/max latency in ms over warm runs, the first
+# (cold, model-loading) call per stage, memory and throughput (turns/s, audio seconds
+# per wall second). ru_maxrss is the process-wide high-water mark, so per stage we
+# report it as process_peak_rss_mb (cumulative: the peak so far, after that stage)
+# next to peak_rss_growth_mb (the most one call of that stage raised it).
+# identify_turn extracts the voiceprint itself, as in AmicoEngine where it replaces the
+# vp stage: vp is timed on its own but left out of turn_total, so voice is counted once.
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse, json, os, platform, resource, subprocess, sys, time
+import numpy as np
+
+AUDIO_EXTS = {".wav", ".flac", ".ogg"}
+FRAME_EXTS = {".jpg", ".jpeg", ".png", ".npy"}
+
+def peak_rss_mb() -> float:
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / (1024.0 * 1024.0) if sys.platform == "darwin" else r / 1024.0   # bytes on macOS, KB on Linux
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def _load_frame(path: Path):
+    if path.suffix == ".npy":
+        return np.load(path)
+    import cv2     # optional: only needed for image fixtures
+    return cv2.imread(str(path))
+
+# ---------- stub face side ----------
+class StubFaces:
+    """Deterministic face provider: `n_faces` 512-d embeddings per frame, the first one near a gallery print."""
+    def __init__(self, gallery_embs: np.ndarray, n_faces: int = 2, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.embs, self.n_faces = gallery_embs, n_faces
+
+    def capture(self):
+        return np.zeros((480, 640, 3), dtype=np.uint8)
+
+    def extract(self, frame) -> List[dict]:
+        faces = []
+        for k in range(self.n_faces):
+            if k == 0 and len(self.embs):
+                e = self.embs[self.rng.integers(len(self.embs))] + 0.05 * self.rng.standard_normal(512)
+            else:
+                e = self.rng.standard_normal(512)
+            faces.append({"emb": (e / np.linalg.norm(e)).astype(np.float32), "score": 0.9,
+                          "bbox": (10 * k, 10, 10 * k + 100, 110)})
+        return faces
+
+def _synthetic_gallery(kind: str, n_users: int, per_user: int, seed: int):
+    from amico_gallery import EmbeddingGallery, KINDS
+    dim = KINDS[kind][1]
+    rng = np.random.default_rng(seed)
+    users = [f"bench_{kind}_{u}" for u in range(n_users) for _ in range(per_user)]
+    embs = rng.standard_normal((len(users), dim)).astype(np.float32)
+    g = EmbeddingGallery(kind)
+    g.add_many(users, embs)
+    return g, embs
+
+# ---------- timing ----------
+class StageTimer:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.cold: Dict[str, float] = {}
+        self.rss: Dict[str, float] = {}
+        self.rss_growth: Dict[str, float] = {}
+        self.errors: Dict[str, int] = {}
+
+    def run(self, stage: str, fn: Callable, *args, **kwargs):
+        rss0 = peak_rss_mb()
+        t0 = time.perf_counter()
+        try:
+            out = fn(*args, **kwargs)
+        except Exception as e:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+            print(f"[{stage}] {type(e).__name__}: {e}", file=sys.stderr)
+            out = None
+        self.record(stage, time.perf_counter() - t0, rss0)
+        return out
+
+    def record(self, stage: str, dt: float, rss_before: Optional[float] = None) -> None:
+        if stage not in self.cold:
+            self.cold[stage] = dt          # first call pays for model loading
+        else:
+            self.samples.setdefault(stage, []).append(dt)
+        self.rss[stage] = peak_rss_mb()
+        if rss_before is not None:
+            self.rss_growth[stage] = max(self.rss_growth.get(stage, 0.0), self.rss[stage] - rss_before)
+
+    def report(self) -> dict:
+        out = {}
+        for stage in self.cold:
+            xs = np.array(self.samples.get(stage, []), dtype=np.float64) * 1000.0
+            out[stage] = {
+                "n": int(xs.size),
+                "cold_ms": round(self.cold[stage] * 1000.0, 3),
+                "p50_ms": round(float(np.percentile(xs, 50)), 3) if xs.size else None,
+                "p95_ms": round(float(np.percentile(xs, 95)), 3) if xs.size else None,
+                "mean_ms": round(float(xs.mean()), 3) if xs.size else None,
+                "max_ms": round(float(xs.max()), 3) if xs.size else None,
+                "process_peak_rss_mb": round(self.rss[stage], 1),
+                "peak_rss_growth_mb": round(self.rss_growth[stage], 1) if stage in self.rss_growth else None,
+                "errors": self.errors.get(stage, 0),
+            }
+        return out
+
+# ---------- benchmark ----------
+def run_benchmark(fixtures: str, repeat: int = 3, hf: bool = False, text_emotion: bool = True,
+                  gallery_users: int = 50, per_user: int = 5, faces_per_frame: int = 2,
+                  concurrent_identity: bool = False, text_cache: bool = False) -> dict:
+    from amico_audio import TurnAudio
+    from amico_stt import stt
+    from amico_emotions import detect_emotion
+    from amico_fuse_emotion import fuse_audio_text
+    from amico_txt_emotion import detect_text_emotion, clear_cache
+    from amico_vp import vp
+    from amico_identity import IdentityOrchestrator
+    from amico_id_types import PolicyConfig, SessionState
+
+    root = Path(fixtures)
+    wavs = sorted(p for p in root.rglob("*") if p.suffix.lower() in AUDIO_EXTS)
+    frames = sorted(p for p in root.rglob("*") if p.suffix.lower() in FRAME_EXTS)
+    if not wavs:
+        raise SystemExit(f"no audio fixtures under {root}")
+
+    voice_g, _ = _synthetic_gallery("voice", gallery_users, per_user, seed=1)
+    face_g, face_embs = _synthetic_gallery("face", gallery_users, per_user, seed=2)
+    faces = StubFaces(face_embs, n_faces=faces_per_frame)
+    orch = IdentityOrchestrator(vp, voice_g, faces.capture, faces.extract, face_g, PolicyConfig(),
+                                SessionState(), face_match_batch=face_g.match_batch,
+                                concurrent=concurrent_identity)
+    timer = StageTimer()
+    rss0 = peak_rss_mb()
+    turns, audio_s = 0, 0.0
+    # one extra pass: the first call of every stage is reported as cold, not in percentiles
+    t_start = None
+    for rep in range(repeat + 1):
+        if rep == 1:
+            t_start, turns, audio_s = time.perf_counter(), 0, 0.0
+        for i, wav in enumerate(wavs):
+            frame = _load_frame(frames[i % len(frames)]) if frames else None
+            t_turn = time.perf_counter()
+            audio = timer.run("decode", TurnAudio.from_path, str(wav))
+            if audio is None:
+                continue
+            res = timer.run("stt", stt, audio)
+            text, lang = res if res else ("", "und")
+            emo = timer.run("emotion_light", detect_emotion, audio, mode="light")
+            if hf:
+                timer.run("emotion_hf", detect_emotion, audio, mode="hf")
+            if text_emotion and (text or "").strip():
+                if not text_cache:
+                    clear_cache()     # fixtures repeat verbatim: time the model, not the cache
+                te = timer.run("text_emotion", detect_text_emotion, text, lang=lang or "en")
+                if emo and te:
+                    timer.run("fuse", fuse_audio_text, emo["arousal"], te["dist"])
+            t_vp = time.perf_counter()
+            timer.run("vp", vp, audio)
+            t_vp = time.perf_counter() - t_vp
+            timer.run("identify_turn", orch.identify_turn, audio, frame)
+            timer.record("turn_total", time.perf_counter() - t_turn - t_vp)
+            turns += 1
+            audio_s += audio.duration_s
+    wall = time.perf_counter() - t_start if t_start else 0.0
+    orch.close()
+
+    import amico_config
+    return {
+        "meta": {"ts": time.time(), "git": _git_rev(), "host": platform.node(), "machine": platform.machine(),
+                 "python": platform.python_version(), "cpus": os.cpu_count(),
+                 "backends": amico_config.get("backends"), "whisper_model": amico_config.get("whisper_model"),
+                 "fixtures": len(wavs), "frames": len(frames), "repeat": repeat, "hf": hf,
+                 "gallery_users": gallery_users, "concurrent_identity": concurrent_identity,
+                 "text_cache": text_cache,
+                 "turn_total_excludes": ["vp"]},     # identify_turn embeds the voice itself
+        "stages": timer.report(),
+        "throughput": {"turns": turns, "wall_s": round(wall, 3),
+                       "turns_per_s": round(turns / wall, 3) if wall else None,
+                       "audio_s_per_wall_s": round(audio_s / wall, 3) if wall else None},
+        "memory": {"peak_rss_mb": round(peak_rss_mb(), 1), "rss_before_mb": round(rss0, 1)},
+    }
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Replay WAV fixtures through the AMICO turn pipeline and time it.")
+    ap.add_argument("fixtures", help="directory of *.wav turns (+ optional *.jpg/*.png/*.npy frames)")
+    ap.add_argument("--repeat", type=int, default=3, help="warm passes over the fixtures")
+    ap.add_argument("--hf", action="store_true", help="also time detect_emotion(mode='hf')")
+    ap.add_argument("--no-text-emotion", action="store_true")
+    ap.add_argument("--text-cache", action="store_true", help="let repeated passes hit the text-emotion cache")
+    ap.add_argument("--gallery-users", type=int, default=50)
+    ap.add_argument("--per-user", type=int, default=5, help="prints per synthetic gallery user")
+    ap.add_argument("--faces", type=int, default=2, help="stub faces per frame")
+    ap.add_argument("--concurrent", action="store_true", help="identify_turn with concurrent branches")
+    ap.add_argument("--out", help="write the JSON report here as well as to stdout")
+    args = ap.parse_args(argv)
+
+    report = run_benchmark(args.fixtures, args.repeat, args.hf, not args.no_text_emotion,
+                           args.gallery_users, args.per_user, args.faces, args.concurrent, args.text_cache)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
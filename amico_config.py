@@ -0,0 +1,53 @@
+# amico_config.py — app settings from config/amico_config.json (read once per process)
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+import os, json
+
+def _candidate_paths() -> list[Path]:
+    # Highest priority: explicit env var
+    env = os.getenv("AMICO_CONFIG")
+    paths = [Path(env)] if env else []
+    here = Path(__file__).resolve().parent
+    paths += [
+        here / "config" / "amico_config.json",
+        here.parent / "config" / "amico_config.json",
+        Path("/config/amico_config.json"),
+    ]
+    return paths
+
+@lru_cache(maxsize=1)
+def load_app_config() -> dict:
+    """First readable amico_config.json, or {} (callers apply their own defaults)."""
+    for p in _candidate_paths():
+        try:
+            if p.exists():
+                with p.open("r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception:
+            # ignore and try next candidate
+            pass
+    return {}
+
+def get(key: str, default=None):
+    return load_app_config().get(key, default)
+
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off", ""}
+
+def as_bool(value, default: bool = False) -> bool:
+    """JSON true/false, 0/1 or strings like "false" / "yes"; anything else -> default."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str):
+        v = value.strip().lower()
+        if v in _TRUE:
+            return True
+        if v in _FALSE:
+            return False
+    return default
+
+def get_bool(key: str, default: bool = False) -> bool:
+    return as_bool(get(key, default), default)
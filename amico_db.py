@@ -1,7 +1,18 @@
 # amico_db.py
 from __future__ import annotations
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-import os, json, psycopg2
+from typing import Optional, Sequence, Union
+import io, os, json, threading, time, uuid
+import numpy as np
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
+import amico_metrics as metrics
+from amico_id_types import PolicyConfig
+from amico_vp_version import LEGACY_MODEL_VERSION, MODEL_VERSION
 
 # ---------- Config loading ----------
 def _candidate_paths() -> list[Path]:
@@ -62,18 +73,133 @@ def load_db_config() -> dict:
     cfg.setdefault("port",   5432)
     return cfg
 
-# ---------- Connection ----------
-def get_conn():
-    cfg = load_db_config()
-    # Do NOT print cfg (contains secrets). Connect:
-    return psycopg2.connect(
+@lru_cache(maxsize=1)
+def _cached_db_config() -> dict:
+    return load_db_config()
+
+def reload_db_config() -> dict:
+    """Forget the cached config (e.g. after editing db_config.json) and resolve it again."""
+    _cached_db_config.cache_clear()
+    return dict(_cached_db_config())
+
+def _connect_kwargs(cfg: dict) -> dict:
+    return dict(
         dbname=cfg["dbname"],
         user=cfg["user"],
         password=cfg.get("password", ""),
         host=cfg["host"],
         port=int(cfg.get("port", 5432)),
+        # TCP keepalives so half-dead sockets are noticed instead of hanging a turn
+        keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+        connect_timeout=int(cfg.get("connect_timeout", 5)),
     )
 
+# ---------- Connection ----------
+def get_conn():
+    """
+    A new, unpooled connection (config resolved once per process).
+    Deprecated: every call opens a socket the pool can't bound; use pooled_conn().
+    """
+    import warnings
+    warnings.warn("amico_db.get_conn() opens an unpooled connection; use pooled_conn()",
+                  DeprecationWarning, stacklevel=2)
+    cfg = _cached_db_config()
+    # Do NOT print cfg (contains secrets). Connect:
+    return psycopg2.connect(**_connect_kwargs(cfg))
+
+# ---------- Connection pool ----------
+# Shared by identity, enrollment and logging threads. Sizes come from db_config.json
+# ("pool_min" / "pool_max") or AMICO_DB_POOL_MIN / AMICO_DB_POOL_MAX. When every
+# connection is out, pooled_conn() waits up to "pool_timeout_s" /
+# AMICO_DB_POOL_TIMEOUT_S for one to come back (getconn itself fails at once).
+HEALTHCHECK_IDLE_S = 60.0   # ping connections that sat idle longer than this before reuse
+
+_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_pool_slots: Optional[threading.BoundedSemaphore] = None   # one per connection of _pool
+_pool_lock = threading.Lock()
+_last_used: dict[int, float] = {}
+
+def get_pool() -> pg_pool.ThreadedConnectionPool:
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            cfg = _cached_db_config()
+            lo = int(os.getenv("AMICO_DB_POOL_MIN", cfg.get("pool_min", 1)))
+            hi = int(os.getenv("AMICO_DB_POOL_MAX", cfg.get("pool_max", 4)))
+            _pool = pg_pool.ThreadedConnectionPool(lo, max(lo, hi), **_connect_kwargs(cfg))
+            _pool_slots = threading.BoundedSemaphore(_pool.maxconn)
+        return _pool
+
+def _pool_timeout_s() -> float:
+    return float(os.getenv("AMICO_DB_POOL_TIMEOUT_S", _cached_db_config().get("pool_timeout_s", 10.0)))
+
+def close_pool() -> None:
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _pool_slots = None
+        _last_used.clear()
+
+def _alive(conn) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0.0) < HEALTHCHECK_IDLE_S:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+@contextmanager
+def pooled_conn():
+    """
+    Borrow a pooled connection:  with pooled_conn() as conn: ...
+    Waits (bounded, see _pool_timeout_s) while the pool is exhausted, then raises
+    PoolError. Stale sockets are detected and replaced before use; an open
+    transaction is rolled back on return, and broken connections are discarded,
+    not recycled.
+    """
+    pool = get_pool()
+    slots = _pool_slots
+    with metrics.timer("amico_db_seconds", op="checkout"):
+        if not slots.acquire(timeout=_pool_timeout_s()):
+            metrics.inc("amico_db_pool_timeouts_total")
+            raise pg_pool.PoolError(f"no pooled connection free after {_pool_timeout_s():.0f}s")
+        try:
+            conn = pool.getconn()
+            for _ in range(pool.maxconn + 1):
+                if _alive(conn):
+                    break
+                _last_used.pop(id(conn), None)
+                metrics.inc("amico_db_stale_connections_total")
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        except BaseException:
+            slots.release()
+            raise
+    try:
+        yield conn
+    finally:
+        broken = bool(conn.closed)
+        if not broken and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        if broken:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        try:
+            pool.putconn(conn, close=broken)
+        finally:
+            slots.release()
+
 # ---------- Schema (users + voiceprints + faceprints) ----------
 DDL_SQL = """
 CREATE EXTENSION IF NOT EXISTS pgcrypto;
@@ -114,6 +240,24 @@ CREATE TABLE IF NOT EXISTS amico_faceprints (
 CREATE INDEX IF NOT EXISTS amico_face_user_created_idx
   ON amico_faceprints (user_id, created_at DESC);
 
+-- Which extractor produced each print (NULL = rows from before tagging), and the
+-- clip a voiceprint came from, so re-embedding jobs can resume without duplicates.
+ALTER TABLE amico_voiceprints ADD COLUMN IF NOT EXISTS model_version TEXT;
+ALTER TABLE amico_voiceprints ADD COLUMN IF NOT EXISTS source TEXT;
+ALTER TABLE amico_faceprints  ADD COLUMN IF NOT EXISTS model_version TEXT;
+
+-- Per-user prototypes (amico_gallery.PrototypeStore): slot 0 = running sum of the
+-- user's normalised samples, slots 1..k = k-means prototypes. All float32.
+CREATE TABLE IF NOT EXISTS amico_prototypes (
+  user_id UUID NOT NULL REFERENCES amico_users(id) ON DELETE CASCADE,
+  modality TEXT NOT NULL CHECK (modality IN ('voice','face')),
+  slot SMALLINT NOT NULL CHECK (slot >= 0),
+  n_samples INT NOT NULL,
+  embedding BYTEA NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, modality, slot)
+);
+
 CREATE OR REPLACE FUNCTION amico_users_touch_updated_at()
 RETURNS TRIGGER LANGUAGE plpgsql AS $$
 BEGIN
@@ -127,13 +271,451 @@ BEFORE UPDATE ON amico_users
 FOR EACH ROW EXECUTE FUNCTION amico_users_touch_updated_at();
 """
 
-def ensure_schema(conn) -> None:
+# ---------- Optional pgvector mode (server-side nearest-neighbour search) ----------
+# Adds vector(192)/vector(512) columns next to the BYTEA embeddings, plus cosine ANN
+# indexes. BYTEA stays the source of truth; migrate_to_pgvector() backfills the vectors.
+PGVECTOR_DDL_SQL = """
+CREATE EXTENSION IF NOT EXISTS vector;
+ALTER TABLE amico_voiceprints ADD COLUMN IF NOT EXISTS embedding_vec vector(192);
+ALTER TABLE amico_faceprints  ADD COLUMN IF NOT EXISTS embedding_vec vector(512);
+"""
+PGVECTOR_INDEX_SQL = {
+    "hnsw": """
+CREATE INDEX IF NOT EXISTS {table}_vec_idx ON {table}
+  USING hnsw (embedding_vec vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+""",
+    "ivfflat": """
+CREATE INDEX IF NOT EXISTS {table}_vec_idx ON {table}
+  USING ivfflat (embedding_vec vector_cosine_ops) WITH (lists = {lists});
+""",
+}
+
+@metrics.timed("amico_db_seconds", op="ensure_schema")
+def ensure_schema(conn, pgvector: bool = False, index: str = "hnsw", lists: int = 100) -> None:
+    """
+    Create the base schema; pgvector=True also adds vector columns + an `index` ("hnsw" | "ivfflat").
+    IVFFlat trains its lists on the rows present at build time, so it is not built
+    here: call build_vector_index(conn, "ivfflat") after migrate_to_pgvector() / the bulk load.
+    """
+    if pgvector and index not in PGVECTOR_INDEX_SQL:
+        raise ValueError(f"unknown pgvector index {index!r}")
     with conn, conn.cursor() as cur:
         cur.execute(DDL_SQL)
+        if pgvector:
+            cur.execute(PGVECTOR_DDL_SQL)
+            if index == "hnsw":
+                for table, _, _ in PRINT_TABLES.values():
+                    cur.execute(PGVECTOR_INDEX_SQL[index].format(table=table, lists=int(lists)))
+
+@metrics.timed("amico_db_seconds", op="build_vector_index")
+def build_vector_index(conn, index: str = "ivfflat", lists: int = 100) -> None:
+    """
+    (Re)build the ANN index of both print tables from the vectors stored now. Run it
+    after the bulk load for IVFFlat, and again (or REINDEX) once the tables have grown
+    a lot since, otherwise the lists no longer fit the data and recall drops.
+    """
+    if index not in PGVECTOR_INDEX_SQL:
+        raise ValueError(f"unknown pgvector index {index!r}")
+    with conn, conn.cursor() as cur:
+        for table, _, _ in PRINT_TABLES.values():
+            cur.execute(f"DROP INDEX IF EXISTS {table}_vec_idx")
+            cur.execute(PGVECTOR_INDEX_SQL[index].format(table=table, lists=int(lists)))
+
+# ---------- Optional compact storage (float16 / int8 embeddings) ----------
+# Opt-in: adds dtype + qscale columns and relaxes the float32-only size checks.
+# Existing rows default to 'float32' and keep their exact bytes.
+QUANT_DDL_SQL = """
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS dtype TEXT NOT NULL DEFAULT 'float32';
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS qscale REAL;
+ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_emb_size;
+ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_emb_size_q;
+ALTER TABLE {table} ADD CONSTRAINT {table}_emb_size_q CHECK (
+  dtype IN ('float32','float16','int8')
+  AND octet_length(embedding) = dim * CASE dtype WHEN 'float32' THEN 4 WHEN 'float16' THEN 2 ELSE 1 END
+  AND (dtype <> 'int8' OR qscale IS NOT NULL)
+);
+"""
+
+def ensure_quantized_schema(conn) -> None:
+    with conn, conn.cursor() as cur:
+        for table, _, _ in PRINT_TABLES.values():
+            cur.execute(QUANT_DDL_SQL.format(table=table))
+
+def _vec_literal(emb) -> str:
+    # pgvector text input: '[x1,x2,...]'; 9 significant digits round-trip any float32
+    return "[" + ",".join(f"{x:.9g}" for x in np.asarray(emb, dtype=np.float32).reshape(-1)) + "]"
+
+# ---------- Embedding storage (voiceprints / faceprints) ----------
+# kind -> (table, dim, PolicyConfig attribute capping samples per user)
+PRINT_TABLES = {
+    "voice": ("amico_voiceprints", 192, "max_voiceprints_per_user"),
+    "face":  ("amico_faceprints",  512, "max_faceprints_per_user"),
+}
+
+_PRUNE_SQL = """
+DELETE FROM {table} WHERE id IN (
+  SELECT id FROM (
+    SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS rn
+    FROM {table} WHERE user_id = ANY(%s::uuid[])
+  ) ranked WHERE rn > %s
+) RETURNING id
+"""
+
+def _emb_bytes(embs, dim: int, dtype: str = "float32") -> tuple[list, Optional[np.ndarray]]:
+    from amico_gallery import quantize
+    m = np.asarray(embs, dtype=np.float32).reshape(-1, dim)
+    if dtype != "float32":
+        # quantize unit vectors so int8 scales are comparable across rows
+        m = m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-8)
+    codes, scales = quantize(m, dtype)
+    codes = np.ascontiguousarray(codes.astype(codes.dtype.newbyteorder("<")))
+    return [psycopg2.Binary(row.tobytes()) for row in codes], scales
+
+def _with_dtype(cols: str, rows: list, dtype: str, scales) -> tuple[str, list]:
+    if dtype == "float32":
+        return cols, rows
+    sc = [None] * len(rows) if scales is None else [float(x) for x in scales]
+    return cols + ", dtype, qscale", [r + (dtype, q) for r, q in zip(rows, sc)]
+
+def _user_list(user_ids: Union[str, Sequence[str]], n: int) -> list[str]:
+    users = [user_ids] * n if isinstance(user_ids, str) else [str(u) for u in user_ids]
+    if len(users) != n:
+        raise ValueError("user_ids must be one id or one per embedding")
+    return users
+
+def default_model_version(kind: str) -> Optional[str]:
+    """Tag written / loaded when none is given: amico_vp_version.MODEL_VERSION for voice (faces aren't versioned)."""
+    return MODEL_VERSION if kind == "voice" else None
+
+def _legacy_model_version(kind: str) -> Optional[str]:
+    # untagged (NULL) rows predate tagging and count as this version
+    return LEGACY_MODEL_VERSION if kind == "voice" else None
+
+def _version_sql(cur, kind: str, model_version: str) -> str:
+    """SQL condition: rows of `model_version`, untagged rows included when it's the legacy one."""
+    cond = cur.mogrify("model_version = %s", (model_version,)).decode()
+    return f"({cond} OR model_version IS NULL)" if model_version == _legacy_model_version(kind) else cond
+
+def _insert_prints(conn, kind: str, cols: str, rows: list, users: list[str],
+                   cfg: Optional[PolicyConfig], page_size: int,
+                   vec_embs=None, after=None, model_version: Optional[str] = None) -> tuple[list[int], list[int]]:
+    table, _, cap_attr = PRINT_TABLES[kind]
+    if not rows:
+        return [], []
+    model_version = model_version or default_model_version(kind)
+    if model_version is not None:
+        cols += ", model_version"
+        rows = [r + (model_version,) for r in rows]
+    template = None
+    if vec_embs is not None:
+        # pgvector mode: write the ANN column in the same statement
+        cols += ", embedding_vec"
+        rows = [r + (_vec_literal(e),) for r, e in zip(rows, vec_embs)]
+        template = "(" + ", ".join(["%s"] * (len(rows[0]) - 1)) + ", %s::vector)"
+    with conn, conn.cursor() as cur:
+        new_ids = execute_values(cur, f"INSERT INTO {table} ({cols}) VALUES %s RETURNING id",
+                                 rows, template=template, page_size=page_size, fetch=True)
+        pruned = []
+        if cfg is not None:
+            # keep only the newest N per user, in the same transaction as the insert
+            cur.execute(_PRUNE_SQL.format(table=table), (sorted(set(users)), int(getattr(cfg, cap_attr))))
+            pruned = [r[0] for r in cur.fetchall()]
+        new_ids = [r[0] for r in new_ids]
+        if after is not None:
+            after(cur, new_ids, pruned)   # still inside the transaction
+    return new_ids, pruned
+
+@metrics.timed("amico_db_seconds", op="insert_voiceprints")
+def insert_voiceprints(conn, user_ids: Union[str, Sequence[str]], embs,
+                       cfg: Optional[PolicyConfig] = None, page_size: int = 500,
+                       pgvector: bool = False, after=None, dtype: str = "float32",
+                       model_version: Optional[str] = None,
+                       source: Union[None, str, Sequence[Optional[str]]] = None) -> tuple[list[int], list[int]]:
+    """
+    Batch-insert (N,192) voiceprints in one transaction.
+    dtype "float16" / "int8" stores compact rows (needs ensure_quantized_schema()).
+    model_version tags the extractor (default amico_vp_version.MODEL_VERSION); source is the clip (one or per row).
+    With `cfg`, prunes each touched user down to cfg.max_voiceprints_per_user (newest kept).
+    pgvector=True also fills embedding_vec (schema created with ensure_schema(pgvector=True)).
+    after(cur, new_ids, pruned_ids) runs last, inside the same transaction.
+    Returns (new row ids, pruned row ids) so an EmbeddingGallery can mirror both.
+    """
+    data, scales = _emb_bytes(embs, 192, dtype)
+    users = _user_list(user_ids, len(data))
+    vecs = np.asarray(embs, dtype=np.float32).reshape(-1, 192) if pgvector else None
+    cols, rows = "user_id, embedding", list(zip(users, data))
+    if source is not None:
+        srcs = [source] * len(rows) if isinstance(source, str) else list(source)
+        cols, rows = cols + ", source", [r + (sc,) for r, sc in zip(rows, srcs)]
+    cols, rows = _with_dtype(cols, rows, dtype, scales)
+    return _insert_prints(conn, "voice", cols, rows, users, cfg, page_size, vecs, after, model_version)
+
+@metrics.timed("amico_db_seconds", op="insert_faceprints")
+def insert_faceprints(conn, user_ids: Union[str, Sequence[str]], embs,
+                      det_scores: Optional[Sequence[float]] = None,
+                      bboxes: Optional[Sequence[Sequence[int]]] = None,
+                      source: Optional[str] = None,
+                      cfg: Optional[PolicyConfig] = None, page_size: int = 500,
+                      pgvector: bool = False, after=None, dtype: str = "float32",
+                      model_version: Optional[str] = None) -> tuple[list[int], list[int]]:
+    """Batch-insert (N,512) faceprints; same pruning / pgvector / after / dtype / version contract as insert_voiceprints."""
+    data, scales = _emb_bytes(embs, 512, dtype)
+    n = len(data)
+    users = _user_list(user_ids, n)
+    dets = list(det_scores) if det_scores is not None else [None] * n
+    boxes = [list(map(int, b)) if b is not None else None for b in bboxes] if bboxes is not None else [None] * n
+    rows = list(zip(users, data, dets, boxes, [source] * n))
+    vecs = np.asarray(embs, dtype=np.float32).reshape(-1, 512) if pgvector else None
+    cols, rows = _with_dtype("user_id, embedding, det_score, bbox, source", rows, dtype, scales)
+    return _insert_prints(conn, "face", cols, rows, users, cfg, page_size, vecs, after, model_version)
+
+def _parse_prints_copy(mv, dim: int, dtype: str, table: str = "prints"
+                      ) -> tuple[np.ndarray, list[str], np.ndarray, Optional[np.ndarray]]:
+    """
+    Parse `COPY (SELECT id, user_id, [qscale,] embedding ...) TO STDOUT (FORMAT binary)`.
+    Rows have a fixed size (int8 id, uuid, [float4 scale,] dim*width-byte embedding),
+    so the buffer is viewed directly as a numpy record array: no per-row parsing and
+    no copy of the embeddings.
+    """
+    from amico_gallery import DTYPES
+    width = dim * DTYPES[dtype]
+    # header: 11-byte signature, int32 flags, int32 extension length (+ extension)
+    hdr = 19 + int.from_bytes(mv[15:19], "big")
+    fields = [("nf", ">i2"), ("l_id", ">i4"), ("id", ">i8"), ("l_uid", ">i4"), ("uid", "V16")]
+    if dtype == "int8":
+        fields += [("l_scale", ">i4"), ("scale", ">f4")]
+    fields += [("l_emb", ">i4"), ("emb", np.dtype(dtype).newbyteorder("<"), (dim,))]
+    row = np.dtype(fields)
+    n, rem = divmod(len(mv) - hdr - 2, row.itemsize)          # trailer: int16 -1
+    if rem:
+        raise ValueError(f"unexpected COPY layout for {table}")
+    recs = np.frombuffer(mv, dtype=row, count=n, offset=hdr)
+    ncols = 4 if dtype == "int8" else 3
+    if n and not ((recs["nf"] == ncols).all() and (recs["l_emb"] == width).all()):
+        raise ValueError(f"unexpected COPY layout for {table}")
+    seen: dict[bytes, str] = {}
+    users = [seen.get(b) or seen.setdefault(b, str(uuid.UUID(bytes=b)))
+             for b in map(bytes, recs["uid"])]
+    scales = recs["scale"].astype(np.float32) if dtype == "int8" else None
+    return recs["id"].astype(np.int64), users, recs["emb"], scales
+
+def _stored_dtypes(cur, table: str) -> tuple[str, ...]:
+    # float32-only tables (no ensure_quantized_schema) can't hold anything else
+    cur.execute("SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = 'qscale'",
+                (table,))
+    return ("float32", "float16", "int8") if cur.fetchone() else ("float32",)
+
+@metrics.timed("amico_db_seconds", op="load_prints")
+def load_prints(conn, kind: str = "voice", dtype: str = "float32", model_version: Optional[str] = None
+                ) -> tuple[np.ndarray, list[str], np.ndarray, Optional[np.ndarray]]:
+    """
+    Stream every `kind` embedding out of Postgres, one binary COPY per storage format
+    present. Only rows of `model_version` (default: default_model_version(kind)) are
+    read, so a gallery never mixes extractors; untagged rows count as the legacy
+    version (amico_vp_version.LEGACY_MODEL_VERSION). Rows stored in another format than `dtype` are converted on load.
+    Returns (row_ids, user_ids, embs, scales) where `embs` is (N, dim) in `dtype`
+    (a view of the COPY buffer when nothing had to be converted) and `scales` the
+    per-row int8 scales (None for float32 / float16).
+    """
+    from amico_gallery import DTYPES, quantize, dequantize
+    table, dim, _ = PRINT_TABLES[kind]
+    if dtype not in DTYPES:
+        raise ValueError(f"unknown dtype {dtype!r}")
+    parts = []
+    with conn.cursor() as cur:
+        model_version = model_version or default_model_version(kind)
+        version = "" if model_version is None else " AND " + _version_sql(cur, kind, model_version)
+        for fmt in _stored_dtypes(cur, table):
+            # the embedding size alone tells the formats apart (dtype column or not)
+            buf = io.BytesIO()
+            cur.copy_expert(
+                f"COPY (SELECT id, user_id, {'qscale, ' if fmt == 'int8' else ''}embedding FROM {table} "
+                f"WHERE octet_length(embedding) = {dim * DTYPES[fmt]}{version} ORDER BY user_id, id) "
+                f"TO STDOUT WITH (FORMAT binary)", buf)
+            ids, users, embs, scales = _parse_prints_copy(buf.getbuffer(), dim, fmt, table)
+            if len(ids) and fmt != dtype:
+                x = dequantize(embs, scales)
+                if dtype != "float32":
+                    x = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-8)
+                embs, scales = quantize(x, dtype)
+            if len(ids):
+                parts.append((ids, users, embs, scales))
+    if not parts:
+        return (np.zeros(0, dtype=np.int64), [], np.zeros((0, dim), dtype=dtype),
+                np.zeros(0, dtype=np.float32) if dtype == "int8" else None)
+    if len(parts) == 1:
+        return parts[0]
+    return (np.concatenate([p[0] for p in parts]), [u for p in parts for u in p[1]],
+            np.concatenate([p[2] for p in parts]).astype(dtype, copy=False),
+            np.concatenate([p[3] for p in parts]) if dtype == "int8" else None)
+
+# ---------- Model versions (re-embedding) ----------
+def print_versions(conn, kind: str = "voice") -> dict:
+    """{model_version (None = untagged): row count} for one table."""
+    table, _, _ = PRINT_TABLES[kind]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT model_version, count(*) FROM {table} GROUP BY model_version")
+        return {v: int(n) for v, n in cur.fetchall()}
+
+@metrics.timed("amico_db_seconds", op="tag_untagged_prints")
+def tag_untagged_prints(conn, kind: str, model_version: str) -> int:
+    table, _, _ = PRINT_TABLES[kind]
+    with conn, conn.cursor() as cur:
+        cur.execute(f"UPDATE {table} SET model_version = %s WHERE model_version IS NULL", (model_version,))
+        return cur.rowcount
+
+@metrics.timed("amico_db_seconds", op="existing_sources")
+def existing_sources(conn, kind: str, model_version: str) -> set[str]:
+    table, _, _ = PRINT_TABLES[kind]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT DISTINCT source FROM {table} "
+                    f"WHERE {_version_sql(cur, kind, model_version)} AND source IS NOT NULL")
+        return {r[0] for r in cur.fetchall()}
+
+@metrics.timed("amico_db_seconds", op="users_missing_version")
+def users_missing_version(conn, kind: str, model_version: str) -> list[str]:
+    """Users that have prints, but none tagged `model_version` (they'd become unrecognisable)."""
+    table, _, _ = PRINT_TABLES[kind]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT user_id::text FROM {table} GROUP BY user_id "
+                    f"HAVING NOT bool_or(coalesce({_version_sql(cur, kind, model_version)}, false))")
+        return [r[0] for r in cur.fetchall()]
+
+@metrics.timed("amico_db_seconds", op="delete_other_versions")
+def delete_other_versions(conn, kind: str, keep_version: str) -> int:
+    table, _, _ = PRINT_TABLES[kind]
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {table} WHERE NOT coalesce({_version_sql(cur, kind, keep_version)}, false)")
+        return cur.rowcount
+
+# ---------- Prototypes ----------
+def write_prototypes(cur, kind: str, rows) -> None:
+    """
+    Replace the stored prototypes of every user in `rows` (see PrototypeStore.rows()).
+    Takes a cursor so it can share the transaction that inserted / pruned the samples.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    users = sorted({r[0] for r in rows})
+    cur.execute("DELETE FROM amico_prototypes WHERE modality = %s AND user_id = ANY(%s::uuid[])", (kind, users))
+    vals = [(uid, kind, slot, n, psycopg2.Binary(np.asarray(emb, dtype="<f4").tobytes()))
+            for uid, slot, n, emb in rows if emb is not None and n > 0]
+    if vals:
+        execute_values(cur, "INSERT INTO amico_prototypes (user_id, modality, slot, n_samples, embedding) "
+                            "VALUES %s", vals)
+
+@metrics.timed("amico_db_seconds", op="load_prototypes")
+def load_prototypes(conn, kind: str = "voice") -> list[tuple[str, int, int, np.ndarray]]:
+    _, dim, _ = PRINT_TABLES[kind]
+    with conn.cursor() as cur:
+        cur.execute("SELECT user_id::text, slot, n_samples, embedding FROM amico_prototypes "
+                    "WHERE modality = %s AND octet_length(embedding) = %s ORDER BY user_id, slot",
+                    (kind, dim * 4))
+        return [(uid, int(slot), int(n), np.frombuffer(buf, dtype="<f4")) for uid, slot, n, buf in cur.fetchall()]
+
+# ---------- pgvector: backfill + top-k search ----------
+@metrics.timed("amico_db_seconds", op="migrate_to_pgvector")
+def migrate_to_pgvector(conn, batch_size: int = 1000) -> dict:
+    """
+    Backfill embedding_vec from the BYTEA rows, one committed batch at a time.
+    float16 / int8 rows are dequantized first, so every stored print gets a vector.
+    Resumable: only rows still missing a vector are touched. Returns rows migrated per kind.
+    """
+    from amico_gallery import DTYPES, dequantize
+    done = {}
+    for kind, (table, dim, _) in PRINT_TABLES.items():
+        done[kind] = 0
+        with conn.cursor() as cur:
+            formats = _stored_dtypes(cur, table)
+        for fmt in formats:
+            while True:
+                with conn, conn.cursor() as cur:
+                    cur.execute(f"SELECT id, embedding{', qscale' if fmt == 'int8' else ''} FROM {table} "
+                                f"WHERE embedding_vec IS NULL AND octet_length(embedding) = %s "
+                                f"ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED", (dim * DTYPES[fmt], batch_size))
+                    rows = cur.fetchall()
+                    if not rows:
+                        break
+                    codes = np.stack([np.frombuffer(r[1], dtype=np.dtype(fmt).newbyteorder("<")) for r in rows])
+                    scales = np.array([r[2] for r in rows], dtype=np.float32) if fmt == "int8" else None
+                    vals = [(r[0], _vec_literal(v)) for r, v in zip(rows, dequantize(codes, scales))]
+                    execute_values(cur, f"UPDATE {table} AS t SET embedding_vec = v.vec::vector "
+                                        f"FROM (VALUES %s) AS v(id, vec) WHERE t.id = v.id", vals)
+                done[kind] += len(rows)
+    return done
+
+def _search_setting(key: str) -> Optional[int]:
+    # ANN search breadth from db_config.json ("hnsw_ef_search" / "ivfflat_probes") or
+    # AMICO_DB_HNSW_EF_SEARCH / AMICO_DB_IVFFLAT_PROBES; None keeps the server default
+    val = os.getenv(f"AMICO_DB_{key.upper()}", _cached_db_config().get(key))
+    return int(val) if val not in (None, "") else None
+
+@metrics.timed("amico_db_seconds", op="knn_prints")
+def knn_prints(conn, kind: str, emb, k: int = 10, ef_search: Optional[int] = None,
+               probes: Optional[int] = None, model_version: Optional[str] = None) -> list[tuple[str, float]]:
+    """
+    Top-k stored samples by cosine similarity, computed in Postgres: [(user_id, sim), ...].
+    Only prints of `model_version` (default: default_model_version(kind)) are ranked,
+    so a re-embed in progress never mixes extractors. ef_search (HNSW) and probes
+    (IVFFlat) default to the "hnsw_ef_search" / "ivfflat_probes" DB settings.
+    """
+    table, dim, _ = PRINT_TABLES[kind]
+    q = _vec_literal(np.asarray(emb, dtype=np.float32).reshape(dim))
+    ef_search = ef_search or _search_setting("hnsw_ef_search")
+    probes = probes or _search_setting("ivfflat_probes")
+    with conn, conn.cursor() as cur:
+        if ef_search:
+            cur.execute("SET LOCAL hnsw.ef_search = %s", (int(ef_search),))
+        if probes:
+            cur.execute("SET LOCAL ivfflat.probes = %s", (int(probes),))
+        model_version = model_version or default_model_version(kind)
+        version = "" if model_version is None else " AND " + _version_sql(cur, kind, model_version)
+        cur.execute(f"SELECT user_id::text, 1 - (embedding_vec <=> %s::vector) FROM {table} "
+                    f"WHERE embedding_vec IS NOT NULL{version} ORDER BY embedding_vec <=> %s::vector LIMIT %s",
+                    (q, q, int(k)))
+        return [(uid, float(sim)) for uid, sim in cur.fetchall()]
+
+class PgVectorMatch:
+    """
+    VoiceMatch / FaceMatch backed by server-side ANN: for galleries too large to
+    hold on each robot. Aggregates the top-k samples per user ("max" | "mean").
+    ef_search / probes / model_version: as in knn_prints().
+    """
+    def __init__(self, kind: str = "voice", k: int = 20, agg: str = "max", ef_search: Optional[int] = None,
+                 probes: Optional[int] = None, model_version: Optional[str] = None):
+        if kind not in PRINT_TABLES:
+            raise ValueError(f"unknown kind {kind!r}")
+        if agg not in ("max", "mean"):
+            raise ValueError(f"unknown agg {agg!r}")
+        self.kind, self.k, self.agg, self.ef_search = kind, k, agg, ef_search
+        self.probes, self.model_version = probes, model_version
+
+    def __call__(self, emb) -> tuple[Optional[str], float]:
+        with pooled_conn() as conn:
+            hits = knn_prints(conn, self.kind, emb, self.k, self.ef_search, self.probes, self.model_version)
+        per_user: dict[str, list[float]] = {}
+        for uid, sim in hits:
+            per_user.setdefault(uid, []).append(sim)
+        if not per_user:
+            return None, 0.0
+        red = max if self.agg == "max" else (lambda v: sum(v) / len(v))
+        uid, score = max(((u, red(v)) for u, v in per_user.items()), key=lambda t: t[1])
+        return uid, float(score)
 
 # Optional: quick self-test
+# (`python amico_db.py --pgvector` also migrates and checks top-1 self-retrieval)
 if __name__ == "__main__":
-    conn = get_conn()
-    ensure_schema(conn)
+    import sys
+    use_vec = "--pgvector" in sys.argv
+    with pooled_conn() as conn:
+        ensure_schema(conn, pgvector=use_vec)
+        if use_vec:
+            print("migrated:", migrate_to_pgvector(conn))
+            for kind in PRINT_TABLES:
+                ids, users, embs, _ = load_prints(conn, kind)
+                if len(ids):
+                    top = knn_prints(conn, kind, embs[0], k=1)
+                    print(f"{kind}: top-1 self match {top[0][0] == users[0]} (sim {top[0][1]:.4f})")
     print("OK: connected and schema ensured")
-    conn.close()
+    close_pool()
@@ -1,47 +1,128 @@
 # amico_emotions.py
+from collections import deque
+from functools import lru_cache
+from types import SimpleNamespace
+import threading
 import numpy as np
 import torch
-import torchaudio
-import soundfile as sf
-
-# ---------- utils ----------
-def _load_mono(path: str) -> tuple[torch.Tensor, int]:
-    # (frames, ch) float32
-    data, sr = sf.read(path, dtype="float32", always_2d=True)
-    wav = torch.from_numpy(data.T)  # (ch, T)
-    if wav.size(0) > 1:
-        wav = wav.mean(dim=0, keepdim=True)
-    return wav, sr
-
-def _to_16k(wav: torch.Tensor, sr: int) -> torch.Tensor:
-    if sr != 16000:
-        wav = torchaudio.functional.resample(wav, sr, 16000)
-    # peak normalize
-    m = wav.abs().max()
-    if m > 0:
-        wav = wav / m
-    return wav
+import amico_backends as backends
+import amico_metrics as metrics
+import amico_models as models
+from amico_audio import AudioLike, _peak_normalize, as_turn_audio
 
 # ---------- LIGHT mode (prosody) ----------
+# Clip-level arousal keeps its original features: whole-clip RMS and the spectral
+# centroid of one rfft over the clip. The rfft length is the next 5-smooth size
+# (not the next power of two, which nearly doubles the work just past one) and the
+# frequency axis is cached per (sr, length).
+#
+# prosody_features() adds framed time series for callers that want them: 32 ms
+# Hann frames every 10 ms, one rfft per block of frames. With pitch=True each frame
+# is zero-padded to 2*n_fft so the same spectrum also gives a non-circular
+# autocorrelation (|X|^2 -> irfft) for pitch; that round-trip is skipped otherwise.
+FRAME_MS = 32
+HOP_MS = 10
+PITCH_MIN_HZ, PITCH_MAX_HZ = 60.0, 400.0
+_BLOCK_FRAMES = 1024          # frames per rfft call; bounds peak memory on long clips
+VOICED_AC = 0.45              # normalised autocorrelation peak above which a frame counts as voiced
+
+def _fast_len(n: int) -> int:
+    """Smallest 2^a·3^b·5^c >= n (sizes the FFT handles as fast as a power of two)."""
+    best = 1 << max(0, n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            m = p35
+            while m < n:
+                m *= 2
+            best = min(best, m)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+@lru_cache(maxsize=32)
+def _rfft_freqs(sr: int, n: int) -> torch.Tensor:
+    return torch.fft.rfftfreq(n, d=1.0 / sr)
+
+@lru_cache(maxsize=8)
+def _stft_basis(sr: int, n_fft: int, pitch: bool):
+    """Hann window, frequency axis of the frame rfft and the pitch lag range, per (sr, n_fft)."""
+    window = torch.hann_window(n_fft)
+    freqs = _rfft_freqs(sr, 2 * n_fft if pitch else n_fft)
+    lag_lo = max(1, int(sr / PITCH_MAX_HZ))
+    lag_hi = min(n_fft - 1, int(sr / PITCH_MIN_HZ))
+    return window, freqs, lag_lo, lag_hi
+
 def _feature_rms(wav: torch.Tensor) -> float:
     # RMS energy
     return float(torch.sqrt((wav**2).mean()).item())
 
 def _feature_centroid(wav: torch.Tensor, sr: int) -> float:
     # simple spectral centroid over the whole clip
-    x = wav.squeeze(0)
-    n = 1 << (x.numel()-1).bit_length()  # next pow2
-    x = torch.nn.functional.pad(x, (0, max(0, n - x.numel())))
-    X = torch.fft.rfft(x)
-    mag = X.abs() + 1e-9
-    freqs = torch.linspace(0, sr/2, steps=mag.numel())
-    centroid = float((freqs * mag).sum() / mag.sum())
-    return centroid
-
-def _arousal_from_prosody(wav: torch.Tensor, sr: int) -> float:
+    x = wav.reshape(-1)
+    mag = torch.fft.rfft(x, n=_fast_len(x.numel())).abs() + 1e-9
+    return float((_rfft_freqs(sr, _fast_len(x.numel())) * mag).sum() / mag.sum())
+
+def _frame_block(frames: torch.Tensor, sr: int, n_fft: int, pitch: bool = True):
+    """
+    (F, n_fft) frames -> numpy rms, centroid (Hz), spectral magnitude sum, and with
+    pitch=True the autocorrelation peak and pitch candidate (Hz) (else None, None).
+    """
+    window, freqs, lag_lo, lag_hi = _stft_basis(sr, n_fft, pitch)
+    rms = torch.sqrt((frames ** 2).mean(dim=1))
+    fr = frames - frames.mean(dim=1, keepdim=True)
+    mag = torch.fft.rfft(fr * window, n=2 * n_fft if pitch else n_fft).abs()
+    msum = mag.sum(dim=1)
+    cen = (mag * freqs).sum(dim=1) / (msum + 1e-9)
+    if not pitch:
+        return rms.numpy(), cen.numpy(), msum.numpy(), None, None
+    ac = torch.fft.irfft(mag ** 2, n=2 * n_fft)[:, :n_fft]
+    peak, lag = (ac[:, lag_lo:lag_hi + 1] / (ac[:, :1] + 1e-9)).max(dim=1)
+    return rms.numpy(), cen.numpy(), msum.numpy(), peak.numpy(), sr / (lag + lag_lo).numpy()
+
+def prosody_features(wav: torch.Tensor, sr: int, frame_ms: int = FRAME_MS, hop_ms: int = HOP_MS,
+                     pitch: bool = True) -> dict:
+    """
+    Per-frame prosody for a (1, T) or (T,) mono clip.
+    Returns numpy time series `times`, `rms`, `centroid` (Hz) and, with pitch=True,
+    `pitch` (Hz, 0 when unvoiced) and `voiced`, plus clip-level `stats`.
+    """
+    x = wav.reshape(-1).to(torch.float32)
+    n_fft = int(sr * frame_ms / 1000)
+    hop = int(sr * hop_ms / 1000)
+    if x.numel() < n_fft:
+        x = torch.nn.functional.pad(x, (0, n_fft - x.numel()))
+    frames = x.unfold(0, n_fft, hop)                      # (F, n_fft) view, no copy
+
+    parts = [_frame_block(frames[i:i + _BLOCK_FRAMES], sr, n_fft, pitch)
+             for i in range(0, frames.size(0), _BLOCK_FRAMES)]
+    rms, cen, msum = (np.concatenate(p) for p in list(zip(*parts))[:3])
+    stats = {
+        "rms": _feature_rms(x),
+        "rms_std": float(rms.std()) if rms.size else 0.0,
+        # magnitude-weighted over all frames, i.e. sum(f·|X|) / sum(|X|), close to
+        # the whole-clip centroid _arousal_from_prosody uses
+        "centroid": float((msum * cen).sum() / msum.sum()) if msum.sum() > 0 else 0.0,
+        "duration_s": x.numel() / sr,
+    }
+    out = {"times": np.arange(rms.size) * hop / sr, "rms": rms, "centroid": cen, "stats": stats}
+    if pitch:
+        ac_peak, f0 = (np.concatenate(p) for p in list(zip(*parts))[3:])
+        # voiced: clearly periodic and not near-silent relative to the clip
+        voiced = (ac_peak > VOICED_AC) & (rms > 0.1 * (rms.max() if rms.size else 0.0))
+        f0 = np.where(voiced, f0, 0.0)
+        stats.update(pitch_median=float(np.median(f0[voiced])) if voiced.any() else 0.0,
+                     pitch_std=float(f0[voiced].std()) if voiced.any() else 0.0,
+                     voiced_ratio=float(voiced.mean()) if voiced.size else 0.0)
+        out.update(pitch=f0, voiced=voiced)
+    return out
+
+def _arousal_from_prosody(wav: torch.Tensor, sr: int, stats: dict = None) -> float:
     # normalize RMS & centroid to z-scores using rough speech priors
-    rms = _feature_rms(wav)
-    cen = _feature_centroid(wav, sr)
+    # stats: precomputed {"rms", "centroid"} (e.g. StreamingArousal's window)
+    rms = stats["rms"] if stats else _feature_rms(wav)
+    cen = stats["centroid"] if stats else _feature_centroid(wav, sr)
     # priors (rough): rms ~ 0.05 ± 0.03 ; centroid ~ 2000 ± 800 Hz
     z_rms = (rms - 0.05) / 0.03
     z_cen = (cen - 2000.0) / 800.0
@@ -58,57 +139,265 @@ def _label_from_arousal(a: float) -> str:
     return "neutral"
 
 # ---------- HF mode (transformers) ----------
+HF_MODEL_ID = "superb/hubert-base-superb-er"
+_HF_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+class _OrtAudioClassifier:
+    # stands in for the HF model in _predict_hf: same .config, returns .logits
+    device = torch.device("cpu")
+
+    def __init__(self, config, ort_module):
+        self.config, self._ort = config, ort_module
+
+    def __call__(self, **inputs):
+        return SimpleNamespace(logits=self._ort(**inputs))
+
+def _load_hf(backend: str = "eager"):
+    # lazy import inside loader to keep startup clean
+    from transformers import AutoProcessor, AutoModelForAudioClassification
+    processor = AutoProcessor.from_pretrained(HF_MODEL_ID)
+    # int8 / onnx are CPU backends
+    device = _HF_DEVICE if backend == "eager" else "cpu"
+    model = AutoModelForAudioClassification.from_pretrained(HF_MODEL_ID).to(device).eval()
+    if backend == "int8":
+        model = backends.quantize_int8(model)
+    elif backend == "onnx":
+        path = backends.export_onnx(
+            model, (torch.zeros(1, 16000),), backends.onnx_path("hubert_er", HF_MODEL_ID),
+            ["input_values"], ["logits"], {"input_values": {0: "batch", 1: "time"}, "logits": {0: "batch"}})
+        model = _OrtAudioClassifier(model.config, backends.OrtModule(path, ["input_values"]))
+    return processor, model
+
+def _probe_hf(backend: str) -> np.ndarray:
+    processor, model = _load_hf(backend)
+    inputs = processor(backends.probe_audio(), sampling_rate=16000, return_tensors="pt")
+    with torch.no_grad():
+        return model(**inputs).logits.cpu().numpy()
+
+models.register("hubert_er", lambda: _load_hf(backends.backend_for("hubert_er")), size_mb=380)
+backends.register_probe("hubert_er", _probe_hf)
+
+@metrics.timed("amico_inference_seconds", model="hubert_er")
 def _predict_hf(wav16: torch.Tensor):
     """
     Returns: dict(label, scores={label: prob, ...})
-    Model: superb/hubert-base-superb-er
+    Model: superb/hubert-base-superb-er (loaded once via amico_models)
     """
-    # lazy import inside function to keep startup clean
-    from transformers import AutoProcessor, AutoModelForAudioClassification
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-
-    model_id = "superb/hubert-base-superb-er"
-    processor = AutoProcessor.from_pretrained(model_id)
-    model = AutoModelForAudioClassification.from_pretrained(model_id).to(device)
+    processor, model = models.get("hubert_er")
     with torch.no_grad():
         inputs = processor(wav16.squeeze(0).cpu().numpy(), sampling_rate=16000, return_tensors="pt")
-        logits = model(**{k: v.to(device) for k, v in inputs.items()}).logits
+        logits = model(**{k: v.to(model.device) for k, v in inputs.items()}).logits
         probs = torch.softmax(logits, dim=-1).squeeze(0).cpu().numpy()
     id2label = model.config.id2label
     scores = {id2label[i]: float(p) for i, p in enumerate(probs)}
     label = max(scores, key=scores.get)
     return {"label": label, "scores": scores}
 
+def _arousal_from_scores(scores: dict) -> float:
+    # map to an arousal proxy from probabilities (excited > calm)
+    arousal = (
+        scores.get("angry", 0.0) * 0.9 +
+        scores.get("happy", 0.7) +
+        scores.get("neutral", 0.4) +
+        scores.get("sad", 0.1)
+    )
+    return float(max(0.0, min(1.0, arousal)))
+
 # ---------- Public API ----------
-def detect_emotion(audio_path: str, mode: str = "light") -> dict:
+def detect_emotion(audio: AudioLike, mode: str = "light") -> dict:
     """
+    audio: WAV path or an already-decoded amico_audio.TurnAudio
     Returns a dict with:
       - mode: "light" or "hf"
       - label: str
       - arousal: float in [0,1]  (always present; for HF it's mapped from probs)
       - scores: dict(label->prob) (HF only)
     """
-    wav, sr = _load_mono(audio_path)
-    wav16 = _to_16k(wav, sr)
+    wav16 = as_turn_audio(audio).wav16_norm
 
     if mode == "hf":
         try:
-            out = _predict_hf(wav16)
-            # map to an arousal proxy from probabilities (excited > calm)
+            with metrics.timer("amico_stage_seconds", stage="emotion_hf"):
+                out = _predict_hf(wav16)
             emo = out["label"]
             scores = out["scores"]
-            arousal = (
-                scores.get("angry", 0.0) * 0.9 +
-                scores.get("happy", 0.7) +
-                scores.get("neutral", 0.4) +
-                scores.get("sad", 0.1)
-            )
-            arousal = float(max(0.0, min(1.0, arousal)))
-            return {"mode": "hf", "label": emo, "arousal": arousal, "scores": scores}
+            return {"mode": "hf", "label": emo, "arousal": _arousal_from_scores(scores), "scores": scores}
         except Exception:
             # fall back to light on any issue (e.g., transformers not installed)
-            pass
+            metrics.inc("amico_emotion_hf_fallbacks_total")
 
     # LIGHT fallback / default
-    a = _arousal_from_prosody(wav16, 16000)
+    with metrics.timer("amico_stage_seconds", stage="emotion_light"):
+        a = _arousal_from_prosody(wav16, 16000)
     return {"mode": "light", "label": _label_from_arousal(a), "arousal": a}
+
+
+# ---------- Streaming (live arousal while the person speaks) ----------
+class StreamingArousal:
+    """
+    Light-mode arousal over a sliding window of microphone audio.
+
+    feed() takes 16 kHz float32 chunks of any size (e.g. amico_listen's on_chunk),
+    cuts them into the same frames prosody_features() uses and keeps running sums
+    over the last `window_s`, so each update costs O(new frames), not O(window).
+    The sums are recomputed from the window once per window length, so float
+    round-off from the add / subtract updates can't accumulate.
+    Levels are normalised by a decaying running peak, standing in for the
+    whole-clip peak normalisation detect_emotion() applies.
+
+    Every `emit_every_s` of audio the raw arousal is EMA-smoothed and reported to
+    on_event(dict(t, arousal, raw, label, mode, changed)); `changed` flags a label
+    flip. With hf_every_s > 0 the HF model also scores the last
+    `hf_window_s` on a background thread at most that often; its arousal is
+    folded into the same EMA and the event carries mode="hf" and scores.
+    """
+    def __init__(self, on_event=None, sr: int = 16000, window_s: float = 2.0,
+                 emit_every_s: float = 0.2, alpha: float = 0.3, peak_decay_s: float = 10.0,
+                 hf_every_s: float = 0.0, hf_window_s: float = 3.0):
+        self.on_event = on_event
+        self.sr = sr
+        self.n_fft = int(sr * FRAME_MS / 1000)
+        self.hop = int(sr * HOP_MS / 1000)
+        self.win_frames = max(1, int(window_s * 1000 / HOP_MS))
+        self.emit_frames = max(1, int(emit_every_s * 1000 / HOP_MS))
+        self.alpha = alpha
+        self.peak_decay = float(np.exp(-self.hop / (peak_decay_s * sr)))   # per frame
+        self.hf_every = int(hf_every_s * sr)
+        self.hf_window = int(hf_window_s * sr)
+        self._lock = threading.Lock()
+        self._hf_thread = None
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending = np.zeros(0, dtype=np.float32)   # samples not yet framed
+            self._frames = deque()      # (ms, m*centroid, m) per frame; m = magnitude sum
+            self._sum_ms = self._sum_wc = self._sum_w = 0.0
+            self._since_resum = 0       # frames since the sums were last recomputed
+            self._peak = 0.0            # running sample peak
+            self._n_seen = 0            # frames consumed so far
+            self._since_emit = 0
+            self.arousal = None         # smoothed
+            self.label = None
+            self._hf_tail = deque()     # recent raw chunks for HF scoring
+            self._hf_tail_n = 0
+            self._hf_due = self.hf_every
+
+    @property
+    def t(self) -> float:
+        """Seconds of audio consumed."""
+        return self._n_seen * self.hop / self.sr
+
+    def feed(self, chunk) -> None:
+        x = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        if x.size == 0:
+            return
+        events = []
+        with self._lock:
+            self._peak = max(self._peak * self.peak_decay ** (x.size / self.hop), float(np.abs(x).max()))
+            if self.hf_every > 0:
+                self._push_hf(x)
+            buf = np.concatenate([self._pending, x]) if self._pending.size else x
+            nf = (buf.size - self.n_fft) // self.hop + 1 if buf.size >= self.n_fft else 0
+            if nf > 0:
+                frames = torch.from_numpy(np.ascontiguousarray(buf)).unfold(0, self.n_fft, self.hop)[:nf]
+                rms, cen, msum, _, _ = _frame_block(frames, self.sr, self.n_fft, pitch=False)
+                for k in range(nf):
+                    self._push_frame(float(rms[k]), float(cen[k]), float(msum[k]), events)
+            self._pending = buf[nf * self.hop:].copy()
+            hf_audio = self._take_hf()
+            if hf_audio is not None:
+                self._start_hf(hf_audio)
+        for ev in events:
+            self._emit(ev)
+
+    def stats(self) -> dict:
+        """Window rms, centroid and duration_s: the clip stats _arousal_from_prosody reads."""
+        with self._lock:
+            return self._stats()
+
+    def close(self, timeout: float = 5.0) -> None:
+        t = self._hf_thread
+        if t is not None:
+            t.join(timeout)
+
+    # ---------- internals (lock held unless noted) ----------
+    def _push_frame(self, rms: float, cen: float, w: float, events: list) -> None:
+        ms = rms * rms
+        self._frames.append((ms, w * cen, w))
+        self._sum_ms += ms; self._sum_wc += w * cen; self._sum_w += w
+        if len(self._frames) > self.win_frames:
+            ms, wc, w = self._frames.popleft()
+            self._sum_ms -= ms; self._sum_wc -= wc; self._sum_w -= w
+        self._since_resum += 1
+        if self._since_resum >= self.win_frames:
+            self._resum()
+        self._n_seen += 1
+        self._since_emit += 1
+        if self._since_emit >= self.emit_frames:
+            self._since_emit = 0
+            ev = self._update(_arousal_from_prosody(None, self.sr, self._stats()), "light")
+            if ev:
+                events.append(ev)
+
+    def _resum(self) -> None:
+        # exact sums over the window: O(window) once per window, i.e. O(1) per frame
+        a = np.array(self._frames, dtype=np.float64).reshape(-1, 3)
+        self._sum_ms, self._sum_wc, self._sum_w = (float(v) for v in a.sum(axis=0))
+        self._since_resum = 0
+
+    def _stats(self) -> dict:
+        n = len(self._frames)
+        rms = np.sqrt(max(0.0, self._sum_ms) / n) if n else 0.0
+        return {
+            "rms": float(rms / self._peak) if self._peak > 0 else 0.0,
+            "centroid": self._sum_wc / self._sum_w if self._sum_w > 0 else 0.0,
+            "duration_s": n * self.hop / self.sr,
+        }
+
+    def _update(self, raw: float, mode: str, scores: dict = None):
+        prev = self.label
+        self.arousal = raw if self.arousal is None else self.alpha * raw + (1 - self.alpha) * self.arousal
+        self.label = _label_from_arousal(self.arousal)
+        ev = {"t": self.t, "arousal": self.arousal, "raw": raw, "label": self.label, "mode": mode}
+        if scores is not None:
+            ev["scores"] = scores
+        ev["changed"] = self.label != prev
+        return ev
+
+    def _push_hf(self, x: np.ndarray) -> None:
+        self._hf_tail.append(x)
+        self._hf_tail_n += x.size
+        while self._hf_tail and self._hf_tail_n - self._hf_tail[0].size >= self.hf_window:
+            self._hf_tail_n -= self._hf_tail.popleft().size
+        self._hf_due -= x.size
+
+    def _take_hf(self):
+        # due and idle -> copy of the recent audio; a busy model just skips this slot
+        if self.hf_every <= 0 or self._hf_due > 0:
+            return None
+        if self._hf_thread is not None and self._hf_thread.is_alive():
+            return None
+        self._hf_due = self.hf_every
+        return np.concatenate(self._hf_tail)[-self.hf_window:]
+
+    def _start_hf(self, audio: np.ndarray) -> None:
+        # under the lock, so two feeders can't both see the model idle and start it
+        self._hf_thread = threading.Thread(target=self._run_hf, args=(audio,),
+                                           name="amico-emo-hf", daemon=True)
+        self._hf_thread.start()
+
+    def _run_hf(self, audio: np.ndarray) -> None:
+        try:
+            out = _predict_hf(_peak_normalize(torch.from_numpy(audio).reshape(1, -1)))
+        except Exception:
+            self.hf_every = 0      # e.g. transformers missing: stay in light mode
+            return
+        with self._lock:
+            ev = self._update(_arousal_from_scores(out["scores"]), "hf", out["scores"])
+        self._emit(ev)
+
+    def _emit(self, ev: dict) -> None:
+        # lock not held: callbacks may call back into stats()
+        if self.on_event is not None:
+            self.on_event(ev)
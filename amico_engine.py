@@ -0,0 +1,256 @@
+# amico_engine.py — pipelined, non-interactive turn engine (asyncio)
+#
+#   capture ──q_audio──► analyse (stt ∥ audio emotion ∥ voiceprint/identity,
+#                                  then text emotion + fusion) ──q_results──► on_turn
+#
+# Capture runs on its own thread, so the next utterance is recorded while the
+# current one is analysed. The queues are bounded: a slow consumer stalls analysis,
+# and a full q_audio stalls capture, whose ~10 s microphone queue then starts
+# dropping incoming frames (see amico_listen). Each model stage has its own concurrency limit, so
+# e.g. whisper never runs twice at once on the Pi. When the user starts speaking
+# again (barge-in), only the response being delivered (an on_turn coroutine, e.g.
+# TTS playback) is cancelled; STT, emotion and identity of every captured turn
+# still run to completion and are delivered.
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Union
+import asyncio, threading, time
+import numpy as np
+import amico_metrics as metrics
+from amico_audio import TurnAudio, as_turn_audio
+
+DEFAULT_LIMITS = {"stt": 1, "emotion": 2, "text_emotion": 1, "vp": 1, "identity": 1}
+MIN_TEXT_CHARS = 8      # same cut-off as the interactive loop: shorter text → audio-only emotion
+
+@dataclass
+class TurnResult:
+    seq: int
+    audio: TurnAudio
+    text: str = ""
+    language: str = "und"
+    emotion_audio: Optional[dict] = None
+    emotion_text: Optional[dict] = None
+    fused: Optional[tuple] = None               # (arousal, label) from fuse_audio_text
+    voiceprint: Optional[np.ndarray] = None
+    identity: Any = None                        # amico_id_types.Decision when an orchestrator is set
+    errors: Dict[str, str] = field(default_factory=dict)
+    interrupted: bool = False                   # its on_turn response was cut short by barge-in
+    timings: Dict[str, float] = field(default_factory=dict)   # stage -> seconds
+    t_captured: float = 0.0
+    latency_s: float = 0.0                      # end of capture → result ready
+
+class TurnEngine:
+    """
+    on_turn(TurnResult) is called for every finished turn (plain function or coroutine).
+    identity: optional IdentityOrchestrator; when set, its identify_turn() replaces the
+      plain vp() stage (it extracts the voiceprint itself).
+    limits: per-stage concurrency, merged over DEFAULT_LIMITS.
+    max_inflight: turns analysed at the same time.
+    barge_in: when the user starts speaking, cancel the on_turn coroutine that is
+      responding to an earlier turn (see interrupt()). A plain-function on_turn
+      can't be interrupted. Analysis is never dropped.
+    """
+    def __init__(self, on_turn: Callable[[TurnResult], Union[None, Awaitable[None]]],
+                 identity=None, emotion_mode: str = "light", text_emotion: bool = True,
+                 limits: Optional[Dict[str, int]] = None, audio_queue: int = 2, result_queue: int = 4,
+                 max_inflight: int = 2, barge_in: bool = True, listen_kwargs: Optional[dict] = None):
+        self.on_turn = on_turn
+        self.identity = identity
+        self.emotion_mode = emotion_mode
+        self.text_emotion = text_emotion
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.audio_queue, self.result_queue = audio_queue, result_queue
+        self.max_inflight = max_inflight
+        self.barge_in = barge_in
+        self.listen_kwargs = listen_kwargs or {}
+        self.stats = {"captured": 0, "completed": 0, "cancelled": 0, "interrupted": 0, "capture_waits": 0}
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self._responding: Optional[asyncio.Task] = None
+
+    # ---------- public ----------
+    async def run(self, source: Optional[Iterable] = None) -> None:
+        """
+        Run until stop() (or until `source` is exhausted). source: iterable of paths /
+        TurnAudio to replay instead of the microphone (e.g. fixtures).
+        """
+        self._loop = asyncio.get_running_loop()
+        self._sems = {k: asyncio.Semaphore(max(1, v)) for k, v in self.limits.items()}
+        self._q_audio: asyncio.Queue = asyncio.Queue(maxsize=self.audio_queue)
+        self._q_results: asyncio.Queue = asyncio.Queue(maxsize=self.result_queue)
+        self._slots = asyncio.Semaphore(max(1, self.max_inflight))
+        capture = threading.Thread(target=self._capture, args=(source,), name="amico-engine-capture", daemon=True)
+        capture.start()
+        dispatcher = asyncio.create_task(self._dispatch())
+        deliverer = asyncio.create_task(self._deliver())
+        try:
+            await dispatcher
+            if self._inflight:
+                await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+            await self._q_results.join()
+        finally:
+            self._stop.set()
+            dispatcher.cancel()
+            deliverer.cancel()
+            for t in list(self._inflight.values()):
+                t.cancel()
+
+    def stop(self) -> None:
+        """Thread-safe: stop capturing; turns already queued are still delivered."""
+        self._stop.set()
+
+    def interrupt(self) -> None:
+        """Thread-safe barge-in: cancel the on_turn response in progress, if any."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._interrupt)
+
+    def cancel_inflight(self) -> None:
+        """Thread-safe: drop every turn still being analysed (their results are lost)."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel_all)
+
+    def queue_depths(self) -> dict:
+        return {"audio": self._q_audio.qsize(), "results": self._q_results.qsize(), "inflight": len(self._inflight)}
+
+    # ---------- capture (thread) ----------
+    def _capture(self, source) -> None:
+        try:
+            if source is not None:
+                for item in source:
+                    if self._stop.is_set():
+                        break
+                    self._enqueue(as_turn_audio(item) if not isinstance(item, TurnAudio) else item)
+            else:
+                from amico_listen import stream_utterances
+                # fires once per utterance, after min_speech_ms of voiced audio: a cough or
+                # a click the VAD lets through (and then drops) doesn't interrupt anything
+                on_speech = self.interrupt if self.barge_in else None
+                for audio in stream_utterances(stop_event=self._stop, on_speech=on_speech, **self.listen_kwargs):
+                    self._enqueue(audio)
+        finally:
+            if self._loop is not None and not self._loop.is_closed():
+                asyncio.run_coroutine_threadsafe(self._q_audio.put(None), self._loop)
+
+    def _enqueue(self, audio: TurnAudio) -> None:
+        if self._q_audio.full():
+            self.stats["capture_waits"] += 1        # backpressure: analysis is behind
+            metrics.inc("amico_engine_capture_waits_total")
+        asyncio.run_coroutine_threadsafe(self._q_audio.put((time.monotonic(), audio)), self._loop).result()
+        self.stats["captured"] += 1
+
+    # ---------- analysis ----------
+    async def _dispatch(self) -> None:
+        seq = 0
+        while True:
+            item = await self._q_audio.get()
+            if item is None:
+                return
+            await self._slots.acquire()
+            seq += 1
+            task = asyncio.create_task(self._turn(seq, *item))
+            self._inflight[seq] = task
+            task.add_done_callback(lambda t, s=seq: self._finished(s, t))
+
+    def _finished(self, seq: int, task: asyncio.Task) -> None:
+        self._inflight.pop(seq, None)
+        self._slots.release()
+        if task.cancelled():
+            self.stats["cancelled"] += 1
+            metrics.inc("amico_engine_turns_total", outcome="cancelled")
+
+    def _cancel_all(self) -> None:
+        for t in list(self._inflight.values()):
+            t.cancel()
+
+    def _interrupt(self) -> None:
+        if self._responding is not None:
+            self._responding.cancel()
+
+    async def _stage(self, name: str, res: TurnResult, fn, *args, **kwargs):
+        sem = self._sems[name]
+        await sem.acquire()
+        # the permit is released when the thread finishes, not when the turn is
+        # cancelled: a cancelled whisper decode keeps running until it returns
+        work = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+        work.add_done_callback(lambda f: (sem.release(), f.cancelled() or f.exception()))
+        t0 = time.perf_counter()
+        try:
+            with metrics.timer("amico_engine_stage_seconds", stage=name):
+                return await asyncio.shield(work)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            res.errors[name] = f"{type(e).__name__}: {e}"
+            return None
+        finally:
+            res.timings[name] = time.perf_counter() - t0
+
+    async def _turn(self, seq: int, t_captured: float, audio: TurnAudio) -> None:
+        from amico_stt import stt
+        from amico_emotions import detect_emotion
+        res = TurnResult(seq=seq, audio=audio, t_captured=t_captured)
+
+        async def _text_branch():
+            out = await self._stage("stt", res, stt, audio)
+            if out:
+                res.text, res.language = out[0], out[1] or "und"
+            if self.text_emotion and len((res.text or "").strip()) >= MIN_TEXT_CHARS:
+                from amico_txt_emotion import detect_text_emotion
+                res.emotion_text = await self._stage("text_emotion", res, detect_text_emotion,
+                                                     res.text, lang=res.language or "en")
+
+        async def _emotion():
+            res.emotion_audio = await self._stage("emotion", res, detect_emotion, audio, mode=self.emotion_mode)
+
+        async def _voice():
+            if self.identity is not None:
+                res.identity = await self._stage("identity", res, self.identity.identify_turn, audio)
+            else:
+                from amico_vp import vp
+                res.voiceprint = await self._stage("vp", res, vp, audio)
+
+        await asyncio.gather(_text_branch(), _emotion(), _voice())
+        if res.emotion_audio and res.emotion_text:
+            from amico_fuse_emotion import fuse_audio_text
+            res.fused = fuse_audio_text(res.emotion_audio["arousal"], res.emotion_text["dist"])
+        res.latency_s = time.monotonic() - t_captured
+        await self._q_results.put(res)
+
+    # ---------- delivery ----------
+    async def _deliver(self) -> None:
+        while True:
+            res = await self._q_results.get()
+            try:
+                out = self.on_turn(res)
+                if asyncio.iscoroutine(out):
+                    # wait() instead of await: a barge-in cancels the response, not the deliverer
+                    self._responding = asyncio.ensure_future(out)
+                    try:
+                        await asyncio.wait({self._responding})
+                    except asyncio.CancelledError:
+                        self._responding.cancel()
+                        raise
+                    if self._responding.cancelled():
+                        res.interrupted = True
+                        self.stats["interrupted"] += 1
+                        metrics.inc("amico_engine_turns_total", outcome="interrupted")
+                    else:
+                        self._responding.result()
+            except Exception as e:
+                res.errors["on_turn"] = f"{type(e).__name__}: {e}"
+            finally:
+                self._responding = None
+                self.stats["completed"] += 1
+                metrics.inc("amico_engine_turns_total", outcome="completed")
+                metrics.observe("amico_engine_turn_latency_seconds", res.latency_s)
+                self._q_results.task_done()
+
+def run_engine(on_turn, source: Optional[Iterable] = None, **kwargs) -> TurnEngine:
+    """Blocking helper: build a TurnEngine, run it until stopped / source exhausted, return it."""
+    engine = TurnEngine(on_turn, **kwargs)
+    try:
+        asyncio.run(engine.run(source))
+    except KeyboardInterrupt:
+        engine.stop()
+    return engine
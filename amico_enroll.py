@@ -3,6 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Dict, Optional, Callable, List
 import numpy as np
+from amico_id_types import PolicyConfig
 
 # Simple name extractor fallback (replace with your LLM later)
 def extract_name_simple(text: str) -> Optional[str]:
@@ -14,37 +15,124 @@ def extract_name_simple(text: str) -> Optional[str]:
     name = " ".join(parts[:2])
     return name.title()
 
+# kind -> (embedding dim, dedup cosine threshold) of the enrollment buffers
+BUFFERS = {"voice": (192, 0.95), "face": (512, 0.93)}
+
+class EmbeddingBuffer:
+    """
+    Fixed-capacity store of L2-normalised samples for one modality, preallocated
+    as a (capacity, dim) float32 array so a long enrollment never grows memory.
+      - a sample within `dedup_threshold` cosine of one already held is a
+        near-duplicate: it only replaces that one if its quality is higher
+      - when full, a new sample evicts the lowest-quality one (if it beats it)
+    so the buffer always holds the best `capacity` distinct samples seen.
+    quality: det_score for faces, match similarity / SNR for voice; higher is better.
+    `accepted` counts every valid sample offered (kept, deduplicated or outranked):
+    enrollment progress, which near-identical samples can't stall.
+    """
+    def __init__(self, dim: int, capacity: int = 10, dedup_threshold: float = 0.95):
+        if int(capacity) < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        self.dim, self.capacity, self.dedup_threshold = dim, int(capacity), dedup_threshold
+        self._embs = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._quality = np.zeros(self.capacity, dtype=np.float32)
+        self._n = 0
+        self.seen = self.accepted = self.duplicates = self.rejected = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def add(self, emb: np.ndarray, quality: float = 1.0) -> bool:
+        """Returns True if the sample was kept (appended or replaced a worse one)."""
+        self.seen += 1
+        e = np.asarray(emb, dtype=np.float32).reshape(-1)
+        n = float(np.linalg.norm(e)) if e.size == self.dim else 0.0
+        if not (n > 0 and np.isfinite(n)):
+            self.rejected += 1
+            return False
+        e = e / n
+        q = float(quality)
+        self.accepted += 1
+        if self._n:
+            sims = self._embs[:self._n] @ e
+            j = int(np.argmax(sims))
+            if sims[j] >= self.dedup_threshold:
+                self.duplicates += 1
+                if q <= self._quality[j]:
+                    return False
+                self._embs[j], self._quality[j] = e, q
+                return True
+        if self._n < self.capacity:
+            j = self._n
+            self._n += 1
+        else:
+            j = int(np.argmin(self._quality))
+            if q <= self._quality[j]:
+                self.rejected += 1
+                return False
+        self._embs[j], self._quality[j] = e, q
+        return True
+
+    def top(self, k: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        """(k, dim) matrix and (k,) qualities, best first; a copy, ready for bulk insert."""
+        order = np.argsort(-self._quality[:self._n], kind="stable")[:k]
+        return self._embs[order].copy(), self._quality[order].copy()
+
+    def clear(self) -> None:
+        self._n = 0
+        self.seen = self.accepted = self.duplicates = self.rejected = 0
+
+def _buffer(kind: str, capacity: int = 10) -> EmbeddingBuffer:
+    dim, dedup = BUFFERS[kind]
+    return EmbeddingBuffer(dim, max(1, int(capacity)), dedup)   # a 0 print cap still collects one
+
 @dataclass
 class EnrollState:
     collecting: bool = False
     user_id: Optional[str] = None
-    voice_embs: List[np.ndarray] = field(default_factory=list)
-    face_embs:  List[np.ndarray] = field(default_factory=list)
+    voice_embs: EmbeddingBuffer = field(default_factory=lambda: _buffer("voice"))
+    face_embs:  EmbeddingBuffer = field(default_factory=lambda: _buffer("face"))
     needed_voice: int = 3
     needed_face: int = 3
 
 class EnrollmentManager:
-    def __init__(self): self.state = EnrollState()
+    def __init__(self, cfg: Optional[PolicyConfig] = None):
+        # buffer caps follow the per-user print limits, so finish() never yields more than gets kept
+        self.cfg = cfg or PolicyConfig()
+        self.state = self._new_state()
+
+    def _new_state(self, **kw) -> EnrollState:
+        return EnrollState(voice_embs=_buffer("voice", self.cfg.max_voiceprints_per_user),
+                           face_embs=_buffer("face", self.cfg.max_faceprints_per_user), **kw)
 
     def start(self, name_text: str) -> Optional[str]:
         uid = extract_name_simple(name_text)
         if not uid: return None
-        self.state = EnrollState(collecting=True, user_id=uid)
+        self.state = self._new_state(collecting=True, user_id=uid)
         return uid
 
-    def add_voice(self, emb: np.ndarray):
-        if self.state.collecting: self.state.voice_embs.append(emb)
+    def add_voice(self, emb: np.ndarray, quality: float = 1.0) -> bool:
+        return self.state.collecting and self.state.voice_embs.add(emb, quality)
 
-    def add_face(self, emb: np.ndarray):
-        if self.state.collecting: self.state.face_embs.append(emb)
+    def add_face(self, emb: np.ndarray, quality: float = 1.0) -> bool:
+        return self.state.collecting and self.state.face_embs.add(emb, quality)
 
     def done(self) -> bool:
+        # counts valid samples, not distinct ones: a speaker who keeps giving near-identical
+        # samples (or more than the buffer holds) still finishes
         s = self.state
-        return s.collecting and len(s.voice_embs) >= s.needed_voice and len(s.face_embs) >= s.needed_face
+        return s.collecting and s.voice_embs.accepted >= s.needed_voice and s.face_embs.accepted >= s.needed_face
 
-    def finish(self):
+    def finish(self, k_voice: Optional[int] = None, k_face: Optional[int] = None, with_quality: bool = False):
+        """
+        Returns (user_id, V, F): (n, 192) and (n, 512) float32 matrices, best quality
+        first, for one bulk insert each (e.g. EmbeddingGallery.store). with_quality=True
+        returns (V, v_quality) / (F, f_quality) pairs instead (f_quality → det_scores).
+        """
         s = self.state
         uid = s.user_id
-        v = list(s.voice_embs); f = list(s.face_embs)
-        self.state = EnrollState()
+        v = s.voice_embs.top(k_voice); f = s.face_embs.top(k_face)
+        self.state = self._new_state()
+        if not with_quality:
+            v, f = v[0], f[0]
         return uid, v, f  # you will STORE_* these via your DB adapters
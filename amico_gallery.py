@@ -0,0 +1,609 @@
+# amico_gallery.py
+from __future__ import annotations
+from typing import Optional, Iterable, Sequence, Dict, List, Tuple
+import threading
+import numpy as np
+
+# kind -> (table, dim, action that stores a new sample of this modality)
+KINDS = {
+    "voice": ("amico_voiceprints", 192, "STORE_VOICE"),
+    "face":  ("amico_faceprints",  512, "STORE_FACE"),
+}
+AGGS = ("max", "mean", "centroid")
+# storage dtype -> bytes per component; int8 rows carry one float32 scale each
+DTYPES = {"float32": 4, "float16": 2, "int8": 1}
+_SCAN_ROWS = 4096   # quantized rows are widened to float32 this many at a time
+
+def _l2n(x: np.ndarray) -> np.ndarray:
+    # row-wise L2 normalisation (works for (dim,) and (N, dim))
+    n = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(n, 1e-8)
+
+# ---------- compact storage ----------
+def quantize(x: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    (N, dim) float -> (codes, scales). float16 is a plain cast; int8 is symmetric
+    per-vector: codes = round(x / s), s = max|x| / 127 (scales is None otherwise).
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"unknown dtype {dtype!r} (expected one of {list(DTYPES)})")
+    x = np.asarray(x, dtype=np.float32)
+    if dtype == "float32":
+        return x, None
+    if dtype == "float16":
+        return x.astype(np.float16), None
+    s = np.abs(x).max(axis=-1) / 127.0
+    s = np.where(s > 0, s, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(x / s[..., None]), -127, 127).astype(np.int8)
+    return codes, s
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    x = np.asarray(codes).astype(np.float32)
+    return x * scales[..., None] if scales is not None else x
+
+class EmbeddingGallery:
+    """
+    In-memory index of every enrolled sample for one modality ("voice" | "face").
+
+    Samples live in one contiguous (N, dim) matrix, L2-normalised (float32, or
+    float16 / per-row-scaled int8 with `dtype`), so a query is scored against all
+    users with a single mat-vec product and then reduced per user with `agg`:
+      - "max":      best raw sample of each user
+      - "mean":     mean similarity over the user's samples
+      - "centroid": best of the user's prototypes (see PrototypeStore): the
+                    running normalised mean plus `n_protos` k-means prototypes
+    Instances are callable, so they plug straight into IdentityOrchestrator as
+    voice_match / face_match: gallery(emb) -> (user_id | None, score).
+    """
+    def __init__(self, kind: str = "voice", agg: str = "max", capacity: int = 256, n_protos: int = 0,
+                 dtype: str = "float32"):
+        if kind not in KINDS:
+            raise ValueError(f"unknown kind {kind!r} (expected one of {list(KINDS)})")
+        if agg not in AGGS:
+            raise ValueError(f"unknown agg {agg!r} (expected one of {AGGS})")
+        if dtype not in DTYPES:
+            raise ValueError(f"unknown dtype {dtype!r} (expected one of {list(DTYPES)})")
+        self.kind = kind
+        self.table, self.dim, self.action_kind = KINDS[kind]
+        self.agg = agg
+        self.dtype = dtype   # "float16" / "int8": 2-4x less memory; scored without a float32 copy
+        self.model_version: Optional[str] = None   # extractor tag written by store() (None: the current one)
+        cap = max(1, int(capacity))
+        self._embs = np.zeros((cap, self.dim), dtype=dtype)       # row -> sample (stored dtype)
+        self._scales = np.ones(cap, dtype=np.float32)              # row -> int8 scale (1 otherwise)
+        self._uidx = np.zeros(cap, dtype=np.int64)                 # row -> user index
+        self._rids = np.full(cap, -1, dtype=np.int64)              # row -> DB id (-1 = not persisted)
+        self._n = 0
+        self._users: List[str] = []
+        self._user_pos: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._index = None   # cached (order, starts, counts, proto_pos); rebuilt after changes
+        # agg="centroid": per-user prototypes maintained in O(dim) as samples come and go
+        self.protos = PrototypeStore(kind, n_protos) if agg == "centroid" else None
+
+    # ---------- construction ----------
+    @classmethod
+    def from_db(cls, conn, kind: str = "voice", agg: str = "max", n_protos: int = 0,
+                dtype: str = "float32", model_version: Optional[str] = None) -> "EmbeddingGallery":
+        """
+        Load every stored sample of `kind` from Postgres (binary COPY); rows stored in
+        another format are converted to `dtype` on load. Only prints of `model_version`
+        (default: the current extractor, amico_vp_version.MODEL_VERSION for voice) are loaded,
+        and store() tags new rows with the same version.
+        """
+        from amico_db import load_prints, default_model_version   # lazy: the index itself doesn't need psycopg2
+        model_version = model_version or default_model_version(kind)
+        row_ids, user_ids, embs, scales = load_prints(conn, kind, dtype, model_version)
+        g = cls(kind, agg, capacity=len(row_ids), n_protos=n_protos, dtype=dtype)
+        g.model_version = model_version
+        g.add_many(user_ids, embs, row_ids, scales=scales)
+        if g.protos is not None and n_protos:
+            g.refresh_prototypes()
+        return g
+
+    # ---------- mutation ----------
+    def add(self, user_id: str, emb: np.ndarray, row_id: int = -1) -> None:
+        emb = np.asarray(emb, dtype=np.float32).reshape(-1)
+        if emb.size != self.dim or not np.isfinite(emb).all():
+            raise ValueError(f"{self.kind} embedding must be a finite ({self.dim},) vector")
+        with self._lock:
+            self._reserve(self._n + 1)
+            self._append(user_id, emb, row_id)
+
+    def add_many(self, user_ids: Sequence[str], embs: np.ndarray,
+                 row_ids: Optional[Sequence[int]] = None, scales: Optional[np.ndarray] = None) -> None:
+        """
+        Bulk add. `embs` is float (normalised + quantized here) or, when its dtype
+        already matches the gallery's (e.g. rows from load_prints), stored as is.
+        """
+        embs = np.asarray(embs)
+        raw = self.dtype != "float32" and embs.dtype == np.dtype(self.dtype)
+        if not raw:
+            embs = embs.astype(np.float32, copy=False)
+        embs = embs.reshape(-1, self.dim)
+        if len(user_ids) != len(embs):
+            raise ValueError("user_ids and embs must have the same length")
+        idx = np.flatnonzero(np.isfinite(embs).all(axis=1))
+        with self._lock:
+            n, k = self._n, idx.size
+            self._reserve(n + k)
+            if raw:
+                self._embs[n:n + k] = embs[idx]
+                self._scales[n:n + k] = 1.0 if scales is None else np.asarray(scales, dtype=np.float32)[idx]
+            else:
+                codes, sc = quantize(_l2n(embs[idx]), self.dtype)
+                self._embs[n:n + k] = codes
+                self._scales[n:n + k] = 1.0 if sc is None else sc
+            self._uidx[n:n + k] = [self._user_index(user_ids[i]) for i in idx]
+            self._rids[n:n + k] = -1 if row_ids is None else np.asarray(row_ids, dtype=np.int64)[idx]
+            self._n = n + k
+            self._index = None
+            if self.protos is not None:
+                for r in range(n, n + k):
+                    self.protos.add(self._users[self._uidx[r]], self._row(r))
+
+    def remove(self, user_id: Optional[str] = None, row_ids: Optional[Iterable[int]] = None) -> int:
+        """Drop all samples of `user_id` and/or the given DB row ids. Returns rows removed."""
+        with self._lock:
+            n = self._n
+            drop = np.zeros(n, dtype=bool)
+            if user_id is not None and user_id in self._user_pos:
+                drop |= self._uidx[:n] == self._user_pos[user_id]
+            if row_ids is not None:
+                ids = np.fromiter(row_ids, dtype=np.int64)
+                if ids.size:
+                    drop |= np.isin(self._rids[:n], ids)
+            k = int(drop.sum())
+            if k and self.protos is not None:
+                for r in np.flatnonzero(drop):
+                    self.protos.evict(self._users[self._uidx[r]], self._row(r))
+            if k:
+                keep = ~drop
+                m = n - k
+                self._embs[:m] = self._embs[:n][keep]
+                self._scales[:m] = self._scales[:n][keep]
+                self._uidx[:m] = self._uidx[:n][keep]
+                self._rids[:m] = self._rids[:n][keep]
+                self._n = m
+                self._index = None
+            return k
+
+    def store(self, conn, user_id: str, embs: np.ndarray, cfg=None, **meta):
+        """
+        Persist new samples (amico_db.insert_*prints, pruned per `cfg`) and mirror
+        them here once the transaction has committed. In centroid mode the user's
+        prototypes are rebuilt from the resulting samples (k-means included) and
+        written to amico_prototypes in the same transaction as the samples.
+        Returns (new row ids, pruned row ids).
+        """
+        import amico_db
+        embs = np.asarray(embs, dtype=np.float32).reshape(-1, self.dim)
+
+        def _write_protos(cur, new_ids, pruned):
+            amico_db.write_prototypes(cur, self.kind, self._prototypes_after(user_id, embs, pruned))
+
+        insert = amico_db.insert_voiceprints if self.kind == "voice" else amico_db.insert_faceprints
+        new_ids, pruned = insert(conn, user_id, embs, cfg=cfg, dtype=self.dtype, model_version=self.model_version,
+                                 after=_write_protos if self.protos is not None else None, **meta)
+        with self._lock:
+            self.add_many([user_id] * len(embs), embs, new_ids)
+            self.remove(row_ids=pruned)
+            self.refresh_prototypes(user_id)
+        return new_ids, pruned
+
+    def _prototypes_after(self, user_id: str, embs: np.ndarray, pruned) -> list:
+        # prototype rows of `user_id` once `embs` are added and `pruned` removed,
+        # computed without touching the index (the transaction may still fail)
+        with self._lock:
+            pos = self._user_pos.get(user_id)
+            rows = np.flatnonzero(self._uidx[:self._n] == pos) if pos is not None else np.zeros(0, np.int64)
+            rows = rows[~np.isin(self._rids[rows], np.asarray(pruned, dtype=np.int64))]
+            old = dequantize(self._embs[rows], self._scales[rows])
+        new = dequantize(*quantize(_l2n(embs), self.dtype))     # as add_many will store them
+        tmp = PrototypeStore(self.kind, self.protos.n_protos)
+        tmp.rebuild(user_id, np.concatenate([old, new]))
+        return tmp.rows([user_id])
+
+    def refresh_prototypes(self, user_id: Optional[str] = None) -> None:
+        """Recompute exact centroids (and k-means prototypes) from the stored samples."""
+        if self.protos is None:
+            return
+        with self._lock:
+            users = [user_id] if user_id is not None else list(self._users)
+            for u in users:
+                pos = self._user_pos.get(u)
+                if pos is not None:
+                    rows = np.flatnonzero(self._uidx[:self._n] == pos)
+                    self.protos.rebuild(u, dequantize(self._embs[rows], self._scales[rows]))
+            self._index = None
+
+    def apply_action(self, action, emb: np.ndarray, row_id: int = -1) -> bool:
+        """
+        Mirror a STORE_VOICE / STORE_FACE action into the index (other kinds are ignored).
+        Pass the id from amico_db.insert_*prints, then remove(row_ids=pruned) for rows it pruned.
+        """
+        if action.kind != self.action_kind:
+            return False
+        self.add(action.data["user_id"], emb, row_id)
+        return True
+
+    # ---------- scoring ----------
+    def scores(self, emb: np.ndarray) -> Dict[str, float]:
+        """Similarity of `emb` to every user that currently has samples."""
+        with self._lock:
+            s = self._user_scores(emb)
+            return {u: float(s[i]) for i, u in enumerate(self._users) if np.isfinite(s[i])}
+
+    def match(self, emb: np.ndarray) -> Tuple[Optional[str], float]:
+        with self._lock:
+            if self._n == 0:
+                return None, 0.0
+            s = self._user_scores(emb)
+            i = int(np.argmax(s))
+            if not np.isfinite(s[i]):
+                return None, 0.0
+            return self._users[i], float(s[i])
+
+    __call__ = match
+
+    def match_batch(self, embs: np.ndarray) -> Tuple[Optional[str], float, int]:
+        """
+        Score M queries (e.g. every face in a frame) in one product.
+        Returns the best (user_id, score, query_index) over all queries × users,
+        or (None, 0.0, -1) when nothing matches. Usable as a FaceMatchBatch.
+        """
+        with self._lock:
+            if self._n == 0 or len(embs) == 0:
+                return None, 0.0, -1
+            s = self._user_scores_many(embs)                    # (M, U)
+            q, i = np.unravel_index(int(np.argmax(s)), s.shape)
+            if not np.isfinite(s[q, i]):
+                return None, 0.0, -1
+            return self._users[i], float(s[q, i]), int(q)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the stored samples (excluding spare capacity)."""
+        per_row = self.dim * DTYPES[self.dtype] + (4 if self.dtype == "int8" else 0)
+        return self._n * per_row
+
+    @property
+    def users(self) -> List[str]:
+        with self._lock:
+            counts = self._get_index()[2]
+            return [u for i, u in enumerate(self._users) if counts[i] > 0]
+
+    # ---------- internals ----------
+    def _reserve(self, need: int) -> None:
+        cap = self._embs.shape[0]
+        if need <= cap:
+            return
+        cap = max(need, 2 * cap)
+        embs = np.zeros((cap, self.dim), dtype=self.dtype); embs[:self._n] = self._embs[:self._n]
+        scales = np.ones(cap, dtype=np.float32);            scales[:self._n] = self._scales[:self._n]
+        uidx = np.zeros(cap, dtype=np.int64);               uidx[:self._n] = self._uidx[:self._n]
+        rids = np.full(cap, -1, dtype=np.int64);            rids[:self._n] = self._rids[:self._n]
+        self._embs, self._scales, self._uidx, self._rids = embs, scales, uidx, rids
+
+    def _user_index(self, user_id: str) -> int:
+        pos = self._user_pos.get(user_id)
+        if pos is None:
+            pos = self._user_pos[user_id] = len(self._users)
+            self._users.append(user_id)
+        return pos
+
+    def _append(self, user_id: str, emb: np.ndarray, row_id: int) -> None:
+        i = self._n
+        codes, sc = quantize(_l2n(emb)[None, :], self.dtype)
+        self._embs[i] = codes[0]
+        self._scales[i] = 1.0 if sc is None else sc[0]
+        self._uidx[i] = self._user_index(user_id)
+        self._rids[i] = row_id
+        self._n = i + 1
+        self._index = None
+        if self.protos is not None:
+            self.protos.add(user_id, self._row(i))
+
+    def _row(self, r: int) -> np.ndarray:
+        return dequantize(self._embs[r], self._scales[r] if self.dtype == "int8" else None)
+
+    def _sims(self, Q: np.ndarray) -> np.ndarray:
+        # (n, M) similarities. Quantized rows are widened a block at a time, so the
+        # scan reads 2-4x fewer bytes and never materialises a float32 gallery copy.
+        n = self._n
+        if self.dtype == "float32":
+            return self._embs[:n] @ Q.T
+        out = np.empty((n, Q.shape[0]), dtype=np.float32)
+        for a in range(0, n, _SCAN_ROWS):
+            b = min(n, a + _SCAN_ROWS)
+            out[a:b] = self._embs[a:b].astype(np.float32) @ Q.T
+            if self.dtype == "int8":
+                out[a:b] *= self._scales[a:b, None]
+        return out
+
+    def _get_index(self):
+        # rows grouped by user (stable), so per-user reductions are one reduceat
+        if self._index is None:
+            n, U = self._n, len(self._users)
+            uidx = self._uidx[:n]
+            order = np.argsort(uidx, kind="stable")
+            counts = np.bincount(uidx, minlength=U)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if U else np.zeros(0, np.int64)
+            proto_pos = None
+            if self.protos is not None:
+                # gallery column of each prototype-store user
+                proto_pos = np.array([self._user_pos[u] for u in self.protos.all_users], dtype=np.int64)
+            self._index = (order, starts, counts, proto_pos)
+        return self._index
+
+    def _user_scores(self, emb: np.ndarray) -> np.ndarray:
+        q = np.asarray(emb, dtype=np.float32).reshape(-1)
+        if q.size != self.dim:
+            raise ValueError(f"{self.kind} query must be a ({self.dim},) vector")
+        return self._user_scores_many(q[None, :])[0]
+
+    def _user_scores_many(self, embs: np.ndarray) -> np.ndarray:
+        # (M, dim) queries -> (M, U) per-user scores; -inf for users without samples
+        Q = _l2n(np.asarray(embs, dtype=np.float32).reshape(-1, self.dim))
+        order, starts, counts, proto_pos = self._get_index()
+        out = np.full((Q.shape[0], len(self._users)), -np.inf, dtype=np.float32)
+        has = counts > 0
+        if not has.any():
+            return out
+        if self.protos is not None:
+            out[:, proto_pos] = self.protos.scores_many(Q)
+            out[:, ~has] = -np.inf
+            return out
+        sims = self._sims(Q)[order]                              # (n, M), grouped by user
+        if self.agg == "max":
+            out[:, has] = np.maximum.reduceat(sims, starts[has], axis=0).T
+        else:
+            out[:, has] = (np.add.reduceat(sims, starts[has], axis=0) / counts[has][:, None]).T
+        return out
+
+
+def recall_vs_float32(user_ids: Sequence[str], embs: np.ndarray, queries: np.ndarray,
+                      kind: str = "voice", dtype: str = "int8", agg: str = "max") -> dict:
+    """
+    Accuracy cost of a compact gallery: build the same gallery in float32 and in
+    `dtype`, run `queries` through both and report top-1 agreement, score error
+    and memory. Use real enrolled prints + held-out utterances as queries.
+    """
+    ref = EmbeddingGallery(kind, agg, capacity=len(embs))
+    cmp = EmbeddingGallery(kind, agg, capacity=len(embs), dtype=dtype)
+    ref.add_many(user_ids, embs)
+    cmp.add_many(user_ids, embs)
+    Q = np.asarray(queries, dtype=np.float32).reshape(-1, ref.dim)
+    a = ref._user_scores_many(Q)
+    b = cmp._user_scores_many(Q)
+    ok = np.isfinite(a)
+    return {
+        "dtype": dtype,
+        "queries": int(len(Q)),
+        "top1_agreement": float((a.argmax(axis=1) == b.argmax(axis=1)).mean()) if len(Q) else 1.0,
+        "max_abs_score_err": float(np.abs(a[ok] - b[ok]).max()) if ok.any() else 0.0,
+        "mean_abs_score_err": float(np.abs(a[ok] - b[ok]).mean()) if ok.any() else 0.0,
+        "bytes_float32": ref.nbytes,
+        "bytes": cmp.nbytes,
+    }
+
+# ---------- per-user prototypes ----------
+def kmeans_prototypes(samples: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means on L2-normalised samples. Returns ((k', dim) prototypes, (k',) cluster sizes)."""
+    X = _l2n(np.asarray(samples, dtype=np.float32))
+    k = min(int(k), len(X))
+    if k <= 0:
+        return np.zeros((0, X.shape[-1]), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    # farthest-point init: start random, then the sample least similar to any chosen centre
+    C = [X[rng.integers(len(X))]]
+    for _ in range(1, k):
+        C.append(X[int(np.argmin((X @ np.stack(C).T).max(axis=1)))])
+    C = np.stack(C)
+    assign = np.zeros(len(X), dtype=np.int64)
+    for it in range(iters):
+        new = np.argmax(X @ C.T, axis=1)
+        if it and (new == assign).all():
+            break
+        assign = new
+        sums = np.zeros_like(C)
+        np.add.at(sums, assign, X)
+        nonempty = np.bincount(assign, minlength=k) > 0
+        C[nonempty] = _l2n(sums[nonempty])
+    sizes = np.bincount(assign, minlength=k)
+    keep = sizes > 0
+    return C[keep].astype(np.float32), sizes[keep]
+
+class PrototypeStore:
+    """
+    Compact per-user representation of one modality: a running sum of the user's
+    L2-normalised samples (so the centroid updates in O(dim) on add / evict) plus
+    up to `n_protos` k-means prototypes refreshed by rebuild(). add / evict leave the
+    k-means prototypes as they were, so they go stale until the next rebuild()
+    (EmbeddingGallery.store rebuilds the user it touched; refresh_prototypes() the rest).
+
+    Matching scores each user by its best prototype (centroid included), i.e.
+    U·(1+k) dot products instead of one per raw sample. Callable as a
+    VoiceMatch / FaceMatch on its own, e.g. loaded with from_db() on robots that
+    don't keep the raw samples in memory.
+    """
+    def __init__(self, kind: str = "voice", n_protos: int = 0, capacity: int = 64):
+        if kind not in KINDS:
+            raise ValueError(f"unknown kind {kind!r} (expected one of {list(KINDS)})")
+        self.kind = kind
+        self.dim = KINDS[kind][1]
+        self.n_protos = int(n_protos)
+        cap = max(1, int(capacity))
+        self._sums = np.zeros((cap, self.dim), dtype=np.float64)   # float64: add/evict don't drift
+        self._cent = np.zeros((cap, self.dim), dtype=np.float32)   # normalised centroids
+        self._counts = np.zeros(cap, dtype=np.int64)
+        self._users: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._protos: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}   # user -> (protos, sizes)
+        self._pmat = None   # cached (P, owner positions, starts) over all k-means prototypes
+        self._lock = threading.RLock()
+
+    # ---------- O(dim) maintenance ----------
+    def add(self, user_id: str, emb: np.ndarray) -> None:
+        e = _l2n(np.asarray(emb, dtype=np.float64).reshape(self.dim))
+        with self._lock:
+            i = self._index_of(user_id)
+            self._sums[i] += e
+            self._counts[i] += 1
+            self._cent[i] = _l2n(self._sums[i])
+
+    def evict(self, user_id: str, emb: np.ndarray) -> None:
+        e = _l2n(np.asarray(emb, dtype=np.float64).reshape(self.dim))
+        with self._lock:
+            i = self._pos.get(user_id)
+            if i is None or self._counts[i] == 0:
+                return
+            self._counts[i] -= 1
+            if self._counts[i] == 0:
+                self._clear(i)
+            else:
+                self._sums[i] -= e
+                self._cent[i] = _l2n(self._sums[i])
+
+    def drop(self, user_id: str) -> None:
+        with self._lock:
+            i = self._pos.get(user_id)
+            if i is not None:
+                self._clear(i)
+
+    def rebuild(self, user_id: str, samples: np.ndarray) -> None:
+        """Exact recompute from the user's current samples (also refreshes k-means prototypes)."""
+        X = _l2n(np.asarray(samples, dtype=np.float64).reshape(-1, self.dim))
+        with self._lock:
+            i = self._index_of(user_id)
+            if not len(X):
+                self._clear(i)
+                return
+            self._sums[i] = X.sum(axis=0)
+            self._counts[i] = len(X)
+            self._cent[i] = _l2n(self._sums[i])
+            if self.n_protos > 0:
+                self._protos[user_id] = kmeans_prototypes(X, self.n_protos)
+                self._pmat = None
+
+    # ---------- queries ----------
+    @property
+    def all_users(self) -> List[str]:
+        """Every user ever seen, in column order of scores_many() (some may have no samples)."""
+        return list(self._users)
+
+    @property
+    def users(self) -> List[str]:
+        with self._lock:
+            return [u for i, u in enumerate(self._users) if self._counts[i] > 0]
+
+    def centroid(self, user_id: str) -> Optional[np.ndarray]:
+        i = self._pos.get(user_id)
+        return None if i is None or self._counts[i] == 0 else self._cent[i].copy()
+
+    def scores_many(self, embs: np.ndarray) -> np.ndarray:
+        """(M, dim) queries -> (M, U) best-prototype score per user (-inf without samples)."""
+        Q = _l2n(np.asarray(embs, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            U = len(self._users)
+            out = Q @ self._cent[:U].T
+            if self._protos:
+                P, owner, starts = self._proto_matrix()
+                if len(P):
+                    red = np.maximum.reduceat(Q @ P.T, starts, axis=1)
+                    cols = owner[starts]
+                    out[:, cols] = np.maximum(out[:, cols], red)
+            out[:, self._counts[:U] == 0] = -np.inf
+            return out
+
+    def match(self, emb: np.ndarray) -> Tuple[Optional[str], float]:
+        uid, score, _ = self.match_batch(np.asarray(emb).reshape(1, -1))
+        return uid, score
+
+    __call__ = match
+
+    def match_batch(self, embs: np.ndarray) -> Tuple[Optional[str], float, int]:
+        with self._lock:
+            if not self._users or len(embs) == 0:
+                return None, 0.0, -1
+            s = self.scores_many(embs)
+            q, i = np.unravel_index(int(np.argmax(s)), s.shape)
+            if not np.isfinite(s[q, i]):
+                return None, 0.0, -1
+            return self._users[i], float(s[q, i]), int(q)
+
+    # ---------- persistence (amico_prototypes) ----------
+    def rows(self, users: Optional[Iterable[str]] = None) -> List[Tuple[str, int, int, Optional[np.ndarray]]]:
+        """
+        (user_id, slot, n_samples, emb) rows: slot 0 is the running sum (unnormalised,
+        so it can keep being updated after a reload), slots 1..k the k-means prototypes.
+        A user without samples yields a single (user_id, 0, 0, None) row = delete.
+        """
+        out = []
+        with self._lock:
+            for u in (self._users if users is None else users):
+                i = self._pos.get(u)
+                if i is None or self._counts[i] == 0:
+                    out.append((u, 0, 0, None))
+                    continue
+                out.append((u, 0, int(self._counts[i]), self._sums[i].astype(np.float32)))
+                P, sizes = self._protos.get(u, (np.zeros((0, self.dim), np.float32), ()))
+                out += [(u, j + 1, int(sizes[j]), P[j]) for j in range(len(P))]
+        return out
+
+    def save(self, conn, users: Optional[Iterable[str]] = None) -> None:
+        import amico_db
+        with conn, conn.cursor() as cur:
+            amico_db.write_prototypes(cur, self.kind, self.rows(users))
+
+    @classmethod
+    def from_db(cls, conn, kind: str = "voice", n_protos: int = 0) -> "PrototypeStore":
+        import amico_db
+        st = cls(kind, n_protos)
+        protos: Dict[str, list] = {}
+        for uid, slot, n, emb in amico_db.load_prototypes(conn, kind):
+            if slot == 0:
+                i = st._index_of(uid)
+                st._sums[i] = emb
+                st._counts[i] = n
+                st._cent[i] = _l2n(st._sums[i])
+            else:
+                protos.setdefault(uid, []).append((emb, n))
+        for uid, items in protos.items():
+            st._protos[uid] = (np.stack([e for e, _ in items]).astype(np.float32),
+                               np.array([n for _, n in items], dtype=np.int64))
+        return st
+
+    # ---------- internals ----------
+    def _index_of(self, user_id: str) -> int:
+        i = self._pos.get(user_id)
+        if i is None:
+            i = self._pos[user_id] = len(self._users)
+            self._users.append(user_id)
+            if i >= len(self._counts):
+                cap = 2 * len(self._counts)
+                self._sums = np.concatenate([self._sums, np.zeros_like(self._sums)])[:cap]
+                self._cent = np.concatenate([self._cent, np.zeros_like(self._cent)])[:cap]
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])[:cap]
+        return i
+
+    def _clear(self, i: int) -> None:
+        self._sums[i] = 0.0
+        self._cent[i] = 0.0
+        self._counts[i] = 0
+        if self._protos.pop(self._users[i], None) is not None:
+            self._pmat = None
+
+    def _proto_matrix(self):
+        if self._pmat is None:
+            P, owner = [], []
+            for u, (protos, _) in self._protos.items():
+                P.append(protos); owner += [self._pos[u]] * len(protos)
+            P = np.concatenate(P) if P else np.zeros((0, self.dim), np.float32)
+            owner = np.asarray(owner, dtype=np.int64)
+            starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]]) if len(owner) else owner
+            self._pmat = (P, owner, starts)
+        return self._pmat
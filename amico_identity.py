@@ -1,17 +1,22 @@
 # amico_identity.py
 from __future__ import annotations
 from typing import Callable, Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import time
 import numpy as np
+import amico_metrics as metrics
 from amico_id_types import PolicyConfig, SessionState, Evidence, Decision
 from amico_id_policy import classify_voice, classify_face, decide_identity, plan_actions
 
 # Provider signatures (you’ll inject your own functions)
-VoiceExtract = Callable[[str], np.ndarray]                      # audio_path -> (192,) float32
+# amico_gallery.EmbeddingGallery implements VoiceMatch / FaceMatch over the stored prints
+VoiceExtract = Callable[[Any], np.ndarray]                      # audio path | TurnAudio -> (192,) float32
 VoiceMatch   = Callable[[np.ndarray], tuple[Optional[str], float]]
 
 FaceCapture  = Callable[[], Any]                                # -> frame (BGR ndarray)
 FaceExtract  = Callable[[Any], List[Dict[str,Any]]]             # frame -> list[{emb:(512,), score, bbox}]
 FaceMatch    = Callable[[np.ndarray], tuple[Optional[str], float]]
+FaceMatchBatch = Callable[[np.ndarray], tuple[Optional[str], float, int]]  # (N,512) -> (uid, score, face index)
 
 class IdentityOrchestrator:
     def __init__(self,
@@ -19,40 +24,99 @@ class IdentityOrchestrator:
                  voice_match: VoiceMatch,
                  face_capture: FaceCapture,
                  face_extract: FaceExtract,
-                 face_match: FaceMatch,
+                 face_match: Optional[FaceMatch],
                  cfg: PolicyConfig,
-                 state: SessionState):
+                 state: SessionState,
+                 face_match_batch: Optional[FaceMatchBatch] = None,
+                 concurrent: bool = False,
+                 voice_timeout_s: Optional[float] = None,
+                 face_timeout_s: Optional[float] = None):
         self.voice_extract = voice_extract
         self.voice_match   = voice_match
         self.face_capture  = face_capture
         self.face_extract  = face_extract
         self.face_match    = face_match
+        self.face_match_batch = face_match_batch   # preferred; per-face face_match is the fallback
         self.cfg = cfg
         self.state = state
+        # concurrent=True runs the voice and face branches on worker threads;
+        # a branch that misses its deadline contributes empty evidence instead
+        self.concurrent = concurrent
+        self.voice_timeout_s = voice_timeout_s
+        self.face_timeout_s  = face_timeout_s
+        self._pool: Optional[ThreadPoolExecutor] = None
 
-    def identify_turn(self, audio_path: str, frame_bgr=None) -> Decision:
-        # 1) Voice
+    @metrics.timed("amico_stage_seconds", stage="identify")
+    def identify_turn(self, audio_path, frame_bgr=None) -> Decision:
+        if self.concurrent:
+            v_ev, f_ev = self._run_concurrent(audio_path, frame_bgr)
+        else:
+            v_ev = self._voice_evidence(audio_path)    # 1) Voice
+            f_ev = self._face_evidence(frame_bgr)      # 2) Faces
+
+        # 3) Decide + plan actions
+        with metrics.timer("amico_identity_seconds", branch="decide"):
+            decision = decide_identity(v_ev, f_ev, self.cfg)
+            decision.actions = plan_actions(decision, v_ev, f_ev, self.state, self.cfg)
+        metrics.inc("amico_identity_decisions_total", via=decision.via, certainty=decision.certainty)
+        if decision.user_id:
+            self.state.last_user_id = decision.user_id
+        return decision
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ---------- branches ----------
+    @metrics.timed("amico_identity_seconds", branch="voice")
+    def _voice_evidence(self, audio_path: str) -> Evidence:
         v_emb = self.voice_extract(audio_path)            # (192,)
         v_uid, v_score = self.voice_match(v_emb)
         v_strong, v_ok = classify_voice(v_score, self.cfg)
-        v_ev = Evidence("voice", v_uid, v_score, v_strong, v_ok)
+        return Evidence("voice", v_uid, v_score, v_strong, v_ok)
 
-        # 2) Faces: match ALL faces, take the best match (if any)
+    @metrics.timed("amico_identity_seconds", branch="face")
+    def _face_evidence(self, frame_bgr=None) -> Evidence:
+        # match ALL faces, take the best match (if any)
         if frame_bgr is None:
             frame_bgr = self.face_capture()
         faces = self.face_extract(frame_bgr) or []
         best_uid, best_score, best_meta = None, 0.0, {}
-        for f in faces:
-            uid, s = self.face_match(f["emb"])
-            if s > best_score:
+        if faces and self.face_match_batch is not None:
+            # one (N,512) query against the gallery instead of N lookups
+            embs = np.stack([np.asarray(f["emb"], dtype=np.float32).reshape(-1) for f in faces])
+            uid, s, i = self.face_match_batch(embs)
+            if i >= 0 and s > best_score:
+                f = faces[i]
                 best_uid, best_score = uid, s
                 best_meta = {"det_score": f.get("score"), "bbox": f.get("bbox"), "faces_count": len(faces)}
+        else:
+            for f in faces:
+                uid, s = self.face_match(f["emb"])
+                if s > best_score:
+                    best_uid, best_score = uid, s
+                    best_meta = {"det_score": f.get("score"), "bbox": f.get("bbox"), "faces_count": len(faces)}
         f_strong, f_ok = classify_face(best_score, self.cfg)
-        f_ev = Evidence("face", best_uid, best_score, f_strong, f_ok, meta=best_meta)
+        return Evidence("face", best_uid, best_score, f_strong, f_ok, meta=best_meta)
 
-        # 3) Decide + plan actions
-        decision = decide_identity(v_ev, f_ev, self.cfg)
-        decision.actions = plan_actions(decision, v_ev, f_ev, self.state, self.cfg)
-        if decision.user_id:
-            self.state.last_user_id = decision.user_id
-        return decision
+    def _run_concurrent(self, audio_path: str, frame_bgr=None) -> tuple[Evidence, Evidence]:
+        if self._pool is None:
+            # spare workers so a branch still stuck from a timed-out turn can't starve this one
+            self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="amico-id")
+        t0 = time.monotonic()
+        v_fut = self._pool.submit(self._voice_evidence, audio_path)
+        f_fut = self._pool.submit(self._face_evidence, frame_bgr)
+        v_ev = self._collect(v_fut, "voice", self.voice_timeout_s, t0)
+        f_ev = self._collect(f_fut, "face", self.face_timeout_s, t0)
+        return v_ev, f_ev
+
+    @staticmethod
+    def _collect(fut, src: str, timeout_s: Optional[float], t0: float) -> Evidence:
+        remaining = None if timeout_s is None else max(0.0, timeout_s - (time.monotonic() - t0))
+        try:
+            return fut.result(timeout=remaining)
+        except FutureTimeout:
+            fut.cancel()   # no-op if already running; the result is simply dropped
+            metrics.inc("amico_identity_timeouts_total", branch=src)
+            return Evidence(src, None, 0.0, False, False, meta={"timed_out": True})
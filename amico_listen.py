@@ -1,6 +1,11 @@
 import tempfile
+import queue
+import threading
+from collections import deque
+import numpy as np
 import sounddevice #as sd
 import soundfile #as sf
+from amico_audio import TurnAudio
 
 
 # AVariable que indica el nombre del micrófono que queremos utilizar
@@ -15,8 +20,9 @@ def get_preferred_mic_index(preferred_name=PREFERRED_MIC_NAME):
     return sounddevice.default.device[0]  # fallback to default input
 
 # Esta función graba el audio en un archivo temporal en foramto wav. Este archivo es para aplicar el STT
-def record_audio(duration=5, samplerate=16000):
-    """Record audio from preferred mic and save to a temp WAV file"""
+# Con as_buffer=True devuelve un TurnAudio en memoria (sin pasar por disco)
+def record_audio(duration=5, samplerate=16000, as_buffer=False):
+    """Record audio from preferred mic and save to a temp WAV file (or return a TurnAudio)"""
     mic_index = get_preferred_mic_index()
     print(f"🎤 Using mic: {sounddevice.query_devices()[mic_index]['name']}")
 
@@ -24,7 +30,143 @@ def record_audio(duration=5, samplerate=16000):
     recording = sounddevice.rec(int(duration * samplerate), samplerate=samplerate, channels=1, dtype='int16', device=mic_index)
     sounddevice.wait()
 
+    if as_buffer:
+        return TurnAudio.from_array(recording, samplerate)
+
     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
     soundfile.write(temp_file.name, recording, samplerate)
     print(f"🔊 Audio saved at: {temp_file.name}")
     return temp_file.name
+
+
+# ---------- Captura en streaming con VAD ----------
+# En vez de grabar 5 s fijos, escuchamos de forma continua y cortamos la frase
+# en cuanto detectamos el final del habla.
+
+class EnergyVAD:
+    """
+    Energy VAD with an adaptive noise floor and start/stop hysteresis (frames are float32 in [-1, 1]).
+    The floor is calibrated from the first `calib_frames` frames (median level, reported as
+    silence), follows the level quickly in silence and only very slowly (`active_alpha`)
+    while active, so steady noise above the threshold is absorbed instead of keeping
+    the VAD on forever.
+    """
+    def __init__(self, start_db=10.0, stop_db=6.0, floor_alpha=0.05, floor_db=-60.0, min_db=-50.0,
+                 calib_frames=10, active_alpha=0.002):
+        self.start_db = start_db        # sobre el ruido de fondo para empezar a hablar
+        self.stop_db = stop_db          # umbral (más bajo) para seguir considerándolo habla
+        self.floor_alpha = floor_alpha  # velocidad de adaptación del ruido de fondo
+        self.active_alpha = active_alpha  # adaptación (lenta) mientras hay "habla": ~15 s con tramas de 30 ms
+        self.floor_db = floor_db
+        self.min_db = min_db            # nunca es habla por debajo de este nivel absoluto
+        self.calib_frames = calib_frames
+        self._calib = []                # niveles (dB) de las primeras tramas
+        self._active = False
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(np.square(frame, dtype=np.float32))) + 1e-10)
+        db = 20.0 * np.log10(rms)
+        if len(self._calib) < self.calib_frames:
+            # calibración: el ruido de fondo arranca en el nivel real de la sala
+            self._calib.append(db)
+            self.floor_db = float(np.median(self._calib))
+            return False
+        thr = self.floor_db + (self.stop_db if self._active else self.start_db)
+        self._active = db > max(thr, self.min_db)
+        self.floor_db += (self.active_alpha if self._active else self.floor_alpha) * (db - self.floor_db)
+        return self._active
+
+class WebRtcVAD:
+    """Model-based VAD via the optional `webrtcvad` package (frames of 10/20/30 ms at 8/16/32/48 kHz)."""
+    def __init__(self, samplerate=16000, aggressiveness=2):
+        import webrtcvad  # opcional
+        self._vad = webrtcvad.Vad(aggressiveness)
+        self.samplerate = samplerate
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        pcm = (np.clip(frame, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+        return self._vad.is_speech(pcm, self.samplerate)
+
+def stream_utterances(samplerate=16000, frame_ms=30, preroll_ms=300, hangover_ms=600, tail_ms=150,
+                      min_speech_ms=250, max_utterance_s=20.0, vad=None, on_chunk=None, on_speech=None,
+                      stop_event=None):
+    """
+    Listen continuously on the preferred mic and yield one TurnAudio per utterance,
+    as soon as `hangover_ms` of silence follows speech.
+
+    - preroll_ms: audio kept from before the VAD fired, so onsets aren't clipped
+    - tail_ms:    trailing silence kept after the last voiced frame
+    - on_chunk:   optional callback(np.ndarray float32) receiving audio while the
+                  person is still speaking (for streaming STT / emotion)
+    - on_speech:  optional callback() fired once per utterance, as soon as it has
+                  min_speech_ms of voiced audio, i.e. once it can no longer be
+                  dropped as noise (for barge-in)
+    - stop_event: threading.Event that ends the generator
+    """
+    frame_len = int(samplerate * frame_ms / 1000)
+    preroll = deque(maxlen=max(1, preroll_ms // frame_ms))     # buffer circular previo al habla
+    hangover = max(1, hangover_ms // frame_ms)
+    tail = tail_ms // frame_ms
+    min_voiced = max(1, min_speech_ms // frame_ms)
+    max_frames = int(max_utterance_s * 1000 / frame_ms)
+    vad = vad or EnergyVAD()
+    stop_event = stop_event or threading.Event()
+    frames_q: "queue.Queue[np.ndarray]" = queue.Queue(maxsize=int(10_000 / frame_ms))  # ~10 s de margen
+
+    # El callback corre en el hilo de audio: sólo copiar y encolar, nunca bloquear
+    def _callback(indata, frames, time_info, status):
+        try:
+            frames_q.put_nowait(indata[:, 0].copy())
+        except queue.Full:
+            pass
+
+    mic_index = get_preferred_mic_index()
+    with sounddevice.InputStream(samplerate=samplerate, blocksize=frame_len, channels=1,
+                                 dtype="float32", device=mic_index, callback=_callback):
+        utt, voiced, silence = None, 0, 0
+        while not stop_event.is_set():
+            try:
+                frame = frames_q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            speech = vad.is_speech(frame)
+
+            if utt is None:
+                preroll.append(frame)
+                if not speech:
+                    continue
+                utt = list(preroll)       # arranca la frase incluyendo el pre-roll
+                preroll.clear()
+                voiced, silence = 1, 0
+                if on_chunk: on_chunk(np.concatenate(utt))
+                if on_speech and voiced == min_voiced: on_speech()
+                continue
+
+            utt.append(frame)
+            if on_chunk: on_chunk(frame)
+            if speech:
+                voiced += 1; silence = 0
+                if on_speech and voiced == min_voiced: on_speech()
+            else:
+                silence += 1
+
+            if silence >= hangover or len(utt) >= max_frames:
+                if voiced >= min_voiced:
+                    keep = len(utt) - max(0, silence - tail)
+                    yield TurnAudio.from_array(np.concatenate(utt[:keep]), samplerate)
+                utt, voiced, silence = None, 0, 0
+
+# Atajo: devuelve la primera frase detectada (o None si se agota timeout_s sin habla)
+def record_utterance(timeout_s=None, **kwargs):
+    """Capture a single utterance with VAD endpointing instead of a fixed duration."""
+    print("🎙️ Listening... Speak now.")
+    stop = threading.Event()
+    timer = threading.Timer(timeout_s, stop.set) if timeout_s else None
+    if timer: timer.start()
+    try:
+        for audio in stream_utterances(stop_event=stop, **kwargs):
+            return audio
+        return None
+    finally:
+        stop.set()
+        if timer: timer.cancel()
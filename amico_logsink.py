@@ -0,0 +1,169 @@
+# amico_logsink.py — non-blocking log file writer for captured warnings / stderr
+#
+# Callers only enqueue; a daemon thread batches lines to disk, rotates by size and
+# collapses repeated warnings, so a noisy library never puts SD-card I/O on the
+# conversation loop.
+#
+#   sink = LogSink("logs/warnings.log", truncate=True)
+#   warnings.showwarning = sink.showwarning
+#   with redirect_stderr(sink.stream()): ...
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict
+import atexit, io, os, queue, threading, time, warnings
+
+def rotate(path, max_bytes: int, backups: int) -> None:
+    """Once `path` reaches max_bytes, shift path -> path.1 -> ... -> path.<backups> (0 = just delete it)."""
+    path = Path(path)
+    if max_bytes <= 0 or not path.exists() or path.stat().st_size < max_bytes:
+        return
+    for i in range(backups - 1, 0, -1):
+        src = path.with_name(f"{path.name}.{i}")
+        if src.exists():
+            os.replace(src, path.with_name(f"{path.name}.{i + 1}"))
+    if backups > 0:
+        os.replace(path, path.with_name(f"{path.name}.1"))
+    else:
+        path.unlink()
+
+def _repeat_line(key: tuple, n: int) -> str:
+    # name the warning being summarised: another one may have been written in between
+    if len(key) == 4 and isinstance(key[0], type):
+        category, filename, lineno, message = key
+        what = f"{category.__name__} at {os.path.basename(str(filename))}:{lineno}: {message}"
+    else:
+        what = ": ".join(map(str, key))
+    first = what.strip().splitlines()[0] if what.strip() else "(empty)"
+    return f"[repeated {n} more times] {first}\n"
+
+class LogSink:
+    """
+    Append-only text log fed through a bounded queue.
+      - batching:  pending lines are written together, at most every `flush_s`
+      - rotation:  past `max_bytes`, path -> path.1 -> ... -> path.<backups>
+      - dedup:     the same warning (category, file, line, message) is written once
+                   per `dedup_window_s`; repeats are counted and summarised
+      - never blocks: when the queue is full the line is dropped and counted
+    """
+    def __init__(self, path, max_bytes: int = 1 << 20, backups: int = 3, flush_s: float = 0.5,
+                 batch: int = 256, dedup_window_s: float = 60.0, maxsize: int = 10_000,
+                 truncate: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if truncate:
+            self.path.write_text("", encoding="utf-8")
+        self.max_bytes, self.backups = max_bytes, backups
+        self.flush_s, self.batch = flush_s, batch
+        self.dedup_window_s = dedup_window_s
+        self.dropped = 0
+        self._q: "queue.Queue" = queue.Queue(maxsize=maxsize)     # str | flush Event | None (stop)
+        self._seen: Dict[tuple, list] = {}     # key -> [window start, repeats suppressed, text]
+        self._seen_lock = threading.Lock()
+        self._drop_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"amico-log-{self.path.name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- producers ----------
+    def write(self, text: str) -> None:
+        if text:
+            self._put(text)
+
+    def _put(self, item) -> None:
+        if self._closed:
+            return
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            with self._drop_lock:     # producers run on any thread
+                self.dropped += 1
+
+    def warn(self, key: tuple, text: str) -> None:
+        """write(text) unless `key` was already written within the dedup window."""
+        now = time.monotonic()
+        with self._seen_lock:
+            st = self._seen.get(key)
+            if st is not None and now - st[0] < self.dedup_window_s:
+                st[1] += 1
+                return
+            repeats = st[1] if st is not None else 0
+            self._seen[key] = [now, 0, text]
+        if repeats:
+            self.write(_repeat_line(key, repeats))
+        self.write(text)
+
+    def showwarning(self, message, category, filename, lineno, file=None, line=None) -> None:
+        """Drop-in for warnings.showwarning."""
+        self.warn((category, filename, lineno, str(message)),
+                  warnings.formatwarning(message, category, filename, lineno, line))
+
+    def stream(self) -> "_SinkStream":
+        """A file-like object for redirect_stderr / redirect_stdout."""
+        return _SinkStream(self)
+
+    # ---------- lifecycle ----------
+    def flush(self, timeout: float = 2.0) -> None:
+        """Wait (bounded) until everything queued so far is on disk."""
+        done = threading.Event()
+        self._put(done)             # the writer sets it after the batch it lands in
+        done.wait(timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        with self._seen_lock:
+            pending = [(key, st[1]) for key, st in self._seen.items() if st[1]]
+            self._seen.clear()
+        for key, n in pending:
+            self.write(_repeat_line(key, n))
+        self._closed = True
+        try:
+            self._q.put(None, timeout=5)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+
+    # ---------- writer thread ----------
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            buf, markers, stop = [], [], item is None
+            deadline = time.monotonic() + self.flush_s
+            while item is not None:
+                (markers if isinstance(item, threading.Event) else buf).append(item)
+                if len(buf) >= self.batch:
+                    break
+                try:
+                    item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                stop = item is None
+            if buf:
+                self._write("".join(buf))
+            for m in markers:
+                m.set()
+            if stop:
+                return
+
+    def _write(self, text: str) -> None:
+        try:
+            rotate(self.path, self.max_bytes, self.backups)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(text)
+        except OSError:
+            pass    # a full or read-only card must not take the writer thread down
+
+class _SinkStream(io.TextIOBase):
+    def __init__(self, sink: LogSink):
+        self._sink = sink
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self._sink.write(s)
+        return len(s)
+
+    def isatty(self) -> bool:
+        return False    # keeps tqdm & co. from drawing interactive progress bars
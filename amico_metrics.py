@@ -0,0 +1,244 @@
+# amico_metrics.py — in-process timers, counters and histograms for the turn pipeline
+#
+# Off by default. Enable with AMICO_METRICS=1 or in config/amico_config.json:
+#   "metrics": {"enabled": true, "file": "logs/metrics.jsonl", "flush_s": 10,
+#               "max_bytes": 1048576, "backups": 3, "port": 9108, "host": "127.0.0.1"}
+# "file" gets one JSON snapshot per flush (size-rotated); "port" serves the
+# Prometheus text format on /metrics, on localhost unless "host" says otherwise
+# (e.g. "0.0.0.0" for a scraper on another machine). Both are started by start().
+#
+# While disabled every call returns after one flag check, so the instrumentation can
+# stay in the hot paths:
+#   with metrics.timer("amico_stage_seconds", stage="stt"): ...
+#   @metrics.timed("amico_db_seconds", op="load_prints")
+#   metrics.inc("amico_txt_emotion_cache_total", result="hit")
+from __future__ import annotations
+from bisect import bisect_left
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+import json, os, threading, time, warnings
+from amico_logsink import rotate
+
+# seconds; covers a 1 ms gallery lookup up to a 60 s cold model load
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _settings() -> dict:
+    import amico_config
+    return amico_config.get("metrics") or {}
+
+def _env_or_setting() -> bool:
+    import amico_config
+    return (amico_config.as_bool(os.getenv("AMICO_METRICS", "")) or
+            amico_config.as_bool(_settings().get("enabled", False)))
+
+_enabled = _env_or_setting()
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = {}
+_hists: Dict[Tuple[str, tuple], list] = {}      # key -> [bucket counts..., +Inf count, sum, max]
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(flag: bool = True) -> None:
+    global _enabled
+    _enabled = bool(flag)
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+# ---------- recording ----------
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    if not _enabled:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0.0) + value
+
+def observe(name: str, value: float, **labels) -> None:
+    if not _enabled:
+        return
+    k = _key(name, labels)
+    i = bisect_left(BUCKETS, value)
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = [0] * (len(BUCKETS) + 1) + [0.0, 0.0]
+        h[i] += 1
+        h[-2] += value
+        h[-1] = max(h[-1], value)
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name, self.labels, self.t0 = name, labels, 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            inc(self.name.replace("_seconds", "") + "_errors_total", **self.labels)
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _NullTimer()
+
+def timer(name: str, **labels):
+    """Context manager observing the block's wall time (seconds) into histogram `name`."""
+    return _Timer(name, labels) if _enabled else _NULL
+
+def timed(name: str, **labels):
+    """Decorator form of timer()."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Timer(name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+# ---------- export ----------
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _hists.clear()
+
+def snapshot() -> dict:
+    """Counters and histograms as plain JSON-able data (cumulative since start/reset)."""
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in _counters.items()]
+        hists = []
+        for (n, l), h in _hists.items():
+            count = sum(h[:-2])
+            hists.append({"name": n, "labels": dict(l), "count": count, "sum": h[-2], "max": h[-1],
+                          "mean": h[-2] / count if count else 0.0,
+                          "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], h[:-2]))})
+    return {"ts": time.time(), "counters": counters, "histograms": hists}
+
+def _fmt_labels(labels, extra: Optional[dict] = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def prometheus_text() -> str:
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        hists = sorted((k, list(h)) for k, h in _hists.items())
+    typed = set()
+    for (n, l), v in counters:
+        if n not in typed:
+            lines.append(f"# TYPE {n} counter"); typed.add(n)
+        lines.append(f"{n}{_fmt_labels(l)} {v}")
+    for (n, l), h in hists:
+        if n not in typed:
+            lines.append(f"# TYPE {n} histogram"); typed.add(n)
+        cum = 0
+        for b, c in zip(list(BUCKETS) + ["+Inf"], h[:-2]):
+            cum += c
+            lines.append(f"{n}_bucket{_fmt_labels(l, {'le': b})} {cum}")
+        lines.append(f"{n}_sum{_fmt_labels(l)} {h[-2]}")
+        lines.append(f"{n}_count{_fmt_labels(l)} {cum}")
+    return "\n".join(lines) + "\n"
+
+# ---------- sinks ----------
+_flusher: Optional[threading.Thread] = None
+_server = None
+_stop = threading.Event()
+
+def write_snapshot(path, max_bytes: int = 1 << 20, backups: int = 3) -> None:
+    """Append one JSON line; rotate path -> path.1 -> ... -> path.<backups> past max_bytes."""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    rotate(p, max_bytes, backups)
+    with p.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot()) + "\n")
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Serve prometheus_text() on http://host:port/metrics from a daemon thread."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=_server.serve_forever, name="amico-metrics-http", daemon=True).start()
+    return _server
+
+def start(log: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Start the sinks configured under "metrics" (no-op while disabled).
+    log(text) receives file-sink errors (e.g. WARN_SINK.write); default: warnings.warn.
+    """
+    global _flusher
+    if not _enabled:
+        return
+    s = _settings()
+    if s.get("port") and _server is None:
+        serve(int(s["port"]), str(s.get("host", "127.0.0.1")))
+    if s.get("file") and _flusher is None:
+        path = Path(s["file"])
+        if not path.is_absolute():
+            path = Path(__file__).resolve().parent / path
+        every = float(s.get("flush_s", 10))
+        args = (path, int(s.get("max_bytes", 1 << 20)), int(s.get("backups", 3)))
+
+        last_err = [None]
+
+        def _flush():
+            try:
+                write_snapshot(*args)
+                last_err[0] = None
+            except Exception as e:   # a full card or bad path must not end the flusher
+                msg = f"metrics: writing {path} failed: {type(e).__name__}: {e}"
+                if msg != last_err[0]:     # once per distinct failure, not every flush
+                    last_err[0] = msg
+                    log(msg + "\n") if log is not None else warnings.warn(msg)
+
+        def _run():
+            while not _stop.wait(every):
+                _flush()
+            _flush()
+        _stop.clear()
+        _flusher = threading.Thread(target=_run, name="amico-metrics-flush", daemon=True)
+        _flusher.start()
+
+def stop() -> None:
+    """Flush the file sink once more and stop both sinks."""
+    global _flusher, _server
+    _stop.set()
+    if _flusher is not None:
+        _flusher.join(timeout=5)
+        _flusher = None
+    if _server is not None:
+        _server.shutdown()
+        _server = None
@@ -0,0 +1,129 @@
+# amico_models.py — process-wide registry of heavy models (load once, share, evict)
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict
+import gc
+import os
+import threading
+import warnings
+import amico_metrics as metrics
+
+# Keep at least this much RAM free after a load (Pi 5 has 4–8 GB and no swap to speak of)
+MIN_FREE_MB = float(os.getenv("AMICO_MIN_FREE_MB", "400"))
+# Optional hard cap on the summed size estimate of resident models (0 = no cap)
+MAX_RESIDENT_MB = float(os.getenv("AMICO_MODEL_BUDGET_MB", "0"))
+
+_loaders: Dict[str, tuple[Callable[[], Any], float]] = {}   # name -> (loader, size estimate MB)
+_loaded: "OrderedDict[str, Any]" = OrderedDict()            # LRU order: oldest first
+_pinned: set[str] = set()
+_lock = threading.RLock()
+_load_locks: Dict[str, threading.Lock] = {}
+
+# ---------- registration ----------
+def register(name: str, loader: Callable[[], Any], size_mb: float = 0.0) -> None:
+    """Declare a model. Nothing is loaded until get()/warmup() asks for it."""
+    with _lock:
+        _loaders[name] = (loader, float(size_mb))
+        _load_locks.setdefault(name, threading.Lock())
+
+def registered() -> List[str]:
+    with _lock:
+        return list(_loaders)
+
+# ---------- access ----------
+def get(name: str) -> Any:
+    """Return the shared instance of `name`, loading it on first use."""
+    with _lock:
+        if name in _loaded:
+            _loaded.move_to_end(name)
+            return _loaded[name]
+        if name not in _loaders:
+            raise KeyError(f"model {name!r} is not registered")
+        loader, size_mb = _loaders[name]
+        load_lock = _load_locks[name]
+    # load outside the registry lock so other models stay usable meanwhile
+    with load_lock:
+        with _lock:
+            if name in _loaded:
+                _loaded.move_to_end(name)
+                return _loaded[name]
+            _make_room(size_mb, keep=name)
+        with metrics.timer("amico_model_load_seconds", model=name):
+            obj = loader()
+        with _lock:
+            _loaded[name] = obj
+        return obj
+
+def is_loaded(name: str) -> bool:
+    with _lock:
+        return name in _loaded
+
+def warmup(names: Optional[Iterable[str]] = None, pin: bool = False) -> None:
+    """Load models up front (all registered ones by default). pin=True exempts them from eviction."""
+    for name in (list(names) if names is not None else registered()):
+        get(name)
+        if pin:
+            with _lock:
+                _pinned.add(name)
+
+# ---------- memory management ----------
+def evict(name: str) -> bool:
+    with _lock:
+        obj = _loaded.pop(name, None)
+        _pinned.discard(name)
+    if obj is None:
+        return False
+    del obj
+    gc.collect()
+    return True
+
+def evict_all() -> None:
+    for name in resident():
+        evict(name)
+
+def resident() -> List[str]:
+    with _lock:
+        return list(_loaded)
+
+def resident_mb() -> float:
+    with _lock:
+        return sum(_loaders[n][1] for n in _loaded if n in _loaders)
+
+def available_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo (None where that isn't available)."""
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+def _make_room(size_mb: float, keep: str) -> None:
+    # Called with _lock held: evict least-recently-used models whose size estimates
+    # cover the shortfall, measured once up front. MemAvailable is not re-read per
+    # eviction: memory only comes back once callers drop their references, so the
+    # reading wouldn't move and the loop would empty the registry.
+    need = resident_mb() + size_mb - MAX_RESIDENT_MB if MAX_RESIDENT_MB > 0 else 0.0
+    avail = available_mb()
+    if avail is not None:
+        need = max(need, MIN_FREE_MB - (avail - size_mb))
+    if need <= 0:
+        return
+    freed, victims = 0.0, []
+    for name in list(_loaded):
+        if freed >= need:
+            break
+        est = _loaders[name][1] if name in _loaders else 0.0
+        if name == keep or name in _pinned or est <= 0:
+            continue
+        _loaded.pop(name)
+        victims.append(name)
+        freed += est
+        metrics.inc("amico_model_evictions_total", model=name)
+    if victims:
+        gc.collect()
+    if freed < need:
+        warnings.warn(f"loading {keep!r}: {need:.0f} MB short, evicted {victims or 'nothing'} "
+                      f"(~{freed:.0f} MB); loading anyway")
@@ -0,0 +1,173 @@
+# amico_reembed.py — offline, resumable re-embedding of stored voiceprints
+#
+# When MODEL / _mono_16k change in amico_vp, old rows are not comparable with new
+# ones. This job rebuilds the gallery side by side, tagged with the new
+# amico_vp_version.MODEL_VERSION, so nothing the live robot loads is ever half-migrated:
+#
+#   1. python amico_reembed.py --clips-dir /data/clips          (resumable; safe to re-run)
+#   2. python amico_reembed.py --status                          (every user covered?)
+#   3. deploy with the new MODEL_VERSION (galleries load only that version)
+#   4. python amico_reembed.py --finalize                        (drop other versions)
+#
+# Untagged (NULL) rows count as amico_vp_version.LEGACY_MODEL_VERSION everywhere:
+# loading, --status, --finalize and the skip-already-stored check. Galleries load
+# only MODEL_VERSION, so run steps 1-2 before restarting the robot on new code.
+# Source clips: --clips-dir DIR laid out as DIR/<user_id>/*.wav, or --manifest
+# FILE.jsonl with {"user_id": ..., "path": ...} per line.
+# Faceprints are out of scope: no face extractor ships in this repo.
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+import argparse, json, os, sys, time
+
+AUDIO_EXTS = {".wav", ".flac", ".ogg"}
+
+# ---------- sources ----------
+def iter_clips(clips_dir: Optional[str] = None, manifest: Optional[str] = None) -> Iterator[tuple[str, str]]:
+    """Yield (user_id, path) in a stable order, so checkpoints stay meaningful across runs."""
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rec = json.loads(line)
+                    yield str(rec["user_id"]), str(rec["path"])
+        return
+    root = Path(clips_dir)
+    for user_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        for clip in sorted(p for p in user_dir.rglob("*") if p.suffix.lower() in AUDIO_EXTS):
+            yield user_dir.name, str(clip)
+
+# ---------- checkpoint ----------
+def _load_checkpoint(path: Path, version: str) -> int:
+    try:
+        ck = json.loads(path.read_text(encoding="utf-8"))
+        return int(ck["done"]) if ck.get("model_version") == version else 0
+    except (OSError, ValueError, KeyError):
+        return 0
+
+def _save_checkpoint(path: Path, version: str, done: int) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"model_version": version, "done": done, "ts": time.time()}), encoding="utf-8")
+    os.replace(tmp, path)
+
+# ---------- job ----------
+def _decode(item):
+    from amico_audio import TurnAudio
+    uid, path = item
+    try:
+        return uid, path, TurnAudio.from_path(path)
+    except Exception:
+        return uid, path, None
+
+def reembed(clips, conn, version: str, checkpoint: Path, batch_size: int = 32,
+            workers: int = 4, dry_run: bool = False) -> dict:
+    """
+    Decode clips on a thread pool (one batch ahead), embed each batch with
+    amico_vp.vp_batch and bulk-insert the valid rows tagged `version`.
+    Progress is checkpointed after every committed batch; clips already stored
+    for `version` are skipped, so a crash between insert and checkpoint can't
+    duplicate rows. The checkpoint only moves past clips that were embedded or
+    rejected on their own (unreadable, invalid embedding). If a batch fails as a
+    whole (model error, failed insert, every clip of a multi-clip batch rejected)
+    the job stops there with the reason in stats["stopped"]; a re-run retries it.
+    """
+    import amico_db
+    from amico_vp import vp_batch
+
+    clips = list(clips)
+    start = _load_checkpoint(checkpoint, version)
+    already = set() if dry_run else amico_db.existing_sources(conn, "voice", version)
+    # (position in clips, clip): progress is the position after a batch's last clip
+    todo = [(i, c) for i, c in enumerate(clips[start:], start) if c[1] not in already]
+    stats = {"model_version": version, "total": len(clips), "resumed_at": start,
+             "skipped_existing": len(clips) - start - len(todo), "embedded": 0, "invalid": 0, "unreadable": 0,
+             "stopped": None}
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    t0 = time.monotonic()
+    done = start
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="amico-reembed") as pool:
+        pending = pool.map(_decode, [c for _, c in batches[0]]) if batches else None
+        for b, batch in enumerate(batches):
+            decoded = list(pending)
+            if b + 1 < len(batches):
+                pending = pool.map(_decode, [c for _, c in batches[b + 1]])   # prefetch while ECAPA runs
+            ok = [d for d in decoded if d[2] is not None]
+            keep = []
+            try:
+                if ok:
+                    embs, valid = vp_batch([d[2] for d in ok], batch_size=batch_size)
+                    keep = [i for i in range(len(ok)) if valid[i]]
+                    if not keep and len(ok) > 1:
+                        # one bad clip is plausible, a whole batch of them is the model
+                        raise RuntimeError(f"all {len(ok)} decoded clips came back invalid")
+                    if not dry_run:
+                        amico_db.insert_voiceprints(conn, [ok[i][0] for i in keep], embs[keep],
+                                                    model_version=version, source=[ok[i][1] for i in keep])
+            except Exception as e:
+                stats["stopped"] = f"batch at clip {batch[0][0]}: {type(e).__name__}: {e}"
+                print(f"stopping, checkpoint stays at {done}: {stats['stopped']}", file=sys.stderr)
+                break
+            stats["unreadable"] += len(decoded) - len(ok)
+            stats["invalid"] += len(ok) - len(keep)
+            stats["embedded"] += len(keep)
+            done = batch[-1][0] + 1
+            if not dry_run:
+                _save_checkpoint(checkpoint, version, done)
+            rate = stats["embedded"] / max(1e-9, time.monotonic() - t0)
+            left = sum(len(x) for x in batches[b + 1:])
+            print(f"[{done}/{len(clips)}] {rate:.1f} clips/s, ETA {left / rate if rate else 0:.0f}s",
+                  file=sys.stderr)
+    stats["elapsed_s"] = round(time.monotonic() - t0, 3)
+    stats["clips_per_s"] = round(stats["embedded"] / stats["elapsed_s"], 2) if stats["elapsed_s"] else 0.0
+    return stats
+
+def status(conn, version: str) -> dict:
+    import amico_db
+    return {"model_version": version,
+            "rows_by_version": {str(k): v for k, v in amico_db.print_versions(conn, "voice").items()},
+            "users_missing_version": amico_db.users_missing_version(conn, "voice", version)}
+
+def main(argv=None) -> int:
+    from amico_vp_version import MODEL_VERSION
+    ap = argparse.ArgumentParser(description="Re-embed stored voiceprints with the current amico_vp model.")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--clips-dir", help="DIR/<user_id>/*.wav")
+    src.add_argument("--manifest", help='JSONL lines {"user_id": ..., "path": ...}')
+    ap.add_argument("--version", default=MODEL_VERSION, help="tag for new rows (default: amico_vp_version.MODEL_VERSION)")
+    ap.add_argument("--checkpoint", default="reembed_checkpoint.json")
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--workers", type=int, default=4, help="decode threads")
+    ap.add_argument("--dry-run", action="store_true", help="embed but don't write rows or checkpoints")
+    ap.add_argument("--tag-untagged", metavar="VERSION", help="label pre-existing NULL-version rows")
+    ap.add_argument("--status", action="store_true", help="row counts per version + uncovered users")
+    ap.add_argument("--finalize", action="store_true", help="delete rows of every other version")
+    ap.add_argument("--force", action="store_true", help="finalize even if some users lack new rows")
+    args = ap.parse_args(argv)
+
+    import amico_db
+    with amico_db.pooled_conn() as conn:
+        if args.tag_untagged:
+            print(json.dumps({"tagged": amico_db.tag_untagged_prints(conn, "voice", args.tag_untagged)}))
+        if args.clips_dir or args.manifest:
+            clips = iter_clips(args.clips_dir, args.manifest)
+            stats = reembed(clips, conn, args.version, Path(args.checkpoint),
+                            args.batch_size, args.workers, args.dry_run)
+            print(json.dumps(stats, indent=2))
+            if stats["stopped"]:
+                return 1
+        if args.status:
+            print(json.dumps(status(conn, args.version), indent=2))
+        if args.finalize:
+            missing = amico_db.users_missing_version(conn, "voice", args.version)
+            if missing and not args.force:
+                print(f"refusing to finalize: {len(missing)} users have no {args.version} rows "
+                      f"(see --status, or pass --force)", file=sys.stderr)
+                return 1
+            print(json.dumps({"deleted": amico_db.delete_other_versions(conn, "voice", args.version)}))
+    amico_db.close_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,220 @@
-import whisper
+import threading
+import numpy as np
+import amico_backends as backends
+import amico_metrics as metrics
+import amico_models as models
+import amico_config
+from amico_audio import TurnAudio, SR
 
-#Load whisper model
-model = whisper.load_model("base")
+# Configuración (config/amico_config.json):
+#   whisper_model   tiny | base | small | medium | large   (por defecto "base")
+#   whisper_device  auto | cpu | cuda                       (por defecto "auto")
+#   whisper_dtype   fp32 | fp16  (fp16 sólo se usa en GPU)
+#   whisper_preload true | false (precarga en segundo plano al arrancar)
+_SIZES_MB = {"tiny": 150, "base": 290, "small": 950, "medium": 3000, "large": 6000}
 
-# Transcribe el audio en el archivo audio_path y reconoce el idioma.
-def stt(audio_path):
-    result = model.transcribe(audio_path)
+def _cfg() -> dict:
+    return {
+        "model":   amico_config.get("whisper_model", "base"),
+        "device":  amico_config.get("whisper_device", "auto"),
+        "dtype":   amico_config.get("whisper_dtype", "fp32"),
+        "preload": amico_config.get_bool("whisper_preload", True),
+    }
+
+# Carga del modelo whisper: perezosa y compartida a través de amico_models.
+# Importar este módulo NO carga ninguna red neuronal.
+# Backend (amico_backends): eager o int8. El bucle de decodificación de whisper
+# (caché kv con hooks, beam search en Python) no se exporta a un solo grafo ONNX.
+BACKENDS = ("eager", "int8")
+
+def _load_whisper(backend: str = "eager"):
+    import whisper, torch
+    c = _cfg()
+    device = c["device"]
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if backend == "int8":
+        # whisper.model.Linear es una subclase: quantize_int8 la sustituye por nn.Linear
+        return backends.quantize_int8(whisper.load_model(c["model"], device="cpu"))
+    return whisper.load_model(c["model"], device=device)
+
+def _probe_whisper(backend: str) -> np.ndarray:
+    # logits del primer paso del decodificador sobre la señal de prueba (cubre encoder + decoder)
+    import whisper, torch
+    model = _load_whisper(backend)
+    audio = whisper.pad_or_trim(backends.probe_audio())
+    mel = whisper.log_mel_spectrogram(audio, n_mels=model.dims.n_mels).to(model.device)
+    sot = whisper.tokenizer.get_tokenizer(model.is_multilingual).sot_sequence
+    with torch.no_grad():
+        feats = model.embed_audio(mel[None])
+        return model.logits(torch.tensor([sot], device=model.device), feats)[0, -1].float().cpu().numpy()
+
+models.register("whisper", lambda: _load_whisper(backends.backend_for("whisper", BACKENDS)),
+                size_mb=_SIZES_MB.get(str(_cfg()["model"]).split(".")[0].split("-")[0], 290))
+backends.register_probe("whisper", _probe_whisper, BACKENDS)
+
+# El modelo en caché es compartido: transcribe() instala hooks de caché kv en el
+# decodificador, así que dos decodificaciones a la vez (stt() del motor y un
+# StreamingSTT) se corromperían mutuamente. Todo uso del modelo pasa por este lock.
+_MODEL_LOCK = threading.Lock()
+
+def _fp16(model) -> bool:
+    return _cfg()["dtype"] == "fp16" and model.device.type == "cuda"
+
+# Precarga (por defecto en un hilo, p.ej. mientras se inicializa el micrófono)
+def preload(background=True, force=False):
+    """Load whisper ahead of the first stt() call. Returns the loader thread (or None)."""
+    if not (force or _cfg()["preload"]):
+        return None
+    if not background:
+        models.get("whisper")
+        return None
+    t = threading.Thread(target=models.get, args=("whisper",), name="amico-stt-preload", daemon=True)
+    t.start()
+    return t
+
+# Transcribe el audio (ruta WAV o TurnAudio ya decodificado) y reconoce el idioma.
+@metrics.timed("amico_stage_seconds", stage="stt")
+def stt(audio):
+    # con TurnAudio se pasan las muestras 16 kHz directamente: whisper no vuelve a decodificar
+    src = audio.samples if isinstance(audio, TurnAudio) else audio
+    model = models.get("whisper")
+    with _MODEL_LOCK:
+        result = model.transcribe(src, fp16=_fp16(model))
     text = result.get("text", "").strip()
     language = result.get("language", "und")  # 'und' means undefined
     return text, language
+
+
+# ---------- STT incremental (streaming) ----------
+# Whisper no es un modelo de streaming: re-decodificamos el audio aún no congelado
+# cada `step_s` segundos en un hilo aparte y fijamos el idioma tras la primera
+# ventana con confianza. Un segmento que sale igual en dos decodificaciones
+# seguidas (y no es el último) se congela y su audio se descarta, así que el
+# buffer se mantiene corto; si aun así supera la ventana, se congela a la fuerza.
+class StreamingSTT:
+    """
+    Incremental transcription over 16 kHz float32 chunks (e.g. amico_listen's on_chunk).
+
+    feed() only buffers; a worker thread re-decodes every `step_s` seconds of new
+    audio and reports the running hypothesis through on_partial(text).
+    finish() decodes only the audio not yet committed (nothing at all when no audio
+    arrived since the last decode) and returns (text, language) like stt().
+    """
+    def __init__(self, on_partial=None, step_s=1.0, window_s=24.0,
+                 lang_lock_prob=0.6, min_lang_s=1.0, language=None):
+        self.on_partial = on_partial
+        self.step = int(step_s * SR)
+        self.window = int(window_s * SR)     # < 30 s, la ventana nativa de whisper
+        self.lang_lock_prob = lang_lock_prob
+        self.min_lang = int(min_lang_s * SR)
+        self._lang = language                # idioma fijado (None = aún detectando)
+        self._committed: list[str] = []      # texto ya congelado
+        self._prev: list[str] = []           # segmentos de la última decodificación (sin congelar)
+        self._last = None                    # último (texto, idioma) devuelto por _decode
+        self._chunks: list[np.ndarray] = []
+        self._n = 0                          # muestras en el buffer
+        self._decoded_at = 0                 # tamaño del buffer en la última decodificación
+        self._buf_lock = threading.Lock()
+        self._decode_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="amico-stt-stream", daemon=True)
+        self._worker.start()
+
+    @property
+    def language(self):
+        return self._lang
+
+    def feed(self, chunk) -> None:
+        x = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        with self._buf_lock:
+            self._chunks.append(x)
+            self._n += x.size
+            due = self._n - self._decoded_at >= self.step
+        if due:
+            self._wake.set()
+
+    def finish(self) -> tuple[str, str]:
+        self._closed = True
+        self._wake.set()
+        self._worker.join()
+        with self._decode_lock:
+            with self._buf_lock:
+                fresh = self._n > self._decoded_at
+            text, lang = self._decode() if fresh or self._last is None else self._last
+        return text, lang or "und"
+
+    # ---------- internals ----------
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            with self._decode_lock:
+                text, _ = self._decode()
+            if text and self.on_partial:
+                self.on_partial(text)
+
+    def _snapshot(self) -> np.ndarray:
+        with self._buf_lock:
+            if len(self._chunks) > 1:
+                self._chunks = [np.concatenate(self._chunks)]
+            self._decoded_at = self._n
+            return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def _drop(self, k: int) -> None:
+        # descarta las primeras k muestras (ya congeladas); lo que llegó después se conserva
+        with self._buf_lock:
+            buf = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.float32)
+            buf = buf[k:]
+            self._chunks = [buf] if buf.size else []
+            self._n = buf.size
+            self._decoded_at = max(0, self._decoded_at - k)
+
+    def _lock_language(self, audio: np.ndarray) -> None:
+        if self._lang is not None or audio.size < self.min_lang:
+            return
+        import whisper
+        model = models.get("whisper")
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=model.dims.n_mels).to(model.device)
+        with _MODEL_LOCK:
+            _, probs = model.detect_language(mel)
+        lang = max(probs, key=probs.get)
+        if probs[lang] >= self.lang_lock_prob:
+            self._lang = lang
+
+    @metrics.timed("amico_stage_seconds", stage="stt_stream")
+    def _decode(self) -> tuple[str, str]:
+        audio = self._snapshot()
+        if audio.size == 0:
+            return " ".join(self._committed).strip(), self._lang
+        self._lock_language(audio)
+        prompt = " ".join(self._committed)[-200:] or None
+        model = models.get("whisper")
+        with _MODEL_LOCK:
+            result = model.transcribe(audio, language=self._lang, fp16=_fp16(model),
+                                      condition_on_previous_text=False, initial_prompt=prompt)
+        lang = self._lang or result.get("language")
+        segs = result.get("segments") or []
+        texts = [sg["text"].strip() for sg in segs]
+        if audio.size > self.window and len(segs) > 1:
+            k = len(segs) - 1                     # congelar todo menos el último segmento
+        elif audio.size > self.window:
+            k = len(segs)
+        else:
+            # acuerdo local: segmentos iguales a los de la decodificación anterior
+            k = 0
+            while k < len(segs) - 1 and k < len(self._prev) and texts[k] == self._prev[k]:
+                k += 1
+        if k < len(segs):
+            self._committed += texts[:k]
+            if k:
+                self._drop(int(segs[k - 1]["end"] * SR))
+        elif audio.size > self.window:
+            self._committed += texts           # ventana llena (o sin segmentos): todo fuera
+            self._drop(audio.size)
+        self._prev = texts[k:]
+        self._last = (" ".join(self._committed + self._prev).strip(), lang)
+        return self._last
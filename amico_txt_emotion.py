@@ -1,6 +1,15 @@
 # amico_txt_emotion.py
-from functools import lru_cache
+from collections import OrderedDict
+import atexit
+import json
 import os
+import threading
+import time
+import warnings
+import numpy as np
+import amico_backends as backends
+import amico_metrics as metrics
+import amico_models as models
 
 def _quiet_hf():
     # kill bars & logs BEFORE creating pipelines
@@ -12,38 +21,234 @@ def _quiet_hf():
     except Exception:
         pass
 
-@lru_cache(maxsize=1)
-def _pipe_en():
+TXT_MODELS = {   # registry name -> (HF model id, size estimate MB)
+    "txt_en": ("j-hartmann/emotion-english-distilroberta-base", 330),
+    "txt_multi": ("joeddav/distilbert-base-multilingual-cased-go-emotions", 540),
+}
+
+def _load_pipe(model_id: str, backend: str = "eager", name: str = ""):
     _quiet_hf()
     from transformers import pipeline  # lazy import
-    return pipeline("text-classification",
-                    model="j-hartmann/emotion-english-distilroberta-base",
-                    top_k=None, return_all_scores=True)
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification  # optional
+            from transformers import AutoTokenizer
+        except ImportError:
+            warnings.warn("onnx backend for text emotion needs `optimum[onnxruntime]`; using eager")
+        else:
+            out_dir = backends.onnx_path(name, model_id).with_suffix("")
+            if (out_dir / "model.onnx").exists():
+                model = ORTModelForSequenceClassification.from_pretrained(out_dir)
+            else:
+                model = ORTModelForSequenceClassification.from_pretrained(model_id, export=True)
+                model.save_pretrained(out_dir)
+            return pipeline("text-classification", model=model, tokenizer=AutoTokenizer.from_pretrained(model_id),
+                            top_k=None, return_all_scores=True)
+    pl = pipeline("text-classification", model=model_id,
+                  top_k=None, return_all_scores=True)
+    if backend == "int8":
+        pl.model = backends.quantize_int8(pl.model)
+    return pl
+
+_PROBE_TEXTS = ["I can't believe you did that, this is wonderful!",
+                "I'm tired and I don't want to talk right now.",
+                "The bus leaves at nine."]
+
+def _probe(name: str, backend: str) -> np.ndarray:
+    out = _load_pipe(TXT_MODELS[name][0], backend, name)(_PROBE_TEXTS)
+    return np.array([[d["score"] for d in sorted(o, key=lambda d: d["label"])] for o in out])
+
+for _name, (_model_id, _size_mb) in TXT_MODELS.items():
+    models.register(_name, lambda n=_name, m=_model_id: _load_pipe(m, backends.backend_for(n), n),
+                    size_mb=_size_mb)
+    backends.register_probe(_name, lambda b, n=_name: _probe(n, b))
+
+def _pipe_en():
+    return models.get("txt_en")
 
-@lru_cache(maxsize=1)
 def _pipe_multi():
-    _quiet_hf()
-    from transformers import pipeline  # lazy import
-    return pipeline("text-classification",
-                    model="joeddav/distilbert-base-multilingual-cased-go-emotions",
-                    top_k=None, return_all_scores=True)
+    return models.get("txt_multi")
+
+# ---------- result cache ----------
+# Companion talk is repetitive ("good morning", "thank you"): remember results per
+# (text, model). The text is the exact string the model sees (only stripped, as
+# before the cache existed); the model tag names the HF model and backend, so
+# switching either at runtime misses instead of returning another model's result.
+# Bounded LRU, optional TTL, optional JSON file across restarts.
+CACHE_MAX   = int(os.getenv("AMICO_TXT_EMO_CACHE_MAX", "4096"))
+CACHE_TTL_S = float(os.getenv("AMICO_TXT_EMO_CACHE_TTL", "0"))      # 0 = never expires
+CACHE_PATH  = os.getenv("AMICO_TXT_EMO_CACHE_PATH")                 # unset = memory only
+
+def _model_tag(key: str) -> str:
+    # "en" / "multi" -> the HF model and backend that would answer it right now
+    name = f"txt_{key}"
+    return f"{TXT_MODELS[name][0]}@{backends.backend_for(name)}"
+
+class _ResultCache:
+    def __init__(self, maxsize: int, ttl_s: float, path=None):
+        self.maxsize, self.ttl_s, self.path = maxsize, ttl_s, path
+        self.hits = self.misses = 0
+        self._data: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def get(self, key):
+        with self._lock:
+            self._ensure_loaded()
+            item = self._data.get(key)
+            if item is not None and self.ttl_s > 0 and time.time() - item[0] > self.ttl_s:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                metrics.inc("amico_txt_emotion_cache_total", result="miss")
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            metrics.inc("amico_txt_emotion_cache_total", result="hit")
+            res = item[1]
+        return {**res, "dist": dict(res["dist"])}   # callers may mutate their copy
+
+    def put(self, key, res: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.time(), res)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data),
+                    "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            rows = [[t, m, ts, r] for (t, m), (ts, r) in self._data.items()]
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _ensure_loaded(self) -> None:
+        # lock held; read the persisted cache once, on first use
+        if self._loaded:
+            return
+        self._loaded = True
+        if not (self.path and os.path.exists(self.path)):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for t, m, ts, r in json.load(f)[-self.maxsize:]:
+                    self._data[(t, m)] = (float(ts), r)
+        except Exception:
+            # a corrupt cache file is not worth failing a turn over
+            self._data.clear()
+
+_cache = _ResultCache(CACHE_MAX, CACHE_TTL_S, CACHE_PATH)
+if CACHE_PATH:
+    atexit.register(_cache.save)
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+def clear_cache() -> None:
+    _cache.clear()
+
+def save_cache() -> None:
+    _cache.save()
+
+# tokenizer arguments of every cached call, single or batched: both paths fill the
+# same cache, so they must see the same input (over-long texts are cut to the
+# model's max length instead of failing)
+PIPE_KWARGS = {"truncation": True}
 
 def _neutral():
     return {"label": "neutral", "confidence": 0.5, "dist": {"neutral": 1.0}, "model": "none"}
 
+def _model_key(lang) -> str:
+    return "en" if (lang or "en").lower().startswith("en") else "multi"
+
+def _result(out, model: str) -> dict:
+    # out: list of {label, score} for one input
+    if isinstance(out, dict):
+        out = [out]
+    dist = {d["label"].lower(): float(d["score"]) for d in out}
+    # Optional: renormalize multi-label outputs (GoEmotions)
+    s = sum(dist.values()) or 1.0
+    dist = {k: v / s for k, v in dist.items()}
+    label = max(dist, key=dist.get)
+    return {"label": label, "confidence": dist[label], "dist": dist, "model": model}
+
+@metrics.timed("amico_stage_seconds", stage="text_emotion")
 def detect_text_emotion(text: str, lang: str = "en"):
     text = (text or "").strip()
     if not text:
         return _neutral()
+    key = _model_key(lang)
+    ckey = (text, _model_tag(key))
+    hit = _cache.get(ckey)
+    if hit is not None:
+        return hit
     try:
-        use_en = (lang or "en").lower().startswith("en")
-        pl = _pipe_en() if use_en else _pipe_multi()
-        out = pl(text)[0]                            # list of {label, score}
-        dist = {d["label"].lower(): float(d["score"]) for d in out}
-        # Optional: renormalize multi-label outputs (GoEmotions)
-        s = sum(dist.values()) or 1.0
-        dist = {k: v / s for k, v in dist.items()}
-        label = max(dist, key=dist.get)
-        return {"label": label, "confidence": dist[label], "dist": dist, "model": "en" if use_en else "multi"}
+        pl = _pipe_en() if key == "en" else _pipe_multi()
+        with metrics.timer("amico_inference_seconds", model=f"txt_{key}"):
+            out = pl(text, **PIPE_KWARGS)[0]         # list of {label, score}
+        res = _result(out, key)
     except Exception:
-        return _neutral()
+        return _neutral()                            # not cached: model may come back
+    _cache.put(ckey, res)
+    return {**res, "dist": dict(res["dist"])}
+
+def detect_text_emotion_batch(texts, langs="en", batch_size: int = 16):
+    """
+    Classify many utterances at once. `langs` is one language for all texts or one per text.
+    Cached texts are answered directly; the rest are grouped by model (en / multi),
+    sorted by length to keep padding low,
+    run through the pipeline in batches of `batch_size` with the same tokenizer
+    arguments as detect_text_emotion() (PIPE_KWARGS), and returned in input order
+    with the same dicts it produces.
+    """
+    texts = [(t or "").strip() for t in texts]
+    if isinstance(langs, str) or langs is None:
+        langs = [langs] * len(texts)
+    if len(langs) != len(texts):
+        raise ValueError("langs must be a single language or one per text")
+
+    results = [None] * len(texts)
+    groups = {"en": [], "multi": []}
+    tags = {key: _model_tag(key) for key in groups}
+    for i, (t, lang) in enumerate(zip(texts, langs)):
+        if not t:
+            results[i] = _neutral()
+            continue
+        key = _model_key(lang)
+        results[i] = _cache.get((t, tags[key]))
+        if results[i] is None:
+            groups[key].append(i)
+
+    for key, idx in groups.items():
+        if not idx:
+            continue
+        idx.sort(key=lambda i: len(texts[i]))
+        try:
+            pl = _pipe_en() if key == "en" else _pipe_multi()
+            with metrics.timer("amico_inference_seconds", model=f"txt_{key}_batch"):
+                outs = pl([texts[i] for i in idx], batch_size=batch_size, **PIPE_KWARGS)
+            for i, out in zip(idx, outs):
+                res = _result(out, key)
+                _cache.put((texts[i], tags[key]), res)
+                results[i] = {**res, "dist": dict(res["dist"])}
+        except Exception:
+            for i in idx:
+                results[i] = _neutral()
+    return results
@@ -1,39 +1,107 @@
 import numpy as np
-import torch, torchaudio
+import torch
 from speechbrain.inference import EncoderClassifier
+import amico_backends as backends
+import amico_metrics as metrics
+import amico_models as models
+from amico_audio import AudioLike, TurnAudio, as_turn_audio
+from amico_vp_version import LEGACY_MODEL_VERSION, MODEL_VERSION   # noqa: F401  (re-exported)
 
 # Modelo de extracción
 MODEL = "speechbrain/spkrec-ecapa-voxceleb"
+# MODEL_VERSION / LEGACY_MODEL_VERSION viven en amico_vp_version: cambiar allí la
+# etiqueta cuando cambie MODEL o el preprocesado (_mono_16k).
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-_enc = None
+
+# ECAPA is Conv1d almost end to end, so dynamic int8 (Linear/LSTM only) has nothing to
+# quantize: just eager or ONNX Runtime for the embedding network.
+BACKENDS = ("eager", "onnx")
+
+def _load_ecapa(backend: str = "eager"):
+    device = DEVICE if backend == "eager" else "cpu"
+    clf = EncoderClassifier.from_hparams(source=MODEL, run_opts={"device": device})
+    if backend == "onnx":
+        # features + mean/var norm stay in torch; the embedding network runs in ORT
+        path = backends.export_onnx(
+            clf.mods.embedding_model, (torch.randn(1, 200, 80), torch.ones(1)),
+            backends.onnx_path("ecapa", MODEL), ["feats", "lengths"], ["embeddings"],
+            {"feats": {0: "batch", 1: "frames"}, "lengths": {0: "batch"}, "embeddings": {0: "batch"}})
+        clf.mods.embedding_model = backends.OrtModule(path, ["feats", "lengths"])
+    return clf
+
+def _probe_ecapa(backend: str) -> np.ndarray:
+    with torch.no_grad():
+        return _load_ecapa(backend).encode_batch(torch.from_numpy(backends.probe_audio()[None])).cpu().numpy()
+
+models.register("ecapa", lambda: _load_ecapa(backends.backend_for("ecapa", BACKENDS)), size_mb=90)
+backends.register_probe("ecapa", _probe_ecapa, BACKENDS)
 
 def _model():
-    global _enc
-    if _enc is None:
-        _enc = EncoderClassifier.from_hparams(source=MODEL, run_opts={"device": DEVICE})
-    return _enc
+    return models.get("ecapa")
     
 def _mono_16k(path: str) -> torch.Tensor:
-    wav, sr = torchaudio.load(path)                 # (C, T)
-    if wav.size(0) > 1:
-        wav = wav.mean(0, keepdim=True)
-    if sr != 16000:
-        wav = torchaudio.functional.resample(wav, sr, 16000)
-    m = wav.abs().max()
-    if m > 0:
-        wav = wav / m
-    return wav
+    return TurnAudio.from_path(path).wav16_norm
 
+@metrics.timed("amico_stage_seconds", stage="vp")
 @torch.no_grad()
-def vp(path: str) -> np.ndarray:
-    wav = _mono_16k(path).to(DEVICE)
-    emb = _model().encode_batch(wav)                # (1, 192)
+def vp(audio: AudioLike) -> np.ndarray:
+    model = _model()
+    wav = as_turn_audio(audio).wav16_norm.to(model.device)
+    emb = model.encode_batch(wav)                # (1, 192)
     emb = emb.squeeze(0).squeeze(0).detach().cpu().numpy().astype("float32")
     n = np.linalg.norm(emb)
     if n > 0:
         emb = emb / n                               # L2-normalize
     return emb                                      # shape (192,)
 
+def _wav16_of(item) -> torch.Tensor:
+    # path | TurnAudio | 1-D 16 kHz waveform (numpy / tensor) -> peak-normalised (T,) tensor
+    if isinstance(item, (str, TurnAudio)) or hasattr(item, "__fspath__"):
+        return as_turn_audio(str(item) if not isinstance(item, TurnAudio) else item).wav16_norm[0]
+    return TurnAudio(torch.as_tensor(np.asarray(item, dtype=np.float32))).wav16_norm[0]
+
+@metrics.timed("amico_stage_seconds", stage="vp_batch")
+@torch.no_grad()
+def vp_batch(items, batch_size: int = 16) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Embed many clips at once (enrollment, archive re-embedding).
+    items: paths, TurnAudio objects or 1-D 16 kHz waveforms.
+    Clips are decoded one batch at a time (only `batch_size` waveforms in memory),
+    sorted by length within the batch, zero-padded and passed to ECAPA with
+    relative lengths, so padding doesn't leak into the embedding.
+    Returns ((N,192) float32 L2-normalised, (N,) bool valid). Rows that fail
+    (unreadable file, empty audio, _valid_vp false) are zeros flagged invalid;
+    nothing raises for a single bad clip. Errors loading or running the model
+    (missing weights, OOM, shape bugs) propagate.
+    """
+    items = list(items)
+    out = np.zeros((len(items), 192), dtype=np.float32)
+    bs = max(1, int(batch_size))
+    for a in range(0, len(items), bs):
+        wavs: dict[int, torch.Tensor] = {}
+        for i in range(a, min(a + bs, len(items))):
+            try:
+                w = _wav16_of(items[i])
+            except Exception:
+                continue
+            if w.numel() > 0:
+                wavs[i] = w
+        if not wavs:
+            continue
+        idx = sorted(wavs, key=lambda i: wavs[i].numel(), reverse=True)
+        longest = wavs[idx[0]].numel()
+        batch = torch.zeros(len(idx), longest)
+        for r, i in enumerate(idx):
+            batch[r, :wavs[i].numel()] = wavs[i]
+        lens = torch.tensor([wavs[i].numel() / longest for i in idx])
+        model = _model()
+        emb = model.encode_batch(batch.to(model.device), lens.to(model.device))    # (B, 1, 192)
+        emb = emb.reshape(len(idx), -1).detach().cpu().numpy().astype("float32")
+        out[idx] = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+    valid = np.array([_valid_vp(row) for row in out], dtype=bool)
+    out[~valid] = 0.0
+    return out, valid
+
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.dot(a, b) / (np.linalg.norm(a)*np.linalg.norm(b) + 1e-8))
 
@@ -50,6 +118,6 @@ def _valid_vp(vp) -> bool:
     )
 
 # (optional) convenience wrapper that returns None if invalid
-def vp_or_none(path: str):
-    emb = vp(path)
+def vp_or_none(audio: AudioLike):
+    emb = vp(audio)
     return emb if _valid_vp(emb) else None
@@ -0,0 +1,10 @@
+# amico_vp_version.py — etiquetas de versión de las voiceprints, sin dependencias
+# (amico_db / amico_reembed las leen sin cargar torch ni speechbrain).
+
+# Etiqueta guardada con cada voiceprint: cambiarla cuando cambie amico_vp.MODEL o el
+# preprocesado (_mono_16k); las huellas de versiones distintas no son comparables.
+# v2: audio decodificado una vez por turno (TurnAudio), normalizado a pico y, en
+# lote, con longitudes relativas para que el relleno no entre en el embedding.
+MODEL_VERSION = "spkrec-ecapa-voxceleb/v2"
+# Versión de las huellas sin etiqueta (model_version NULL, anteriores al etiquetado).
+LEGACY_MODEL_VERSION = "spkrec-ecapa-voxceleb/v1"
@@ -0,0 +1,51 @@
+# Shared fixtures. The amico_* modules live at the repo root (no package), so make
+# them importable from here.
+#
+# Postgres tests need psycopg2 and AMICO_TEST_DSN pointing at a throwaway database,
+# e.g. AMICO_TEST_DSN="dbname=amico_test user=postgres host=localhost"; they create
+# the schema there and delete the rows they insert.
+import os, sys
+from pathlib import Path
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+@pytest.fixture
+def pg_conn():
+    psycopg2 = pytest.importorskip("psycopg2")
+    dsn = os.getenv("AMICO_TEST_DSN")
+    if not dsn:
+        pytest.skip("set AMICO_TEST_DSN to run the Postgres tests")
+    import amico_db
+    conn = psycopg2.connect(dsn)
+    amico_db.ensure_schema(conn)
+    yield conn
+    conn.rollback()
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM amico_users WHERE display_name LIKE 'pytest-%'")
+    conn.close()
+
+@pytest.fixture
+def make_user(pg_conn):
+    def _make(name: str) -> str:
+        with pg_conn, pg_conn.cursor() as cur:
+            cur.execute("INSERT INTO amico_users (display_name) VALUES (%s) RETURNING id::text", (f"pytest-{name}",))
+            return cur.fetchone()[0]
+    return _make
+
+@pytest.fixture
+def unit():
+    """unit(rng, n, dim=192) -> (n, dim) float32 random unit vectors."""
+    def _unit(rng, n, dim=192):
+        x = rng.standard_normal((n, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+    return _unit
+
+@pytest.fixture
+def noisy():
+    """noisy(rng, x, sigma=0.05) -> x plus noise of norm ~sigma, renormalised."""
+    def _noisy(rng, x, sigma=0.05):
+        y = x + sigma / np.sqrt(x.shape[-1]) * rng.standard_normal(x.shape).astype(np.float32)
+        return y / np.linalg.norm(y, axis=-1, keepdims=True)
+    return _noisy
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+import amico_backends as backends
+
+class _CastLinear(torch.nn.Linear):
+    # like whisper.model.Linear: a subclass quantize_dynamic's exact-type lookup misses
+    def forward(self, x):
+        return torch.nn.functional.linear(x, self.weight.to(x.dtype), self.bias)
+
+def _net(linear=torch.nn.Linear):
+    torch.manual_seed(0)
+    return torch.nn.Sequential(linear(64, 128), torch.nn.ReLU(), torch.nn.Sequential(linear(128, 16)))
+
+def _n_quantized(module) -> int:
+    return sum(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in module.modules())
+
+@pytest.mark.parametrize("linear", [torch.nn.Linear, _CastLinear])
+def test_quantize_int8_converts_linear_and_subclasses(linear):
+    q = backends.quantize_int8(_net(linear))
+    assert _n_quantized(q) == 2
+    assert not any(isinstance(m, _CastLinear) for m in q.modules())
+
+def test_quantize_int8_parity():
+    net = _net(_CastLinear).eval()
+    x = torch.randn(32, 64)
+    with torch.no_grad():
+        ref = net(x).numpy()
+        cand = backends.quantize_int8(_net(_CastLinear))(x).numpy()
+    res = backends.compare(ref, cand)
+    assert res["cosine"] > 0.99
+
+def test_quantize_int8_raises_when_nothing_quantized():
+    with pytest.raises(RuntimeError):
+        backends.quantize_int8(torch.nn.Sequential(torch.nn.Conv1d(1, 4, 3)))
+
+def test_compare():
+    a = np.array([0.1, 0.7, 0.2])
+    r = backends.compare(a, a * 2)
+    assert r["cosine"] == pytest.approx(1.0) and r["top1_agree"]
+    assert not backends.compare(a, a[::-1])["top1_agree"]
+
+def test_probe_audio_is_deterministic():
+    a, b = backends.probe_audio(), backends.probe_audio()
+    assert a.dtype == np.float32 and a.shape == (32000,)
+    np.testing.assert_array_equal(a, b)
+    assert np.abs(a).max() == pytest.approx(0.5)
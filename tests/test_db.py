@@ -0,0 +1,166 @@
+import struct, uuid
+import numpy as np
+import pytest
+
+pytest.importorskip("psycopg2")
+import amico_db
+from amico_gallery import EmbeddingGallery, quantize
+from amico_vp_version import LEGACY_MODEL_VERSION, MODEL_VERSION
+
+# ---------- binary COPY parsing (no server needed) ----------
+def _copy_buffer(rows, dtype: str) -> bytes:
+    """What `COPY (SELECT id, user_id, [qscale,] embedding ...) TO STDOUT (FORMAT binary)` sends."""
+    out = [b"PGCOPY\n\xff\r\n\x00", struct.pack(">ii", 0, 0)]
+    for rid, uid, emb, scale in rows:
+        body = np.ascontiguousarray(emb, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+        out.append(struct.pack(">h", 4 if dtype == "int8" else 3))
+        out.append(struct.pack(">iq", 8, rid) + struct.pack(">i", 16) + uuid.UUID(uid).bytes)
+        if dtype == "int8":
+            out.append(struct.pack(">if", 4, scale))
+        out.append(struct.pack(">i", len(body)) + body)
+    out.append(struct.pack(">h", -1))
+    return b"".join(out)
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_parse_prints_copy(dtype):
+    rng = np.random.default_rng(0)
+    uids = [str(uuid.uuid4()) for _ in range(3)]
+    x = rng.standard_normal((5, 192)).astype(np.float32)
+    codes, scales = quantize(x, dtype)
+    rows = [(10 + i, uids[i % 3], codes[i], None if scales is None else float(scales[i])) for i in range(5)]
+    ids, users, embs, sc = amico_db._parse_prints_copy(memoryview(_copy_buffer(rows, dtype)), 192, dtype)
+    assert ids.tolist() == [10, 11, 12, 13, 14]
+    assert users == [uids[i % 3] for i in range(5)]
+    assert embs.shape == (5, 192) and embs.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(embs, codes)
+    if dtype == "int8":
+        np.testing.assert_array_equal(sc, scales)
+    else:
+        assert sc is None
+
+def test_parse_prints_copy_empty_and_bad_layout():
+    ids, users, embs, _ = amico_db._parse_prints_copy(memoryview(_copy_buffer([], "float32")), 192, "float32")
+    assert len(ids) == 0 and users == [] and embs.shape == (0, 192)
+    buf = _copy_buffer([(1, str(uuid.uuid4()), np.zeros(192, np.float32), None)], "float32")
+    with pytest.raises(ValueError):
+        amico_db._parse_prints_copy(memoryview(buf[:-10] + buf[-2:]), 192, "float32")
+    with pytest.raises(ValueError):                       # wrong embedding width
+        amico_db._parse_prints_copy(memoryview(buf), 96, "float32")
+
+# ---------- connection pool (fake connections) ----------
+class _FakeConn:
+    closed = 0
+    def get_transaction_status(self):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+        return TRANSACTION_STATUS_IDLE
+
+class _FakePool:
+    # like ThreadedConnectionPool: getconn fails at once when every connection is out
+    closed = False
+    def __init__(self, lo, hi, **kwargs):
+        self.maxconn, self.out = hi, 0
+    def getconn(self):
+        if self.out == self.maxconn:
+            raise amico_db.pg_pool.PoolError("connection pool exhausted")
+        self.out += 1
+        return _FakeConn()
+    def putconn(self, conn, close=False):
+        self.out -= 1
+    def closeall(self):
+        self.closed = True
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    monkeypatch.setattr(amico_db.pg_pool, "ThreadedConnectionPool", _FakePool)
+    monkeypatch.setattr(amico_db, "_alive", lambda conn: True)
+    monkeypatch.setenv("AMICO_DB_POOL_MIN", "1")
+    monkeypatch.setenv("AMICO_DB_POOL_MAX", "1")
+    amico_db.close_pool()
+    yield
+    amico_db.close_pool()
+
+def test_pooled_conn_waits_for_a_free_connection(fake_pool, monkeypatch):
+    import threading, time
+    monkeypatch.setenv("AMICO_DB_POOL_TIMEOUT_S", "5")
+    got = []
+    with amico_db.pooled_conn():
+        t = threading.Thread(target=lambda: got.append(amico_db.pooled_conn().__enter__()))
+        t.start()
+        time.sleep(0.1)
+        assert not got                       # waiting, not failing
+    t.join(1)
+    assert len(got) == 1
+
+def test_pooled_conn_times_out(fake_pool, monkeypatch):
+    monkeypatch.setenv("AMICO_DB_POOL_TIMEOUT_S", "0.05")
+    with amico_db.pooled_conn():
+        with pytest.raises(amico_db.pg_pool.PoolError):
+            with amico_db.pooled_conn():
+                pass
+    with amico_db.pooled_conn():             # the slot came back
+        pass
+
+# ---------- against a local Postgres (AMICO_TEST_DSN) ----------
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_load_prints_converts_every_stored_format(pg_conn, make_user, dtype, unit):
+    amico_db.ensure_quantized_schema(pg_conn)
+    uid = make_user("formats")
+    x = unit(np.random.default_rng(1), 6)
+    for i, stored in enumerate(("float32", "float16", "int8")):
+        amico_db.insert_voiceprints(pg_conn, uid, x[2 * i:2 * i + 2], dtype=stored, model_version="pytest/v1")
+    ids, users, embs, scales = amico_db.load_prints(pg_conn, "voice", dtype, model_version="pytest/v1")
+    mine = [i for i, u in enumerate(users) if u == uid]
+    assert len(mine) == 6 and embs.dtype == np.dtype(dtype)
+    g = EmbeddingGallery("voice", dtype=dtype)
+    g.add_many([users[i] for i in mine], embs[mine], ids[mine], None if scales is None else scales[mine])
+    for q in x:
+        assert g.scores(q)[uid] > 0.99
+
+def test_version_tags_are_distinct():
+    assert MODEL_VERSION != LEGACY_MODEL_VERSION
+    assert amico_db.default_model_version("voice") == MODEL_VERSION
+    assert amico_db.default_model_version("face") is None
+
+def test_untagged_rows_count_as_legacy_version(pg_conn, make_user, unit):
+    uid = make_user("versions")
+    x = unit(np.random.default_rng(2), 3)
+    with pg_conn, pg_conn.cursor() as cur:                # a row from before tagging
+        cur.execute("INSERT INTO amico_voiceprints (user_id, embedding) VALUES (%s, %s)",
+                    (uid, x[0].astype("<f4").tobytes()))
+    amico_db.insert_voiceprints(pg_conn, uid, x[1:2])                          # default: current version
+    amico_db.insert_voiceprints(pg_conn, uid, x[2:3], model_version="other/v9")
+    for version in (None, LEGACY_MODEL_VERSION, "other/v9"):
+        ids, users, _, _ = amico_db.load_prints(pg_conn, "voice", model_version=version)
+        assert users.count(uid) == 1
+
+# ---------- pgvector ----------
+def test_vec_literal_roundtrips_float32():
+    x = np.random.default_rng(3).standard_normal(512).astype(np.float32)
+    back = np.array(amico_db._vec_literal(x)[1:-1].split(","), dtype=np.float64).astype(np.float32)
+    np.testing.assert_array_equal(back, x)
+
+@pytest.fixture
+def pgvector_conn(pg_conn):
+    import psycopg2
+    try:
+        amico_db.ensure_schema(pg_conn, pgvector=True)
+    except psycopg2.Error as e:
+        pg_conn.rollback()
+        pytest.skip(f"pgvector not available: {e}")
+    yield pg_conn
+    amico_db.build_vector_index(pg_conn, "hnsw")     # leave the default index behind
+
+@pytest.mark.parametrize("index", ["hnsw", "ivfflat"])
+def test_knn_prints_self_retrieval(pgvector_conn, make_user, index, unit):
+    amico_db.ensure_quantized_schema(pgvector_conn)
+    rng = np.random.default_rng(4)
+    uids = [make_user(f"knn{i}") for i in range(4)]
+    x = unit(rng, 8)
+    amico_db.insert_voiceprints(pgvector_conn, uids, x[:4], pgvector=True, model_version="pytest/v1")
+    amico_db.insert_voiceprints(pgvector_conn, uids, x[4:8], dtype="int8", model_version="pytest/v1")
+    amico_db.insert_voiceprints(pgvector_conn, uids[::-1], x[:4], model_version="pytest/v2")    # other extractor
+    assert amico_db.migrate_to_pgvector(pgvector_conn)["voice"] >= 8      # backfills quantized rows too
+    amico_db.build_vector_index(pgvector_conn, index, lists=1)
+    for i in range(8):
+        (uid, sim), = amico_db.knn_prints(pgvector_conn, "voice", x[i], k=1, probes=1, model_version="pytest/v1")
+        assert uid == uids[i % 4] and sim == pytest.approx(1.0, abs=1e-2 if i >= 4 else 1e-5)
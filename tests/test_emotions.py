@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+import amico_emotions as emo
+
+def _old_centroid(wav, sr):
+    # the pre-framing implementation: one rfft of the clip padded to the next power of two
+    x = wav.squeeze(0)
+    n = 1 << (x.numel() - 1).bit_length()
+    mag = torch.fft.rfft(torch.nn.functional.pad(x, (0, n - x.numel()))).abs() + 1e-9
+    return float((torch.linspace(0, sr / 2, steps=mag.numel()) * mag).sum() / mag.sum())
+
+def test_fast_len_is_5_smooth_and_minimal():
+    def smooth(m):
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        return m == 1
+    for n in [1, 2, 7, 97, 1000, 65537, 80001]:
+        m = emo._fast_len(n)
+        assert m >= n and smooth(m) and not any(smooth(k) for k in range(n, m))
+
+def test_arousal_keeps_the_original_features():
+    rng = np.random.default_rng(0)
+    t = np.arange(65537) / 16000
+    wav = torch.from_numpy((0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(t.size))
+                           .astype(np.float32)).reshape(1, -1)
+    assert emo._feature_centroid(wav, 16000) == pytest.approx(_old_centroid(wav, 16000), rel=0.01)
+    z = 0.6 * (emo._feature_rms(wav) - 0.05) / 0.03 + 0.4 * (emo._feature_centroid(wav, 16000) - 2000) / 800
+    assert emo._arousal_from_prosody(wav, 16000) == pytest.approx(1 / (1 + np.exp(-z)))
+
+def test_prosody_pitch_is_opt_in():
+    t = np.arange(16000) / 16000
+    wav = torch.from_numpy((0.5 * np.sin(2 * np.pi * 150 * t)).astype(np.float32))
+    full = emo.prosody_features(wav, 16000)
+    assert full["stats"]["pitch_median"] == pytest.approx(150, rel=0.03) and full["voiced"].mean() > 0.9
+    light = emo.prosody_features(wav, 16000, pitch=False)
+    assert "pitch" not in light and "pitch_median" not in light["stats"]
+    np.testing.assert_allclose(light["rms"], full["rms"])
@@ -0,0 +1,45 @@
+import asyncio, sys, time, types
+import pytest
+
+torch = pytest.importorskip("torch")         # amico_audio decodes with torchaudio
+import amico_engine
+from amico_audio import TurnAudio
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    # the engine imports its stages lazily; slow fakes stand in for whisper & co.
+    def stt(audio):
+        time.sleep(0.05)
+        return f"said {audio.tag}", "en"
+    def detect_emotion(audio, mode="light"):
+        time.sleep(0.05)
+        return {"arousal": 0.5}
+    def vp(audio):
+        time.sleep(0.05)
+        return None
+    for name, attrs in (("amico_stt", {"stt": stt}), ("amico_emotions", {"detect_emotion": detect_emotion}),
+                        ("amico_vp", {"vp": vp})):
+        monkeypatch.setitem(sys.modules, name, types.SimpleNamespace(**attrs))
+
+def _turns(n):
+    out = []
+    for i in range(n):
+        a = TurnAudio(torch.zeros(1600))
+        a.tag = i
+        out.append(a)
+    return out
+
+def test_barge_in_interrupts_the_response_not_the_analysis(fake_stages):
+    seen = []
+
+    async def on_turn(res):
+        seen.append(res)
+        if res.seq == 1:
+            engine.interrupt()                # the user starts talking over the reply
+            await asyncio.sleep(10)
+
+    engine = amico_engine.TurnEngine(on_turn, text_emotion=False)
+    asyncio.run(asyncio.wait_for(engine.run(_turns(3)), 5))
+    assert [r.text for r in seen] == ["said 0", "said 1", "said 2"]
+    assert [r.interrupted for r in seen] == [True, False, False]
+    assert engine.stats["interrupted"] == 1 and engine.stats["cancelled"] == 0
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from amico_enroll import EmbeddingBuffer, EnrollmentManager
+from amico_id_types import PolicyConfig
+
+def test_keeps_best_samples_when_full(unit):
+    x = unit(np.random.default_rng(0), 6, 8)
+    buf = EmbeddingBuffer(8, capacity=3, dedup_threshold=0.999)
+    for e, q in zip(x, [0.5, 0.9, 0.1, 0.7, 0.2, 0.8]):
+        buf.add(e, q)
+    embs, qual = buf.top()
+    assert len(buf) == 3 and qual.tolist() == pytest.approx([0.9, 0.8, 0.7])
+    np.testing.assert_allclose(embs[0], x[1])
+    assert buf.accepted == 6 and buf.rejected == 1       # only 0.2 lost to a full buffer
+
+def test_near_duplicate_replaces_only_if_better():
+    e = np.ones(8, np.float32)
+    buf = EmbeddingBuffer(8, capacity=4)
+    assert buf.add(e, 0.5)
+    assert not buf.add(e * 2, 0.4)            # same direction, worse quality
+    assert buf.add(e, 0.9)
+    assert len(buf) == 1 and buf.duplicates == 2
+    assert buf.top()[1].tolist() == pytest.approx([0.9])
+
+def test_rejects_invalid_samples():
+    buf = EmbeddingBuffer(8)
+    assert not buf.add(np.zeros(8))
+    assert not buf.add(np.full(8, np.nan))
+    assert not buf.add(np.ones(4))
+    assert len(buf) == 0 and buf.rejected == 3 and buf.accepted == 0
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        EmbeddingBuffer(8, capacity=0)
+
+def test_duplicates_count_toward_done():
+    m = EnrollmentManager()
+    m.start("Ana Lopez")
+    for _ in range(3):
+        m.add_voice(np.ones(192))
+        m.add_face(np.ones(512))
+    assert m.done()
+    uid, v, f = m.finish()
+    assert uid == "Ana Lopez" and v.shape == (1, 192) and f.shape == (1, 512)
+
+def test_zero_print_cap_is_valid(unit):
+    m = EnrollmentManager(PolicyConfig(max_voiceprints_per_user=0, max_faceprints_per_user=0))
+    m.start("Bo")
+    rng = np.random.default_rng(1)
+    for e in unit(rng, 3, 192):
+        m.add_voice(e)
+    assert len(m.state.voice_embs) == 1 and m.state.voice_embs.accepted == 3
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+from amico_gallery import (EmbeddingGallery, PrototypeStore, dequantize, kmeans_prototypes, quantize,
+                           recall_vs_float32)
+
+# ---------- quantize / dequantize ----------
+def test_float32_is_passthrough(unit):
+    x = unit(np.random.default_rng(0), 4)
+    codes, scales = quantize(x, "float32")
+    assert scales is None and codes.dtype == np.float32
+    np.testing.assert_array_equal(dequantize(codes), x)
+
+def test_float16_roundtrip(unit):
+    x = unit(np.random.default_rng(1), 8)
+    codes, scales = quantize(x, "float16")
+    assert scales is None and codes.dtype == np.float16
+    np.testing.assert_allclose(dequantize(codes), x, atol=1e-3)
+
+def test_int8_per_row_scale(unit):
+    x = unit(np.random.default_rng(2), 8) * np.array([[1.0], [5.0], [0.1], [1], [1], [1], [1], [1]], np.float32)
+    codes, scales = quantize(x, "int8")
+    assert codes.dtype == np.int8 and scales.shape == (8,)
+    assert np.abs(codes).max() == 127
+    np.testing.assert_allclose(scales, np.abs(x).max(axis=1) / 127.0, rtol=1e-6)
+    err = np.abs(dequantize(codes, scales) - x).max(axis=1)
+    assert (err <= scales / 2 + 1e-7).all()      # at most half a step per component
+
+def test_int8_zero_vector():
+    codes, scales = quantize(np.zeros((1, 192), np.float32), "int8")
+    assert scales[0] == 1.0 and not codes.any()
+
+def test_unknown_dtype():
+    with pytest.raises(ValueError):
+        quantize(np.zeros((1, 4)), "bfloat16")
+
+# ---------- EmbeddingGallery ----------
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+@pytest.mark.parametrize("agg", ["max", "mean", "centroid"])
+def test_match_finds_enrolled_user(dtype, agg, unit, noisy):
+    rng = np.random.default_rng(3)
+    base = unit(rng, 20)
+    users = [f"u{i}" for i in range(20) for _ in range(3)]
+    embs = np.repeat(base, 3, axis=0)
+    g = EmbeddingGallery("voice", agg, capacity=4, n_protos=2, dtype=dtype)   # grows past capacity
+    g.add_many(users, noisy(rng, embs))
+    if agg == "centroid":
+        g.refresh_prototypes()
+    assert len(g) == 60 and sorted(g.users) == sorted(set(users))
+    for i in (0, 7, 19):
+        uid, score = g(noisy(rng, base[i]))
+        assert uid == f"u{i}" and score > 0.9
+
+def test_empty_gallery():
+    g = EmbeddingGallery("face")
+    assert g.match(np.ones(512)) == (None, 0.0)
+    assert g.match_batch(np.ones((2, 512))) == (None, 0.0, -1)
+    assert g.scores(np.ones(512)) == {}
+
+def test_add_validates():
+    g = EmbeddingGallery("voice")
+    with pytest.raises(ValueError):
+        g.add("a", np.ones(10))
+    with pytest.raises(ValueError):
+        g.add("a", np.full(192, np.nan))
+    g.add_many(["a", "b"], np.stack([np.ones(192), np.full(192, np.inf)]))   # non-finite rows skipped
+    assert len(g) == 1 and g.users == ["a"]
+
+def test_remove_by_user_and_row_ids(unit):
+    rng = np.random.default_rng(4)
+    g = EmbeddingGallery("voice", "centroid")
+    g.add_many(["a", "a", "b", "c"], unit(rng, 4), row_ids=[1, 2, 3, 4])
+    assert g.remove(row_ids=[2, 3]) == 2
+    assert sorted(g.users) == ["a", "c"] and len(g) == 2
+    assert g.remove(user_id="a") == 1
+    assert g.users == ["c"]
+    assert g.protos.centroid("a") is None
+
+def test_match_batch_picks_best_query(unit, noisy):
+    rng = np.random.default_rng(5)
+    base = unit(rng, 5, 512)
+    g = EmbeddingGallery("face")
+    g.add_many([f"u{i}" for i in range(5)], base)
+    queries = np.stack([unit(rng, 1, 512)[0], noisy(rng, base[3], 0.01), unit(rng, 1, 512)[0]])
+    uid, score, q = g.match_batch(queries)
+    assert (uid, q) == ("u3", 1) and score > 0.99
+
+def test_raw_rows_match_float_rows(unit):
+    # rows as load_prints returns them (already in the gallery dtype) are stored as is
+    rng = np.random.default_rng(6)
+    x = unit(rng, 10)
+    users = [f"u{i % 3}" for i in range(10)]
+    a = EmbeddingGallery("voice", dtype="int8")
+    a.add_many(users, x)
+    codes, scales = quantize(x, "int8")
+    b = EmbeddingGallery("voice", dtype="int8")
+    b.add_many(users, codes, row_ids=np.arange(10), scales=scales)
+    q = unit(rng, 1)[0]
+    assert a.scores(q) == pytest.approx(b.scores(q))
+
+def test_compact_dtypes_use_less_memory(unit, noisy):
+    rng = np.random.default_rng(7)
+    users = [f"u{i // 4}" for i in range(200)]
+    x = unit(rng, 200)
+    queries = noisy(rng, x[::4], 0.1)
+    for dtype, ratio in (("float16", 2), ("int8", 4)):
+        r = recall_vs_float32(users, x, queries, dtype=dtype)
+        assert r["top1_agreement"] == 1.0
+        assert r["max_abs_score_err"] < 0.02
+        assert r["bytes"] < r["bytes_float32"] / ratio * 1.1
+
+# ---------- prototypes ----------
+def test_kmeans_prototypes_separates_clusters(unit, noisy):
+    rng = np.random.default_rng(8)
+    c = unit(rng, 2)
+    X = np.concatenate([noisy(rng, np.repeat(c[:1], 10, 0), 0.02), noisy(rng, np.repeat(c[1:], 6, 0), 0.02)])
+    P, sizes = kmeans_prototypes(X, 2)
+    assert sorted(sizes.tolist()) == [6, 10]
+    assert np.sort((P @ c.T).max(axis=0)).min() > 0.99
+    P, sizes = kmeans_prototypes(X[:0], 3)
+    assert P.shape == (0, 192) and sizes.size == 0
+
+def test_prototype_store_add_evict_matches_rebuild(unit):
+    rng = np.random.default_rng(9)
+    x = unit(rng, 5)
+    inc = PrototypeStore("voice")
+    for e in x:
+        inc.add("a", e)
+    inc.evict("a", x[0])
+    ref = PrototypeStore("voice")
+    ref.rebuild("a", x[1:])
+    np.testing.assert_allclose(inc.centroid("a"), ref.centroid("a"), atol=1e-6)
+    (_, slot, n, _), = inc.rows(["a"])
+    assert (slot, n) == (0, 4)
@@ -0,0 +1,27 @@
+import time
+import amico_metrics as metrics
+from amico_logsink import LogSink
+
+def test_repeat_summary_names_the_warning(tmp_path):
+    sink = LogSink(tmp_path / "w.log", dedup_window_s=0.2)
+    for _ in range(3):
+        sink.showwarning("disk is slow", UserWarning, "/x/amico_audio.py", 12)
+    sink.showwarning("other thing", RuntimeWarning, "/x/amico_stt.py", 7)
+    time.sleep(0.25)
+    sink.showwarning("disk is slow", UserWarning, "/x/amico_audio.py", 12)
+    sink.close()
+    lines = (tmp_path / "w.log").read_text().splitlines()
+    assert "[repeated 2 more times] UserWarning at amico_audio.py:12: disk is slow" in lines
+    assert sum(l.endswith("UserWarning: disk is slow") for l in lines) == 2
+
+def test_logs_and_snapshots_rotate_alike(tmp_path, monkeypatch):
+    sink = LogSink(tmp_path / "w.log", max_bytes=5, backups=2)
+    for i in range(4):
+        sink.write(f"line {i} of the log\n")
+        sink.flush()
+    sink.close()
+    monkeypatch.setattr(metrics, "snapshot", lambda: {"n": 1})
+    for _ in range(4):
+        metrics.write_snapshot(tmp_path / "m.jsonl", max_bytes=5, backups=2)
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == ["m.jsonl", "m.jsonl.1", "m.jsonl.2", "w.log", "w.log.1", "w.log.2"]
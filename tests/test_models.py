@@ -0,0 +1,40 @@
+import warnings
+import pytest
+import amico_models as models
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(models, "_loaders", {})
+    monkeypatch.setattr(models, "_loaded", models.OrderedDict())
+    monkeypatch.setattr(models, "_pinned", set())
+    monkeypatch.setattr(models, "_load_locks", {})
+    monkeypatch.setattr(models, "MIN_FREE_MB", 400.0)
+    monkeypatch.setattr(models, "MAX_RESIDENT_MB", 0.0)
+    for name, mb in (("a", 100), ("b", 200), ("c", 300), ("d", 50), ("e", 150)):
+        models.register(name, object, size_mb=mb)
+    monkeypatch.setattr(models, "available_mb", lambda: 5000.0)
+    for name in ("a", "b", "c"):
+        models.get(name)
+    return monkeypatch
+
+def test_low_memory_evicts_only_the_shortfall(registry):
+    # MemAvailable stays low whatever is evicted (callers still hold references)
+    registry.setattr(models, "available_mb", lambda: 400.0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        models.get("d")                      # 50 MB short: the LRU model (a, 100 MB) covers it
+        assert models.resident() == ["b", "c", "d"]
+        models.get("e")                      # 150 MB short: b (200 MB) covers it
+    assert models.resident() == ["c", "d", "e"]
+
+def test_budget_cap(registry):
+    registry.setattr(models, "MAX_RESIDENT_MB", 650.0)
+    models.get("e")                          # 600 + 150 over a 650 budget: evict a
+    assert models.resident() == ["b", "c", "e"]
+
+def test_stops_and_warns_when_nothing_evictable_covers_it(registry):
+    models.warmup(["a", "b", "c"], pin=True)
+    registry.setattr(models, "available_mb", lambda: 100.0)
+    with pytest.warns(UserWarning, match="MB short"):
+        models.get("d")
+    assert models.resident() == ["a", "b", "c", "d"]
@@ -0,0 +1,52 @@
+import json, sys, types
+import numpy as np
+import pytest
+import amico_reembed
+
+class _FakeDB(types.SimpleNamespace):
+    def __init__(self):
+        super().__init__(rows=[])
+    def existing_sources(self, conn, kind, version):
+        return {p for _, p in self.rows}
+    def insert_voiceprints(self, conn, users, embs, model_version=None, source=None):
+        self.rows += list(zip(users, source))
+
+@pytest.fixture
+def job(monkeypatch, tmp_path):
+    db = _FakeDB()
+    state = {"fail_at": None, "calls": 0}
+
+    def vp_batch(audios, batch_size=16):
+        state["calls"] += 1
+        if state["calls"] == state["fail_at"]:
+            raise RuntimeError("CUDA out of memory")
+        valid = np.array([a != "silent" for a in audios])
+        return np.ones((len(audios), 192), np.float32), valid
+
+    monkeypatch.setitem(sys.modules, "amico_db", db)
+    monkeypatch.setitem(sys.modules, "amico_vp", types.SimpleNamespace(vp_batch=vp_batch))
+    monkeypatch.setattr(amico_reembed, "_decode", lambda item: (item[0], item[1], item[1].split("/")[-1]))
+    ck = tmp_path / "ck.json"
+    run = lambda clips: amico_reembed.reembed(clips, None, "v2", ck, batch_size=2, workers=1)
+    return db, state, ck, run
+
+def _clips(names):
+    return [(f"u{i % 2}", f"/clips/{n}") for i, n in enumerate(names)]
+
+def test_model_failure_stops_without_skipping(job):
+    db, state, ck, run = job
+    clips = _clips(["a", "b", "c", "d", "e"])
+    state["fail_at"] = 2
+    stats = run(clips)
+    assert "CUDA out of memory" in stats["stopped"] and stats["embedded"] == 2
+    assert json.loads(ck.read_text())["done"] == 2          # batch [c, d] not checkpointed
+    state["fail_at"], state["calls"] = None, 0
+    stats = run(clips)
+    assert stats["stopped"] is None and stats["resumed_at"] == 2
+    assert sorted(p for _, p in db.rows) == [p for _, p in clips]
+
+def test_rejected_clips_are_passed_but_an_all_invalid_batch_stops(job):
+    db, state, ck, run = job
+    stats = run(_clips(["a", "silent", "silent", "silent"]))
+    assert stats["invalid"] == 1 and stats["embedded"] == 1
+    assert "invalid" in stats["stopped"] and json.loads(ck.read_text())["done"] == 2
@@ -0,0 +1,77 @@
+import threading, time
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+import amico_stt
+from amico_audio import SR
+
+class _FakeWhisper:
+    """One segment per started second of audio; counts decodes that overlapped."""
+    def __init__(self):
+        self.busy = threading.Lock()
+        self.overlaps = 0
+        self.decoded = []                   # samples per transcribe() call
+
+    def transcribe(self, audio, **kwargs):
+        if not self.busy.acquire(blocking=False):
+            self.overlaps += 1
+            self.busy.acquire()
+        try:
+            time.sleep(0.01)
+            self.decoded.append(len(audio))
+            n = -(-len(audio) // SR)
+            segs = [{"text": f" w{int(audio[i * SR])}", "end": float(min(i + 1, len(audio) / SR))}
+                    for i in range(n)]
+            return {"text": "".join(s["text"] for s in segs), "segments": segs, "language": "en"}
+        finally:
+            self.busy.release()
+
+@pytest.fixture
+def whisper(monkeypatch):
+    model = _FakeWhisper()
+    monkeypatch.setattr(amico_stt.models, "get", lambda name: model)
+    monkeypatch.setattr(amico_stt, "_fp16", lambda m: False)
+    return model
+
+def _second(i):
+    return np.full(SR, i, dtype=np.float32)
+
+def test_stable_segments_are_committed_and_finish_decodes_the_tail(whisper):
+    s = amico_stt.StreamingSTT(step_s=100, language="en")     # drive decodes by hand
+    for i in range(4):
+        s.feed(_second(i))
+        with s._decode_lock:
+            s._decode()
+    # every segment but the last agreed across two decodes, so its audio was dropped
+    assert s._committed == ["w0", "w1", "w2"] and s._n == SR
+    text, lang = s.finish()
+    assert (text, lang) == ("w0 w1 w2 w3", "en")
+    # the buffer stays short, and finish() had nothing new to decode
+    assert whisper.decoded == [SR, 2 * SR, 2 * SR, 2 * SR]
+
+def test_finish_decodes_only_uncommitted_audio(whisper):
+    s = amico_stt.StreamingSTT(step_s=100, language="en")
+    for i in range(3):
+        s.feed(_second(i))
+        with s._decode_lock:
+            s._decode()
+    s.feed(_second(3))
+    assert s.finish()[0] == "w0 w1 w2 w3"
+    assert whisper.decoded[-1] == 2 * SR
+
+def test_stt_and_streaming_share_the_model_safely(whisper):
+    s = amico_stt.StreamingSTT(step_s=0.25, language="en")
+    stop = threading.Event()
+    def oneshot():
+        while not stop.is_set():
+            amico_stt.stt(np.zeros(SR, dtype=np.float32))
+    t = threading.Thread(target=oneshot)
+    t.start()
+    for i in range(8):
+        s.feed(np.full(SR // 4, i, dtype=np.float32))
+        time.sleep(0.02)
+    s.finish()
+    stop.set()
+    t.join()
+    assert whisper.overlaps == 0
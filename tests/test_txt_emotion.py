@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("torch")
+import amico_txt_emotion as te
+
+class _FakePipe:
+    def __init__(self, tag):
+        self.tag, self.calls = tag, []
+
+    def __call__(self, texts, **kwargs):
+        self.calls.append((texts, kwargs))
+        return [[{"label": self.tag, "score": 0.9}, {"label": "other", "score": 0.1}]
+                for _ in ([texts] if isinstance(texts, str) else texts)]
+
+@pytest.fixture
+def pipes(monkeypatch):
+    pipes = {"txt_en": _FakePipe("joy"), "txt_multi": _FakePipe("alegria")}
+    backend = {"txt_en": "eager", "txt_multi": "eager"}
+    monkeypatch.setattr(te.models, "get", lambda name: pipes[name])
+    monkeypatch.setattr(te.backends, "backend_for", lambda name, *a: backend[name])
+    te.clear_cache()
+    yield pipes, backend
+    te.clear_cache()
+
+def test_cache_hits_only_the_exact_text(pipes):
+    en = pipes[0]["txt_en"]
+    assert te.detect_text_emotion("good  morning")["label"] == "joy"
+    te.detect_text_emotion(" good  morning\n")              # stripped: same model input
+    te.detect_text_emotion("good morning")                  # different input to the tokenizer
+    assert [c[0] for c in en.calls] == ["good  morning", "good morning"]
+    assert te.cache_stats()["hits"] == 1
+
+def test_switching_backend_misses(pipes):
+    pl, backend = pipes[0]["txt_en"], pipes[1]
+    te.detect_text_emotion("thank you")
+    backend["txt_en"] = "int8"
+    te.detect_text_emotion("thank you")
+    assert len(pl.calls) == 2
+
+def test_single_and_batch_paths_share_tokenizer_arguments(pipes):
+    en = pipes[0]["txt_en"]
+    te.detect_text_emotion("see you tomorrow")
+    te.clear_cache()
+    te.detect_text_emotion_batch(["see you tomorrow", "hello there"], batch_size=4)
+    (_, single), (_, batch) = en.calls
+    assert single == te.PIPE_KWARGS
+    assert batch == {**te.PIPE_KWARGS, "batch_size": 4}
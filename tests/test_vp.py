@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("speechbrain")
+torch = pytest.importorskip("torch")
+import amico_vp
+
+class _FakeEcapa:
+    device = "cpu"
+    def encode_batch(self, wavs, lens=None):
+        # one direction per clip length, so rows can be told apart
+        emb = torch.zeros(wavs.shape[0], 1, 192)
+        for r in range(wavs.shape[0]):
+            emb[r, 0, int(lens[r] * 10) % 192] = 1.0
+        return emb
+
+def test_bad_clips_are_flagged_invalid(monkeypatch):
+    monkeypatch.setattr(amico_vp, "_model", _FakeEcapa)
+    items = [np.ones(16000), "/nonexistent.wav", np.zeros(0), np.ones(8000)]
+    embs, valid = amico_vp.vp_batch(items, batch_size=3)
+    assert valid.tolist() == [True, False, False, True]
+    assert not embs[~valid].any()
+
+def test_model_errors_propagate(monkeypatch):
+    def broken():
+        raise RuntimeError("CUDA out of memory")
+    monkeypatch.setattr(amico_vp, "_model", broken)
+    with pytest.raises(RuntimeError):
+        amico_vp.vp_batch([np.ones(16000)])